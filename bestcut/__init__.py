@@ -0,0 +1,37 @@
+# bestcut/__init__.py
+# Ottimizzatore di taglio tubi: motore importabile senza interfaccia
+
+from .modelli import (
+    Spezzone, TaglioRichiesto, PianoTaglio, PianiCompatti, RisultatoCalcolo, Variazione,
+    StatisticheCalcolo, ControlloMateriale, GruppoPiani, raggruppa_piani, BarraCommerciale, PianoAcquisto,
+    controlla_misure
+)
+from .ottimizzatore import OttimizzatoreTagli, RISOLUZIONE_PREDEFINITA
+from .cache import CacheCalcoli, chiave_calcolo
+from .magazzino import MagazzinoScampoli, Prelievo, calcola_con_scampoli
+from .libreria import LibreriaPattern
+from .report import CacheReport, FORMATI_REPORT, TIPI_MIME
+from .sfondo import Avanzamento, CalcoloInSfondo
+from .coda import CodaCalcoli, Iscrizione, chiave_istanza
+from .materiali import materiali_di, dividi_per_materiale, unisci_per_materiale, riepilogo_materiali, calcola_per_materiale
+
+__all__ = [
+    "Spezzone", "TaglioRichiesto", "PianoTaglio", "PianiCompatti", "RisultatoCalcolo", "Variazione",
+    "StatisticheCalcolo", "ControlloMateriale", "GruppoPiani", "raggruppa_piani", "BarraCommerciale", "PianoAcquisto",
+    "controlla_misure",
+    "OttimizzatoreTagli", "RISOLUZIONE_PREDEFINITA",
+    "CacheCalcoli", "chiave_calcolo",
+    "MagazzinoScampoli", "Prelievo", "calcola_con_scampoli", "LibreriaPattern",
+    "CacheReport", "FORMATI_REPORT", "TIPI_MIME",
+    "Avanzamento", "CalcoloInSfondo", "CodaCalcoli", "Iscrizione", "chiave_istanza",
+    "materiali_di", "dividi_per_materiale", "unisci_per_materiale", "riepilogo_materiali", "calcola_per_materiale",
+    "crea_excel_download", "EXCEL_DISPONIBILE",
+]
+
+
+def __getattr__(nome):
+    # Il report Excel carica openpyxl: lo si importa solo quando serve davvero
+    if nome in ("crea_excel_download", "EXCEL_DISPONIBILE"):
+        from . import excel
+        return getattr(excel, nome)
+    raise AttributeError(f"module {__name__!r} has no attribute {nome!r}")
@@ -0,0 +1,8 @@
+# bestcut/__main__.py
+# python -m bestcut ...
+
+import sys
+
+from .cli import main
+
+sys.exit(main())
@@ -0,0 +1,267 @@
+# bestcut/benchmark.py
+# Banco di prova: istanze sintetiche riproducibili, tempi, memoria e resa di ogni metodo
+#
+#   python -m bestcut.benchmark -o base.json
+#   python -m bestcut.benchmark --confronta base.json      (codice d'uscita 1 se peggiora)
+
+import argparse
+import json
+import platform
+import random
+import sys
+import time
+import tracemalloc
+from dataclasses import dataclass, asdict
+from typing import List, Dict, Optional, Callable
+
+import numpy as np
+
+from .modelli import PianiCompatti, Spezzone, TaglioRichiesto
+from .ottimizzatore import OttimizzatoreTagli, _Istanza, _limite_spezzoni
+
+
+@dataclass
+class IstanzaProva:
+    nome: str
+    famiglia: str
+    seme: int
+    spezzoni: List[Spezzone]
+    richieste: List[TaglioRichiesto]
+
+
+# Dimensione delle istanze: (pezzi per istanza uniforme/reale, triplette)
+SCALE = {"piccola": (200, 40), "media": (2000, 200), "grande": (20000, 1000)}
+
+
+def _spezzoni(lunghezze: List[float]) -> List[Spezzone]:
+    return [Spezzone(l, i) for i, l in enumerate(sorted(lunghezze, reverse=True), 1)]
+
+
+def _richieste(pezzi: List[float]) -> List[TaglioRichiesto]:
+    conteggio: Dict[float, int] = {}
+    for p in pezzi:
+        conteggio[p] = conteggio.get(p, 0) + 1
+    return [TaglioRichiesto(m, q) for m, q in sorted(conteggio.items(), reverse=True)]
+
+
+def genera_uniforme(seme: int, pezzi: int) -> IstanzaProva:
+    """Misure casuali uniformi tra 0,30 e 3,50 m (al centimetro), spezzoni da 6 m in abbondanza"""
+    rng = random.Random(seme)
+    misure = [round(rng.uniform(0.3, 3.5), 2) for _ in range(pezzi)]
+    barre = int(sum(misure) / 6.0 * 1.5) + 1
+    return IstanzaProva(f"uniforme-{pezzi}-s{seme}", "uniforme", seme, _spezzoni([6.0] * barre), _richieste(misure))
+
+
+def genera_triplette(seme: int, triplette: int) -> IstanzaProva:
+    """
+    Istanze "triplette" (alla Falkenauer): ogni spezzone da 6 m è riempito esattamente
+    da tre pezzi tra 1,50 e 3,00 m. L'ottimo usa tutti gli spezzoni con scarto zero,
+    ma un errore di incastro costa subito uno spezzone.
+    """
+    rng = random.Random(seme)
+    barra = 6000  # mm
+    pezzi: List[float] = []
+    while len(pezzi) < 3 * triplette:
+        a = rng.randint(1501, 2999)
+        b = rng.randint(max(1501, barra - a - 2999), min(2999, barra - a - 1501))
+        c = barra - a - b
+        if 1500 < c < 3000:
+            pezzi.extend(x / 1000 for x in (a, b, c))
+    return IstanzaProva(f"triplette-{triplette}-s{seme}", "triplette", seme,
+                        _spezzoni([6.0] * triplette), _richieste(pezzi))
+
+
+def genera_reale(seme: int, pezzi: int) -> IstanzaProva:
+    """Il nostro profilo tipico: poche misure (3-6) con tante ripetizioni, spezzoni misti di magazzino"""
+    rng = random.Random(seme)
+    misure = [round(rng.uniform(0.4, 2.8), 2) for _ in range(rng.randint(3, 6))]
+    pesi = [rng.uniform(1, 5) for _ in misure]
+    scelte = rng.choices(misure, weights=pesi, k=pezzi)
+    richiesto = sum(scelte)
+    barre: List[float] = []
+    while sum(barre) < richiesto * 1.3:
+        barre.append(rng.choice([6.0, 6.0, 6.0, 12.0, round(rng.uniform(2.0, 5.9), 2)]))
+    return IstanzaProva(f"reale-{pezzi}-s{seme}", "reale", seme, _spezzoni(barre), _richieste(scelte))
+
+
+def genera_carenza(seme: int, pezzi: int) -> IstanzaProva:
+    """Materiale insufficiente (circa 70% del necessario): misura il taglio parziale"""
+    rng = random.Random(seme)
+    misure = [round(rng.uniform(0.3, 2.5), 2) for _ in range(pezzi)]
+    barre = [rng.choice([6.0, 4.5, 3.0]) for _ in range(int(sum(misure) * 0.7 / 5.0))]
+    return IstanzaProva(f"carenza-{pezzi}-s{seme}", "carenza", seme, _spezzoni(barre or [6.0]), _richieste(misure))
+
+
+GENERATORI: Dict[str, Callable[[int, int], IstanzaProva]] = {
+    "uniforme": genera_uniforme,
+    "triplette": genera_triplette,
+    "reale": genera_reale,
+    "carenza": genera_carenza,
+}
+
+
+def genera_istanze(famiglie: List[str], semi: List[int], scala: str = "piccola") -> List[IstanzaProva]:
+    pezzi, triplette = SCALE[scala]
+    return [GENERATORI[f](seme, triplette if f == "triplette" else pezzi) for f in famiglie for seme in semi]
+
+
+def misura(istanza: IstanzaProva, metodo: str, tempo_limite: float = 5.0, ripetizioni: int = 1,
+           processi: Optional[int] = None) -> dict:
+    """
+    Un metodo su un'istanza: tempo (il migliore di `ripetizioni`), picco di memoria
+    (un'esecuzione a parte con tracemalloc, che rallenta), spezzoni, scarto e distanza dai limiti.
+    Nel portfolio la memoria dei processi figli non è conteggiata.
+    """
+    ottimizzatore = OttimizzatoreTagli(metodo=metodo, tempo_limite=tempo_limite, processi=processi)
+
+    tempi = []
+    for _ in range(max(1, ripetizioni)):
+        inizio = time.perf_counter()
+        risultato = ottimizzatore.calcola_ottimale(istanza.spezzoni, istanza.richieste)
+        tempi.append(time.perf_counter() - inizio)
+
+    tracemalloc.start()
+    try:
+        ottimizzatore.calcola_ottimale(istanza.spezzoni, istanza.richieste)
+        picco = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    dati = _Istanza(istanza.spezzoni, istanza.richieste, ottimizzatore.risoluzione)
+    richiesto = int(dati.misure @ dati.quantita)
+    tagliato = sum(m * n for m, n in risultato.tagli_fatti.items())
+    limite = _limite_spezzoni(dati.lunghezze, richiesto) if risultato.completato else None
+    usato = PianiCompatti.da_piani(risultato.piani).lunghezza_totale()
+
+    return {
+        "istanza": istanza.nome,
+        "famiglia": istanza.famiglia,
+        "seme": istanza.seme,
+        "metodo": metodo,
+        "pezzi": int(dati.quantita.sum()),
+        "misure": len(dati.misure),
+        "spezzoni_disponibili": len(istanza.spezzoni),
+        "tempo_s": round(min(tempi), 6),
+        "memoria_picco_mb": round(picco / 2**20, 3),
+        "completato": risultato.completato,
+        "spezzoni_usati": risultato.spezzoni_usati,
+        "limite_spezzoni": limite,
+        "gap_spezzoni": round((risultato.spezzoni_usati - limite) / limite, 6) if limite else None,
+        "scarto_totale": risultato.scarto_totale,
+        "limite_scarto": risultato.limite_inferiore,
+        "resa": round(tagliato / usato, 6) if usato else None,
+        "tagliato_m": round(tagliato, 6),
+        "richiesto_m": dati.in_metri(richiesto),
+    }
+
+
+@dataclass
+class Soglie:
+    """Peggioramenti tollerati rispetto al riferimento prima di segnalare una regressione"""
+    tempo_relativo: float = 0.25  # +25% ...
+    tempo_assoluto: float = 0.05  # ... e almeno 50 ms (sotto è rumore)
+    memoria_relativa: float = 0.5
+    spezzoni: int = 0
+    scarto_relativo: float = 0.01
+    resa: float = 0.001
+
+
+def confronta(attuale: dict, riferimento: dict, soglie: Soglie) -> List[str]:
+    """Elenco delle regressioni (vuoto se va tutto bene), per istanza e metodo"""
+    precedenti = {(r["istanza"], r["metodo"]): r for r in riferimento.get("risultati", [])}
+    regressioni = []
+    for r in attuale["risultati"]:
+        base = precedenti.get((r["istanza"], r["metodo"]))
+        if base is None:
+            continue
+        chi = f"{r['istanza']} [{r['metodo']}]"
+        if (r["tempo_s"] > base["tempo_s"] * (1 + soglie.tempo_relativo)
+                and r["tempo_s"] - base["tempo_s"] > soglie.tempo_assoluto):
+            regressioni.append(f"{chi}: tempo {base['tempo_s']:.3f}s -> {r['tempo_s']:.3f}s")
+        if r["memoria_picco_mb"] > base["memoria_picco_mb"] * (1 + soglie.memoria_relativa) + 1:
+            regressioni.append(f"{chi}: memoria {base['memoria_picco_mb']:.1f}MB -> {r['memoria_picco_mb']:.1f}MB")
+        if base["completato"] and not r["completato"]:
+            regressioni.append(f"{chi}: non più completato")
+        if r["spezzoni_usati"] > base["spezzoni_usati"] + soglie.spezzoni and r["completato"]:
+            regressioni.append(f"{chi}: spezzoni {base['spezzoni_usati']} -> {r['spezzoni_usati']}")
+        if r["scarto_totale"] > base["scarto_totale"] * (1 + soglie.scarto_relativo) + 1e-6 and r["completato"]:
+            regressioni.append(f"{chi}: scarto {base['scarto_totale']:.3f} -> {r['scarto_totale']:.3f}")
+        if not r["completato"] and r["tagliato_m"] < base["tagliato_m"] * (1 - soglie.resa) - 1e-6:
+            regressioni.append(f"{chi}: tagliato {base['tagliato_m']:.3f}m -> {r['tagliato_m']:.3f}m")
+    return regressioni
+
+
+def esegui(famiglie: List[str], metodi: List[str], semi: List[int], scala: str = "piccola",
+           tempo_limite: float = 5.0, ripetizioni: int = 1, processi: Optional[int] = None,
+           avanzamento: Optional[Callable[[dict], None]] = None) -> dict:
+    """Rapporto completo in forma JSON"""
+    risultati = []
+    for istanza in genera_istanze(famiglie, semi, scala):
+        for metodo in metodi:
+            riga = misura(istanza, metodo, tempo_limite, ripetizioni, processi)
+            risultati.append(riga)
+            if avanzamento:
+                avanzamento(riga)
+    return {
+        "versione": 1,
+        "creato": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "ambiente": {"python": platform.python_version(), "numpy": np.__version__,
+                     "macchina": platform.machine(), "sistema": platform.system()},
+        "parametri": {"famiglie": famiglie, "metodi": metodi, "semi": semi, "scala": scala,
+                      "tempo_limite": tempo_limite, "ripetizioni": ripetizioni},
+        "risultati": risultati,
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="bestcut-bench", description="Banco di prova dei metodi di calcolo")
+    parser.add_argument("--famiglie", default=",".join(GENERATORI), help="tra: " + ", ".join(GENERATORI))
+    parser.add_argument("--metodi", default=",".join(OttimizzatoreTagli.METODI))
+    parser.add_argument("--semi", type=int, default=3, help="istanze per famiglia (semi 0..N-1)")
+    parser.add_argument("--scala", choices=SCALE, default="piccola")
+    parser.add_argument("--tempo-limite", type=float, default=5.0)
+    parser.add_argument("--ripetizioni", type=int, default=3, help="il tempo riportato è il migliore")
+    parser.add_argument("-j", "--processi", type=int, default=None, help="processi del portfolio")
+    parser.add_argument("-o", "--uscita", help="file JSON del rapporto (predefinito: standard output)")
+    parser.add_argument("--confronta", metavar="RIFERIMENTO", help="rapporto JSON di riferimento")
+    soglie = Soglie()
+    for campo, valore in asdict(soglie).items():
+        parser.add_argument(f"--soglia-{campo.replace('_', '-')}", dest=campo, type=type(valore), default=valore)
+    args = parser.parse_args(argv)
+
+    famiglie = [f for f in args.famiglie.split(",") if f]
+    metodi = [m for m in args.metodi.split(",") if m]
+    for nome, ammessi in (("famiglia", GENERATORI), ("metodo", OttimizzatoreTagli.METODI)):
+        for valore in (famiglie if nome == "famiglia" else metodi):
+            if valore not in ammessi:
+                parser.error(f"{nome} sconosciuto: {valore}")
+
+    def avanzamento(r: dict):
+        print(f"{r['istanza']:<24} {r['metodo']:<10} {r['tempo_s']:8.3f}s {r['memoria_picco_mb']:7.1f}MB "
+              f"spezzoni {r['spezzoni_usati']:>5} (lim {r['limite_spezzoni']}) scarto {r['scarto_totale']:.3f}",
+              file=sys.stderr)
+
+    rapporto = esegui(famiglie, metodi, list(range(args.semi)), args.scala, args.tempo_limite,
+                      args.ripetizioni, args.processi, avanzamento)
+
+    testo = json.dumps(rapporto, indent=2, ensure_ascii=False)
+    if args.uscita:
+        with open(args.uscita, "w", encoding="utf-8") as file:
+            file.write(testo + "\n")
+    else:
+        print(testo)
+
+    if args.confronta:
+        with open(args.confronta, encoding="utf-8") as file:
+            riferimento = json.load(file)
+        regressioni = confronta(rapporto, riferimento, Soglie(**{c: getattr(args, c) for c in asdict(soglie)}))
+        for r in regressioni:
+            print(f"REGRESSIONE {r}", file=sys.stderr)
+        if regressioni:
+            return 1
+        print("Nessuna regressione rispetto al riferimento", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,180 @@
+# bestcut/cache.py
+# Cache dei risultati: LRU in memoria e, a richiesta, SQLite su disco
+
+import hashlib
+import json
+import pickle
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import fields
+from typing import List, Tuple, Dict, Optional
+
+from .modelli import Spezzone, TaglioRichiesto, PianiCompatti, RisultatoCalcolo, StatisticheCalcolo
+from .ottimizzatore import OttimizzatoreTagli
+from .sfondo import Avanzamento
+
+
+def chiave_calcolo(spezzoni: List[Spezzone], richieste: List[TaglioRichiesto],
+                   ottimizzatore: OttimizzatoreTagli) -> str:
+    """
+    Chiave canonica di un calcolo (SHA-256): multinsieme ordinato degli spezzoni,
+    multinsieme delle misure richieste (con le priorità, se contano), soglia e opzioni del risolutore.
+    Spezzoni e misure contano col loro materiale: stesse lunghezze divise in un altro modo tra
+    i materiali sono un altro calcolo. Non dipende dall'ordine di inserimento né dagli ID degli spezzoni.
+    """
+    domanda: Dict[Tuple[float, str], int] = {}
+    for richiesta in richieste:
+        if richiesta.quantita > 0:
+            chiave = (richiesta.lunghezza, richiesta.materiale)
+            domanda[chiave] = domanda.get(chiave, 0) + richiesta.quantita
+    descrizione = {
+        "spezzoni": sorted(((s.lunghezza, s.materiale) for s in spezzoni), reverse=True),
+        "richieste": sorted(([m, materiale, n] for (m, materiale), n in domanda.items()), reverse=True),
+        "soglia": ottimizzatore.soglia_scarto,
+        "opzioni": ottimizzatore.opzioni(),
+    }
+    if ottimizzatore.carenza == "priorita":
+        # La priorità cambia il piano solo con questo obiettivo
+        priorita: Dict[Tuple[float, str], float] = {}
+        for richiesta in richieste:
+            if richiesta.quantita > 0:
+                chiave = (richiesta.lunghezza, richiesta.materiale)
+                priorita[chiave] = max(priorita.get(chiave, 0.0), richiesta.priorita)
+        descrizione["priorita"] = sorted(([m, materiale, p] for (m, materiale), p in priorita.items()), reverse=True)
+    return hashlib.sha256(json.dumps(descrizione, sort_keys=True).encode()).hexdigest()
+
+
+def _risultato_in_dati(risultato: RisultatoCalcolo, posizioni: Dict[int, int]) -> dict:
+    """
+    Forma canonica da mettere in cache: solo tipi base e array NumPy (niente classi
+    da importare per rileggerla) e spezzoni indicati per posizione nell'ordine canonico invece che per ID.
+    """
+    dati = {f.name: getattr(risultato, f.name) for f in fields(risultato) if f.name not in ("piani", "statistiche", "materiali")}
+    piani = PianiCompatti.da_piani(risultato.piani)
+    dati["piani"] = piani.rinumera(posizioni[i] for i in piani.spezzone_ids.tolist()).in_array()
+    if risultato.materiali is not None:
+        dati["materiali"] = {materiale: _risultato_in_dati(parte, posizioni)
+                             for materiale, parte in risultato.materiali.items()}
+    return dati
+
+
+def _risultato_da_dati(dati: dict, spezzoni_ordinati: List[Spezzone]) -> RisultatoCalcolo:
+    """Ricostruisce un RisultatoCalcolo nuovo con gli ID degli spezzoni di questa richiesta"""
+    campi = {nome: (dict(valore) if isinstance(valore, dict) else valore)
+             for nome, valore in dati.items() if nome not in ("piani", "materiali")}
+    piani = PianiCompatti.da_array(dati["piani"])
+    piani = piani.rinumera(spezzoni_ordinati[posizione].id for posizione in piani.spezzone_ids.tolist())
+    if dati.get("materiali") is not None:
+        campi["materiali"] = {materiale: _risultato_da_dati(parte, spezzoni_ordinati)
+                              for materiale, parte in dati["materiali"].items()}
+    return RisultatoCalcolo(piani=piani, **campi)
+
+
+class CacheCalcoli:
+    """
+    Cache dei risultati su due livelli:
+      - LRU in memoria (thread-safe, condivisibile tra le sessioni dello stesso server)
+      - opzionale, SQLite su disco (`percorso`), con eliminazione dei meno usati oltre `max_byte`
+    """
+
+    def __init__(self, max_voci: int = 128, percorso: Optional[str] = None, max_byte: int = 256 * 2**20):
+        self.max_voci = max_voci
+        self.max_byte = max_byte
+        self.hit = 0
+        self.miss = 0
+        self._memoria: "OrderedDict[str, dict]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        if percorso:
+            self._db = sqlite3.connect(percorso, check_same_thread=False)
+            self._db.execute("""
+                CREATE TABLE IF NOT EXISTS calcoli (
+                    chiave TEXT PRIMARY KEY,
+                    dati BLOB NOT NULL,
+                    dimensione INTEGER NOT NULL,
+                    ultimo_uso REAL NOT NULL
+                )""")
+            self._db.execute("CREATE INDEX IF NOT EXISTS calcoli_uso ON calcoli (ultimo_uso)")
+            self._db.commit()
+
+    def calcola(self, ottimizzatore: OttimizzatoreTagli, spezzoni: List[Spezzone],
+                richieste: List[TaglioRichiesto],
+                avanzamento: Optional[Avanzamento] = None) -> Tuple[RisultatoCalcolo, bool]:
+        """
+        Risultato del calcolo e True se arrivava dalla cache.
+        Un calcolo annullato (vedi `Avanzamento`) non entra in cache: il suo piano
+        dipende da quando è stato fermato.
+        """
+        # Stesso ordine della chiave: una posizione indica sempre lunghezza e materiale
+        ordinati = sorted(spezzoni, key=lambda s: (s.lunghezza, s.materiale), reverse=True)
+        posizioni = {s.id: i for i, s in enumerate(ordinati)}
+        if len(posizioni) != len(ordinati):
+            # ID ripetuti: impossibile rimappare il piano, si calcola e basta
+            return ottimizzatore.calcola_ottimale(spezzoni, richieste, avanzamento), False
+        
+        statistiche = StatisticheCalcolo(ottimizzatore.metodo)
+        with statistiche.fase("cache"):
+            chiave = chiave_calcolo(spezzoni, richieste, ottimizzatore)
+            dati = self._leggi(chiave)
+            if dati is not None:
+                risultato = _risultato_da_dati(dati, ordinati)
+        if dati is not None:
+            with self._lock:
+                self.hit += 1
+            statistiche.conta("risultati_da_cache")
+            risultato.statistiche = statistiche
+            if avanzamento is not None:
+                avanzamento.pubblica(risultato)
+                avanzamento.aggiorna(1.0, "Risultato dalla cache")
+            return risultato, True
+        
+        risultato = ottimizzatore.calcola_ottimale(spezzoni, richieste, avanzamento)
+        if avanzamento is None or not avanzamento.annullato:
+            self._scrivi(chiave, _risultato_in_dati(risultato, posizioni))
+        with self._lock:
+            self.miss += 1
+        return risultato, False
+
+    def _leggi(self, chiave: str) -> Optional[dict]:
+        with self._lock:
+            if chiave in self._memoria:
+                self._memoria.move_to_end(chiave)
+                return self._memoria[chiave]
+            if self._db is None:
+                return None
+            riga = self._db.execute("SELECT dati FROM calcoli WHERE chiave = ?", (chiave,)).fetchone()
+            if riga is None:
+                return None
+            self._db.execute("UPDATE calcoli SET ultimo_uso = ? WHERE chiave = ?", (time.time(), chiave))
+            self._db.commit()
+            dati = pickle.loads(riga[0])
+            self._metti_in_memoria(chiave, dati)
+            return dati
+
+    def _scrivi(self, chiave: str, dati: dict):
+        with self._lock:
+            self._metti_in_memoria(chiave, dati)
+            if self._db is None:
+                return
+            blob = pickle.dumps(dati, protocol=pickle.HIGHEST_PROTOCOL)
+            self._db.execute("INSERT OR REPLACE INTO calcoli VALUES (?, ?, ?, ?)",
+                             (chiave, blob, len(blob), time.time()))
+            # Oltre il limite di dimensione si tolgono i calcoli usati meno di recente
+            totale = self._db.execute("SELECT COALESCE(SUM(dimensione), 0) FROM calcoli").fetchone()[0]
+            if totale > self.max_byte:
+                eccesso = totale - self.max_byte
+                for vecchia, dimensione in self._db.execute(
+                        "SELECT chiave, dimensione FROM calcoli ORDER BY ultimo_uso").fetchall():
+                    if eccesso <= 0:
+                        break
+                    self._db.execute("DELETE FROM calcoli WHERE chiave = ?", (vecchia,))
+                    eccesso -= dimensione
+            self._db.commit()
+
+    def _metti_in_memoria(self, chiave: str, dati: dict):
+        self._memoria[chiave] = dati
+        self._memoria.move_to_end(chiave)
+        while len(self._memoria) > self.max_voci:
+            self._memoria.popitem(last=False)
@@ -0,0 +1,230 @@
+# bestcut/cli.py
+# Riga di comando: calcola a lotti gli ordini di un file, senza interfaccia web
+#
+#   bestcut ordini.jsonl -o risultati.jsonl --metodo colgen -j 4
+#   bestcut ordini.csv -o risultati.xlsx
+#   cat ordini.jsonl | bestcut - > risultati.jsonl
+#   bestcut ordini.jsonl --magazzino scampoli.db
+#   bestcut ordini.jsonl --libreria pattern.db
+#
+# Gli ordini con più materiali/profili si dividono: un calcolo per materiale,
+# in parallelo come gli ordini, e un risultato unico per ordine.
+# Un ordine malformato non ferma il lotto: al posto del risultato si scrive il
+# suo errore, si prosegue e alla fine si esce con 2.
+
+import argparse
+import json
+import sys
+import time
+from collections import deque
+from typing import List, Optional, Tuple, Union
+
+from .modelli import RisultatoCalcolo
+from .ottimizzatore import OttimizzatoreTagli, RISOLUZIONE_PREDEFINITA
+from .lavori import (Lavoro, OrdineNonValido, leggi_lavori, apri_scrittore, ERRORI_ORDINE,
+                     FORMATI_INGRESSO, FORMATI_USCITA)
+from .materiali import dividi_per_materiale, unisci_per_materiale
+from .libreria import LibreriaPattern
+
+
+# Opzioni del processo di lavoro, ricevute una volta all'avvio: la libreria vi resta aperta
+# per tutti gli ordini, invece di viaggiare (e riaprirsi) con ognuno
+_opzioni_processo: dict = {}
+
+
+def _prepara_processo(opzioni: dict):
+    _opzioni_processo.update(opzioni)
+    if "libreria" in opzioni:
+        # Con fork arriva l'oggetto del processo principale: la sua connessione non si condivide
+        _opzioni_processo["libreria"] = opzioni["libreria"].nel_processo()
+
+
+def _calcola_lavoro(lavoro: Lavoro, opzioni: Optional[dict] = None, magazzino: Optional[str] = None):
+    """Eseguito nei processi di lavoro: un ordine, un ottimizzatore (opzioni None = quelle del processo)"""
+    if opzioni is None:
+        opzioni = _opzioni_processo
+    if lavoro.soglia is not None:
+        opzioni = dict(opzioni, soglia_scarto=lavoro.soglia)
+    ottimizzatore = OttimizzatoreTagli(**opzioni)
+    if magazzino is None:
+        return lavoro.id, ottimizzatore.calcola_ottimale(lavoro.spezzoni, lavoro.richieste)
+
+    # Prima gli scampoli, poi gli spezzoni; il taglio è subito confermato in magazzino
+    from .magazzino import MagazzinoScampoli, calcola_con_scampoli
+
+    scampoli = MagazzinoScampoli(magazzino)
+    try:
+        prelievo = calcola_con_scampoli(ottimizzatore, scampoli, lavoro.spezzoni, lavoro.richieste)
+        scampoli.consuma(prelievo.sessione, prelievo.scampoli_usati())
+        scampoli.assorbi(prelievo.risultato, ottimizzatore.soglia_scarto, origine=lavoro.id)
+    finally:
+        scampoli.chiudi()
+    return lavoro.id, prelievo.risultato
+
+
+def _analizza_argomenti(argv: Optional[List[str]]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        prog="bestcut",
+        description="Ottimizzazione a lotti del taglio di tubi (ordini da CSV, JSON Lines o Excel)"
+    )
+    parser.add_argument("ingresso", help="file degli ordini ('-' = standard input, JSON Lines)")
+    parser.add_argument("-o", "--uscita", default="-", help="file dei risultati (.jsonl o .xlsx, '-' = standard output)")
+    parser.add_argument("--formato-ingresso", choices=FORMATI_INGRESSO, help="predefinito: dall'estensione")
+    parser.add_argument("--formato-uscita", choices=FORMATI_USCITA, help="predefinito: dall'estensione")
+    parser.add_argument("--metodo", choices=OttimizzatoreTagli.METODI, default="ffd")
+    parser.add_argument("--soglia", type=float, default=0.3,
+                        help="scarto minimo riutilizzabile in metri (il campo 'soglia' del lavoro ha la precedenza)")
+    parser.add_argument("--tempo-limite", type=float, default=10.0, help="secondi per ordine (colgen/portfolio)")
+    parser.add_argument("--risoluzione", type=float, default=RISOLUZIONE_PREDEFINITA, help="precisione in metri")
+    parser.add_argument("--carenza", choices=OttimizzatoreTagli.CARENZE,
+                        help="se il materiale non basta: massimizza i metri tagliati o i metri pesati con la priorità")
+    parser.add_argument("--ricerca-locale", type=float, default=0.0, metavar="SECONDI",
+                        help="secondi per ordine di ricerca locale sul piano trovato (libera spezzoni, "
+                             "raccoglie lo scarto in avanzi riutilizzabili)")
+    parser.add_argument("--magazzino", metavar="DB",
+                        help="magazzino scampoli SQLite: usa prima gli scampoli e vi aggiunge gli scarti riutilizzabili")
+    parser.add_argument("--libreria", metavar="DB",
+                        help="libreria dei pattern SQLite: riparte dai pattern buoni degli ordini precedenti "
+                             "e vi registra quelli nuovi")
+    parser.add_argument("--log-json", action="store_true",
+                        help="una riga JSON per calcolo (fasi e contatori) su standard error")
+    parser.add_argument("--profilo", metavar="FILE",
+                        help="salva il profilo cProfile (pstats) di ogni calcolo; con più ordini resta l'ultimo")
+    parser.add_argument("-j", "--processi", type=int, default=None,
+                        help="ordini (e materiali di un ordine) calcolati in parallelo (predefinito: numero di CPU)")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = _analizza_argomenti(argv)
+    opzioni = {
+        "soglia_scarto": args.soglia,
+        "metodo": args.metodo,
+        "tempo_limite": args.tempo_limite,
+        "risoluzione": args.risoluzione,
+        # Il parallelismo è già tra gli ordini: il portfolio resta nel suo processo
+        "processi": 1,
+        "profilo": args.profilo,
+        "carenza": args.carenza,
+        "ricerca_locale": args.ricerca_locale,
+    }
+
+    try:
+        if args.libreria:
+            # Passa ai processi di lavoro al loro avvio: ognuno la apre una volta
+            opzioni["libreria"] = LibreriaPattern(args.libreria)
+        lavori = leggi_lavori(args.ingresso, args.formato_ingresso, errori=True)
+        scrittore = apri_scrittore(args.uscita, args.formato_uscita)
+    except (OSError, ValueError) as e:
+        if "libreria" in opzioni:
+            opzioni["libreria"].chiudi()
+        print(f"bestcut: {e}", file=sys.stderr)
+        return 2
+
+    inizio = time.perf_counter()
+    ordini = incompleti = errori = 0
+    try:
+        for id_lavoro, risultato in _esegui(lavori, opzioni, args.processi, args.magazzino):
+            ordini += 1
+            if isinstance(risultato, OrdineNonValido):
+                scrittore.scrivi_errore(id_lavoro, risultato.errore)
+                print(f"bestcut: ordine {id_lavoro}: {risultato.errore}", file=sys.stderr)
+                errori += 1
+                continue
+            scrittore.scrivi(id_lavoro, risultato)
+            if args.log_json and risultato.statistiche:
+                # Scritto qui e non nei processi di lavoro: una riga per ordine, nell'ordine d'ingresso
+                print(json.dumps({"evento": "calcolo", "ordine": id_lavoro, **risultato.statistiche.in_dict()}),
+                      file=sys.stderr)
+            incompleti += not risultato.completato
+    except (OSError, ValueError) as e:
+        # Il file stesso (non un ordine) non si legge o non si scrive
+        print(f"bestcut: {e}", file=sys.stderr)
+        return 2
+    finally:
+        scrittore.chiudi()
+        if "libreria" in opzioni:
+            opzioni["libreria"].chiudi()
+
+    print(f"bestcut: {ordini} ordini in {time.perf_counter() - inizio:.2f}s"
+          + (f", {incompleti} incompleti" if incompleti else "")
+          + (f", {errori} non validi" if errori else ""), file=sys.stderr)
+    return 2 if errori else 1 if incompleti else 0
+
+
+def _parti(lavoro: Lavoro, magazzino: Optional[str]) -> List[Tuple[Optional[str], Lavoro]]:
+    """I calcoli di un ordine: uno per materiale (None = ordine intero, con un solo materiale)"""
+    parti = dividi_per_materiale(lavoro.spezzoni, lavoro.richieste)
+    if len(parti) <= 1:
+        return [(None, lavoro)]
+    if magazzino is not None:
+        raise ValueError("il magazzino scampoli non distingue i materiali: un materiale per ordine")
+    return [(materiale, Lavoro(lavoro.id, spezzoni, richieste, lavoro.soglia))
+            for materiale, (spezzoni, richieste) in parti.items()]
+
+
+def _riunisci(id_lavoro: str, risultati: List[Tuple[Optional[str], RisultatoCalcolo]]):
+    if risultati[0][0] is None:
+        return id_lavoro, risultati[0][1]
+    return id_lavoro, unisci_per_materiale(dict(risultati))
+
+
+def _raccogli(id_lavoro: str, parti) -> Tuple[str, Union[RisultatoCalcolo, OrdineNonValido]]:
+    """Il risultato di un ordine dai suoi calcoli [(materiale, futuro)], o l'errore al suo posto"""
+    if isinstance(parti, OrdineNonValido):
+        return id_lavoro, parti
+    try:
+        return _riunisci(id_lavoro, [(materiale, futuro.result()[1]) for materiale, futuro in parti])
+    except ERRORI_ORDINE as e:
+        return id_lavoro, OrdineNonValido.da_errore(id_lavoro, e)
+
+
+def _esegui(lavori, opzioni: dict, processi: Optional[int], magazzino: Optional[str] = None):
+    """
+    Risultati nello stesso ordine dell'ingresso. I calcoli in volo sono limitati
+    (2 per processo), così il file viene letto e scritto man mano; i materiali di
+    uno stesso ordine sono calcoli separati, riuniti quando sono finiti tutti.
+    Gli ordini non validi (in lettura o nel calcolo) escono come OrdineNonValido.
+    """
+    if processi == 1:
+        for lavoro in lavori:
+            if isinstance(lavoro, OrdineNonValido):
+                yield lavoro.id, lavoro
+                continue
+            try:
+                esito = _riunisci(lavoro.id, [(materiale, _calcola_lavoro(parte, opzioni, magazzino)[1])
+                                              for materiale, parte in _parti(lavoro, magazzino)])
+            except ERRORI_ORDINE as e:
+                esito = lavoro.id, OrdineNonValido.da_errore(lavoro.id, e)
+            yield esito
+        return
+
+    import os
+    from concurrent.futures import ProcessPoolExecutor
+
+    processi = processi or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=processi, initializer=_prepara_processo, initargs=(opzioni,)) as pool:
+        in_volo = deque()  # (ordine, [(materiale, futuro)] o OrdineNonValido)
+        calcoli = 0
+        for lavoro in lavori:
+            if isinstance(lavoro, OrdineNonValido):
+                in_volo.append((lavoro.id, lavoro))
+                continue
+            try:
+                futuri = [(materiale, pool.submit(_calcola_lavoro, parte, None, magazzino))
+                          for materiale, parte in _parti(lavoro, magazzino)]
+            except ERRORI_ORDINE as e:
+                in_volo.append((lavoro.id, OrdineNonValido.da_errore(lavoro.id, e)))
+                continue
+            in_volo.append((lavoro.id, futuri))
+            calcoli += len(futuri)
+            while calcoli >= 2 * processi:
+                id_lavoro, parti = in_volo.popleft()
+                calcoli -= 0 if isinstance(parti, OrdineNonValido) else len(parti)
+                yield _raccogli(id_lavoro, parti)
+        while in_volo:
+            yield _raccogli(*in_volo.popleft())
+
+
+if __name__ == "__main__":
+    sys.exit(main())
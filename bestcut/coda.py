@@ -0,0 +1,252 @@
+# bestcut/coda.py
+# Coda dei calcoli condivisa da tutte le sessioni: pochi calcoli alla volta, a turno per sessione
+
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from typing import Callable, Deque, Dict, List, Optional
+
+from .modelli import Spezzone, TaglioRichiesto
+from .ottimizzatore import OttimizzatoreTagli
+from .cache import chiave_calcolo
+from .sfondo import Avanzamento, CalcoloInSfondo
+
+_log = logging.getLogger("bestcut")
+
+
+def chiave_istanza(spezzoni: List[Spezzone], richieste: List[TaglioRichiesto],
+                   ottimizzatore: OttimizzatoreTagli) -> str:
+    """
+    Chiave per riconoscere lo stesso calcolo già in coda: quella della cache (con i
+    materiali) più gli ID degli spezzoni col loro materiale, perché il piano condiviso
+    li usa così come sono.
+    """
+    coppie = sorted((s.lunghezza, s.materiale, s.id) for s in spezzoni)
+    return hashlib.sha256(f"{chiave_calcolo(spezzoni, richieste, ottimizzatore)}|{coppie}".encode()).hexdigest()
+
+
+def _percentile(valori: Deque[float], p: float) -> Optional[float]:
+    if not valori:
+        return None
+    ordinati = sorted(valori)
+    return round(ordinati[min(len(ordinati) - 1, int(p * len(ordinati)))], 6)
+
+
+class _Lavoro:
+    """Un calcolo nella coda, con le sessioni che ne aspettano il risultato"""
+
+    def __init__(self, sessione: str, calcolo: CalcoloInSfondo, chiave: Optional[str]):
+        self.sessione = sessione
+        self.calcolo = calcolo
+        self.chiave = chiave
+        self.iscritti = 0
+        self.inserito = time.perf_counter()
+        self.iniziato: Optional[float] = None
+        self.saltato = False  # annullato prima di partire: chiuso senza calcolare
+
+
+class Iscrizione:
+    """
+    Quello che riceve una sessione da `CodaCalcoli.invia`: si usa come un
+    CalcoloInSfondo. Se più sessioni aspettano lo stesso calcolo, `annulla()` lo
+    ferma solo quando l'hanno annullato tutte.
+    """
+
+    def __init__(self, coda: "CodaCalcoli", lavoro: _Lavoro):
+        self._coda = coda
+        self._lavoro = lavoro
+        self._ritirata = False
+
+    @property
+    def avanzamento(self) -> Avanzamento:
+        return self._lavoro.calcolo.avanzamento
+
+    @property
+    def risultato(self):
+        return self._lavoro.calcolo.risultato
+
+    @property
+    def errore(self) -> Optional[BaseException]:
+        return self._lavoro.calcolo.errore
+
+    @property
+    def finito(self) -> bool:
+        return self._lavoro.calcolo.finito
+
+    @property
+    def posizione(self) -> int:
+        """Posto in fila: 1 = il prossimo a partire, 0 = già partito"""
+        return self._coda.posizione(self._lavoro)
+
+    def attendi(self, timeout: Optional[float] = None) -> bool:
+        return self._lavoro.calcolo.attendi(timeout)
+
+    def annulla(self):
+        if not self._ritirata:
+            self._ritirata = True
+            self._coda._ritira(self._lavoro)
+
+
+class CodaCalcoli:
+    """
+    Coda dei calcoli del processo, da condividere tra tutte le sessioni
+    (nella webapp con `st.cache_resource`).
+
+      - al massimo `lavoratori` calcoli insieme, gli altri aspettano: CPU e memoria
+        restano sotto controllo anche con molti utenti
+      - turni equi: le sessioni con calcoli in attesa si alternano, una per volta,
+        così chi ne manda tanti non blocca gli altri
+      - un calcolo identico (stessa `chiave`) già in coda o in corso non viene
+        ripetuto: le sessioni aspettano lo stesso
+      - `metriche()`: lunghezza della coda, attese e durate recenti (anche sul log
+        "bestcut", a livello INFO, alla fine di ogni calcolo)
+    """
+
+    def __init__(self, lavoratori: Optional[int] = None, campioni: int = 500):
+        self.lavoratori = lavoratori or min(4, os.cpu_count() or 1)
+        self._condizione = threading.Condition()
+        self._code: Dict[str, Deque[_Lavoro]] = {}  # sessione -> calcoli in attesa
+        self._turni: Deque[str] = deque()  # sessioni con calcoli in attesa, nell'ordine in cui toccano
+        self._per_chiave: Dict[str, _Lavoro] = {}  # calcoli in attesa o in corso
+        self._in_corso = 0
+        self._attese: Deque[float] = deque(maxlen=campioni)
+        self._durate: Deque[float] = deque(maxlen=campioni)
+        self._contatori = {"inviati": 0, "deduplicati": 0, "completati": 0, "errori": 0, "annullati": 0}
+        self._chiusa = False
+        self._thread = [threading.Thread(target=self._lavora, name=f"bestcut-coda-{i}", daemon=True)
+                        for i in range(self.lavoratori)]
+        for thread in self._thread:
+            thread.start()
+
+    def invia(self, sessione: str, calcolo: Callable[[Avanzamento], object],
+              chiave: Optional[str] = None) -> Iscrizione:
+        """
+        Mette in coda `calcolo(avanzamento)` per `sessione`. Con `chiave` (vedi
+        `chiave_istanza`) un calcolo uguale già in coda o in corso viene riusato.
+        """
+        with self._condizione:
+            if self._chiusa:
+                raise RuntimeError("Coda dei calcoli chiusa")
+            self._contatori["inviati"] += 1
+            lavoro = self._per_chiave.get(chiave) if chiave is not None else None
+            if lavoro is not None and not lavoro.calcolo.avanzamento.annullato:
+                self._contatori["deduplicati"] += 1
+            else:
+                lavoro = _Lavoro(sessione, CalcoloInSfondo(calcolo), chiave)
+                if chiave is not None:
+                    self._per_chiave[chiave] = lavoro
+                if sessione not in self._code:
+                    self._code[sessione] = deque()
+                    self._turni.append(sessione)
+                self._code[sessione].append(lavoro)
+                self._condizione.notify()
+            lavoro.iscritti += 1
+            return Iscrizione(self, lavoro)
+
+    def posizione(self, lavoro: _Lavoro) -> int:
+        """
+        Posto in fila del calcolo (0 se già partito): a turno, ogni sessione in
+        attesa ne fa partire uno per giro.
+        """
+        with self._condizione:
+            if lavoro.iniziato is not None or lavoro.calcolo.finito:
+                return 0
+            coda = self._code.get(lavoro.sessione)
+            if coda is None or lavoro not in coda:
+                return 0
+            giri = list(coda).index(lavoro)
+            turno = list(self._turni).index(lavoro.sessione)
+            prima = 0
+            for k, sessione in enumerate(self._turni):
+                # Nel giro del lavoro passano prima solo le sessioni davanti nel turno
+                prima += min(len(self._code[sessione]), giri + (1 if k < turno else 0))
+            return prima + 1
+
+    def metriche(self) -> Dict[str, object]:
+        with self._condizione:
+            in_coda = sum(len(coda) for coda in self._code.values())
+            return {
+                "lavoratori": self.lavoratori,
+                "in_coda": in_coda,
+                "in_corso": self._in_corso,
+                "sessioni_in_attesa": len(self._turni),
+                **self._contatori,
+                "attesa_media_s": round(sum(self._attese) / len(self._attese), 6) if self._attese else None,
+                "attesa_p95_s": _percentile(self._attese, 0.95),
+                "durata_media_s": round(sum(self._durate) / len(self._durate), 6) if self._durate else None,
+                "durata_p95_s": _percentile(self._durate, 0.95),
+            }
+
+    def chiudi(self, attendi: bool = True):
+        """Niente più calcoli nuovi; quelli in coda vengono annullati (chiusi senza calcolare)"""
+        with self._condizione:
+            self._chiusa = True
+            for coda in self._code.values():
+                for lavoro in coda:
+                    lavoro.calcolo.annulla()
+            self._condizione.notify_all()
+        if attendi:
+            for thread in self._thread:
+                thread.join()
+
+    def _ritira(self, lavoro: _Lavoro):
+        with self._condizione:
+            lavoro.iscritti -= 1
+            if lavoro.iscritti > 0:
+                return
+            if not lavoro.calcolo.finito:
+                lavoro.calcolo.annulla()
+                # Quelli ancora in coda si contano quando vengono saltati
+                if lavoro.iniziato is not None and not lavoro.saltato:
+                    self._contatori["annullati"] += 1
+            if lavoro.chiave is not None and self._per_chiave.get(lavoro.chiave) is lavoro:
+                del self._per_chiave[lavoro.chiave]
+
+    def _prossimo(self) -> Optional[_Lavoro]:
+        """Il primo calcolo della sessione di turno; la sessione torna in fondo se ne ha altri"""
+        with self._condizione:
+            while not self._turni and not self._chiusa:
+                self._condizione.wait()
+            if not self._turni:
+                return None
+            sessione = self._turni.popleft()
+            coda = self._code[sessione]
+            lavoro = coda.popleft()
+            if coda:
+                self._turni.append(sessione)
+            else:
+                del self._code[sessione]
+            lavoro.iniziato = time.perf_counter()
+            # Deciso qui, sotto il lock: un annullamento che arriva dopo lo conta _ritira
+            lavoro.saltato = lavoro.calcolo.avanzamento.annullato
+            if not lavoro.saltato:
+                self._attese.append(lavoro.iniziato - lavoro.inserito)
+                self._in_corso += 1
+            return lavoro
+
+    def _lavora(self):
+        while True:
+            lavoro = self._prossimo()
+            if lavoro is None:
+                return
+            if lavoro.saltato:
+                # Annullato mentre aspettava: nessuno ne vuole il piano, il risolutore non parte
+                lavoro.calcolo.salta()
+                with self._condizione:
+                    self._contatori["annullati"] += 1
+                    if lavoro.chiave is not None and self._per_chiave.get(lavoro.chiave) is lavoro:
+                        del self._per_chiave[lavoro.chiave]
+                continue
+            lavoro.calcolo.esegui()
+            with self._condizione:
+                self._in_corso -= 1
+                self._durate.append(time.perf_counter() - lavoro.iniziato)
+                self._contatori["errori" if lavoro.calcolo.errore is not None else "completati"] += 1
+                if lavoro.chiave is not None and self._per_chiave.get(lavoro.chiave) is lavoro:
+                    del self._per_chiave[lavoro.chiave]
+            if _log.isEnabledFor(logging.INFO):
+                _log.info(json.dumps({"evento": "coda", **self.metriche()}))
@@ -0,0 +1,184 @@
+# bestcut/excel.py
+# Report Excel del piano di taglio
+
+from datetime import datetime
+from io import BytesIO
+
+# Importazione openpyxl
+try:
+    from openpyxl import Workbook
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.styles import Font, PatternFill, Alignment, Border, Side, NamedStyle
+    EXCEL_DISPONIBILE = True
+except ImportError:
+    EXCEL_DISPONIBILE = False
+
+
+def _stili():
+    """
+    Stili con nome, registrati una volta nella cartella: ogni cella li richiama
+    per nome invece di creare i propri Font/Border/PatternFill.
+    """
+    bordo = Border(left=Side(style='thin'), right=Side(style='thin'),
+                   top=Side(style='thin'), bottom=Side(style='thin'))
+    blu = PatternFill(start_color="2196F3", end_color="2196F3", fill_type="solid")
+    return [
+        NamedStyle("bc_titolo", font=Font(size=18, bold=True, color="2196F3"),
+                   alignment=Alignment(horizontal='center')),
+        NamedStyle("bc_data", font=Font(italic=True)),
+        NamedStyle("bc_completato", font=Font(size=12, bold=True, color="4CAF50")),
+        NamedStyle("bc_parziale", font=Font(size=12, bold=True, color="FF9800")),
+        NamedStyle("bc_sezione", font=Font(name='Calibri', size=14, bold=True, color="FFFFFF"),
+                   fill=blu, alignment=Alignment(horizontal='center')),
+        NamedStyle("bc_intestazione", font=Font(name='Calibri', size=12, bold=True), border=bordo),
+        NamedStyle("bc_cella", border=bordo),
+        NamedStyle("bc_grassetto", font=Font(bold=True), border=bordo),
+        NamedStyle("bc_mancante", font=Font(bold=True, color="f44336"), border=bordo),
+        NamedStyle("bc_nessun_mancante", font=Font(bold=True, color="4CAF50"), border=bordo),
+        NamedStyle("bc_spezzone", font=Font(name='Calibri', size=12, bold=True),
+                   fill=PatternFill(start_color="E3F2FD", fill_type="solid")),
+        NamedStyle("bc_colonna", font=Font(bold=True), border=bordo,
+                   fill=PatternFill(start_color="F5F5F5", fill_type="solid")),
+        NamedStyle("bc_scarto_ok", font=Font(bold=True, color="4CAF50"), border=bordo),
+        NamedStyle("bc_scarto_ko", font=Font(bold=True, color="f44336"), border=bordo),
+    ]
+
+
+def _nome_foglio(materiale: str, usati: set) -> str:
+    """Nome di foglio valido per Excel (max 31 caratteri, niente []:*?/\\) e non ancora usato"""
+    nome = "".join("-" if c in '[]:*?/\\' else c for c in materiale).strip()[:31] or "Senza materiale"
+    base, k = nome, 2
+    while nome.lower() in usati:
+        suffisso = f" ({k})"
+        nome = base[:31 - len(suffisso)] + suffisso
+        k += 1
+    usati.add(nome.lower())
+    return nome
+
+
+def crea_excel_download(spezzoni, richieste, risultato, soglia):
+    """
+    Crea file Excel in memoria per il download.
+    Cartella in modalità write-only: le righe sono scritte in sequenza e non restano
+    in memoria come celle, gli stili sono condivisi per nome.
+    Con più materiali (`risultato.materiali`): foglio di riepilogo e un foglio per materiale.
+    """
+    wb = Workbook(write_only=True)
+    for stile in _stili():
+        wb.add_named_style(stile)
+    if risultato.materiali is None:
+        _scrivi_piano(wb.create_sheet("Piano Taglio"), spezzoni, richieste, risultato, soglia)
+    else:
+        from .materiali import riepilogo_materiali
+
+        ws = wb.create_sheet("Riepilogo materiali")
+        for i, w in enumerate([24, 14, 16, 16, 18, 20, 30], 1):
+            ws.column_dimensions[chr(64+i)].width = w
+        ws.append([_cella(ws, "RIEPILOGO PER MATERIALE", "bc_titolo")])
+        ws.append([])
+        intestazione = ['Materiale', 'Completato', 'Spezzoni usati', 'Spezzoni totali', 'Scarto (m)',
+                        'Tubo mancante (m)', 'Tagli mancanti']
+        ws.append([_cella(ws, valore, "bc_intestazione") for valore in intestazione])
+        for voce in riepilogo_materiali(risultato):
+            ws.append([_cella(ws, valore, "bc_cella") for valore in (
+                voce["materiale"] or "-", "SI" if voce["completato"] else "NO", voce["spezzoni_usati"],
+                voce["spezzoni_totali"], voce["scarto_totale"], voce["tubo_mancante"],
+                ", ".join(f"{misura:g} x{n}" for misura, n in voce["tagli_mancanti"]) or "-")])
+        usati = {"riepilogo materiali"}
+        for materiale, parte in risultato.materiali.items():
+            _scrivi_piano(wb.create_sheet(_nome_foglio(materiale, usati)),
+                          [s for s in spezzoni if s.materiale == materiale],
+                          [r for r in richieste if r.materiale == materiale], parte, soglia,
+                          f"PIANO DI TAGLIO - {materiale or 'SENZA MATERIALE'}")
+
+    excel_buffer = BytesIO()
+    wb.save(excel_buffer)
+    excel_buffer.seek(0)
+    return excel_buffer
+
+
+def _cella(ws, valore, stile):
+    cella = WriteOnlyCell(ws, value=valore)
+    cella.style = stile
+    return cella
+
+
+def _scrivi_piano(ws, spezzoni, richieste, risultato, soglia, titolo="PIANO DI TAGLIO TUBI"):
+    """Un foglio con spezzoni, riepilogo dei tagli e piano dettagliato"""
+    for i, w in enumerate([15, 15, 15, 18, 18], 1):
+        ws.column_dimensions[chr(64+i)].width = w
+
+    riga_corrente = 0
+
+    def riga(*valori, stile=None, unisci=None):
+        # unisci: ultima colonna (lettera) dell'unione a partire da A, solo per titoli e sezioni
+        nonlocal riga_corrente
+        riga_corrente += 1
+        celle = []
+        for valore in valori:
+            if isinstance(valore, tuple):
+                valore, stile_cella = valore
+            else:
+                stile_cella = stile
+            cella = WriteOnlyCell(ws, value=valore)
+            if stile_cella:
+                cella.style = stile_cella
+            celle.append(cella)
+        ws.append(celle)
+        if unisci:
+            ws.merged_cells.add(f'A{riga_corrente}:{unisci}{riga_corrente}')
+
+    riga(titolo, stile="bc_titolo", unisci='E')
+    riga(f"Generato: {datetime.now().strftime('%d/%m/%Y %H:%M')}", stile="bc_data")
+    riga()
+
+    # Stato completamento
+    if risultato.completato:
+        riga("✅ TAGLIO COMPLETATO - Tutti i pezzi realizzabili", stile="bc_completato", unisci='E')
+    else:
+        riga("⚠️ TAGLIO PARZIALE - Materiali insufficienti", stile="bc_parziale", unisci='E')
+    riga()
+
+    # Spezzoni disponibili
+    riga("SPEZZONI DISPONIBILI", stile="bc_sezione", unisci='E')
+    riga('ID', 'Lunghezza (m)', 'Lunghezza (cm)', stile="bc_intestazione")
+    for spezzone in spezzoni:
+        riga(spezzone.id, spezzone.lunghezza, spezzone.lunghezza * 100, stile="bc_cella")
+    riga()
+
+    # Tagli richiesti vs fatti
+    riga("RIEPILOGO TAGLI", stile="bc_sezione", unisci='E')
+    riga('Misura (m)', 'Misura (cm)', 'Quantita', 'Totale (m)', 'Tubo mancante (m)', stile="bc_intestazione")
+    for richiesta in richieste:
+        mancanti = risultato.tagli_mancanti.get(richiesta.lunghezza, 0)
+        tubo_mancante = mancanti * richiesta.lunghezza if mancanti > 0 else 0
+        riga(richiesta.lunghezza, richiesta.lunghezza * 100, richiesta.quantita,
+             richiesta.lunghezza * richiesta.quantita, tubo_mancante if tubo_mancante > 0 else "-",
+             stile="bc_cella")
+    riga()
+
+    # Riga totale tubo mancante
+    totale_mancante = sum(misura * qty for misura, qty in risultato.tagli_mancanti.items())
+    riga(("TOTALE TUBO MANCANTE:", "bc_grassetto"),
+         (f"{totale_mancante:.2f} m" if totale_mancante > 0 else "0 m",
+          "bc_mancante" if totale_mancante > 0 else "bc_nessun_mancante"))
+    ws.merged_cells.add(f'B{riga_corrente}:E{riga_corrente}')
+    riga()
+
+    # Piano di taglio dettagliato: nessuna unione per spezzone, restano righe semplici
+    riga("PIANO DI TAGLIO DETTAGLIATO", stile="bc_sezione", unisci='E')
+    for piano in risultato.piani:
+        riga(f"Spezzone #{piano.spezzone_id} ({piano.spezzone_lunghezza:.3f}m)", None, None, None, None,
+             stile="bc_spezzone")
+        riga('N°', 'Misura (m)', 'Misura (cm)', 'Inizio (m)', 'Fine (m)', stile="bc_colonna")
+
+        posizione = 0.0
+        for i, taglio in enumerate(piano.tagli, 1):
+            riga(i, taglio, taglio * 100, posizione, posizione + taglio, stile="bc_cella")
+            posizione += taglio
+
+        ottimale = piano.scarto <= soglia
+        riga(("SCARTO", "bc_scarto_ok" if ottimale else "bc_scarto_ko"),
+             (piano.scarto, "bc_grassetto"), (None, "bc_cella"),
+             ("OTTIMALE" if ottimale else "DA RIUTILIZZARE", "bc_cella"))
+        riga()
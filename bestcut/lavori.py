@@ -0,0 +1,388 @@
+# bestcut/lavori.py
+# Lavori a lotti: lettura degli ordini (CSV, JSON Lines, Excel) e scrittura dei risultati
+
+import csv
+import json
+import sys
+from dataclasses import dataclass
+from itertools import groupby
+from typing import Iterator, List, Optional, Tuple, Union
+
+from .modelli import Spezzone, TaglioRichiesto, RisultatoCalcolo, controlla_misure
+from .materiali import riepilogo_materiali
+
+FORMATI_INGRESSO = ("csv", "jsonl", "xlsx")
+FORMATI_USCITA = ("jsonl", "xlsx")
+# Errori di un ordine malformato (campi mancanti, numeri non validi): fermano quell'ordine, non il lotto
+ERRORI_ORDINE = (ValueError, KeyError, TypeError, IndexError)
+
+
+@dataclass
+class Lavoro:
+    """Un ordine da calcolare: spezzoni, tagli richiesti e soglia (facoltativa)"""
+    id: str
+    spezzoni: List[Spezzone]
+    richieste: List[TaglioRichiesto]
+    soglia: Optional[float] = None
+
+
+@dataclass
+class OrdineNonValido:
+    """Un ordine che non si è potuto leggere o calcolare: resta al suo posto nel flusso, con il motivo"""
+    id: str
+    errore: str
+
+    @classmethod
+    def da_errore(cls, id_lavoro: str, errore: Exception) -> "OrdineNonValido":
+        messaggio = f"campo mancante: {errore}" if isinstance(errore, KeyError) else str(errore)
+        # L'ID c'è già: niente "Ordine X: " ripetuto dai controlli di _crea_lavoro
+        prefisso = f"Ordine {id_lavoro}: "
+        return cls(id_lavoro, messaggio[len(prefisso):] if messaggio.startswith(prefisso) else messaggio)
+
+
+def formato_da_percorso(percorso: str, predefinito: str) -> str:
+    """Formato dedotto dall'estensione del file ('-' = flusso standard)"""
+    if percorso == "-":
+        return predefinito
+    estensione = percorso.rsplit(".", 1)[-1].lower()
+    return {"json": "jsonl", "ndjson": "jsonl", "xlsm": "xlsx"}.get(estensione, estensione)
+
+
+def leggi_lavori(percorso: str, formato: Optional[str] = None,
+                 errori: bool = False) -> Iterator[Union[Lavoro, OrdineNonValido]]:
+    """
+    Legge i lavori uno alla volta, senza caricare tutto il file in memoria.
+    Un ordine malformato solleva l'errore; con `errori` diventa invece un
+    OrdineNonValido al suo posto e la lettura prosegue con il successivo.
+
+    JSON Lines, un lavoro per riga:
+        {"id": "A1", "spezzoni": [6, 6, {"lunghezza": 4.5, "quantita": 2}],
+         "richieste": [[3.2, 1, 2.0], {"lunghezza": 0.5, "quantita": 5, "priorita": 1}], "soglia": 0.3}
+    Con più materiali/profili: "materiale" nelle voci ([6, 4, "40x40"] per gli spezzoni,
+    [3.2, 1, 1.0, "40x40"] per le richieste) o per tutto l'ordine, come "soglia".
+    CSV ed Excel, una riga per spezzone o misura, righe dello stesso ordine consecutive:
+        ordine, tipo (spezzone/taglio), lunghezza, quantita[, priorita][, materiale]
+    """
+    formato = formato or formato_da_percorso(percorso, "jsonl")
+    if formato == "jsonl":
+        yield from _leggi_jsonl(percorso, errori)
+    elif formato == "csv":
+        yield from _lavori_da_righe(_righe_csv(percorso), errori)
+    elif formato == "xlsx":
+        yield from _lavori_da_righe(_righe_excel(percorso), errori)
+    else:
+        raise ValueError(f"Formato di ingresso non supportato: {formato!r} ({', '.join(FORMATI_INGRESSO)})")
+
+
+def _apri_testo(percorso: str):
+    if percorso == "-":
+        return sys.stdin
+    return open(percorso, newline="", encoding="utf-8-sig")
+
+
+def _voce(valore, materiale: str = "") -> Tuple[float, int, str]:
+    """(lunghezza, quantità, materiale) da un numero, una lista [lunghezza, quantità, materiale] o un oggetto JSON"""
+    if isinstance(valore, dict):
+        return float(valore["lunghezza"]), int(valore.get("quantita", 1)), str(valore.get("materiale", materiale))
+    if isinstance(valore, (list, tuple)):
+        return (float(valore[0]), int(valore[1]) if len(valore) > 1 else 1,
+                str(valore[2]) if len(valore) > 2 else materiale)
+    return float(valore), 1, materiale
+
+
+def _voce_richiesta(valore, materiale: str = "") -> Tuple[float, int, float, str]:
+    """
+    (lunghezza, quantità, priorità, materiale): come _voce, con la priorità facoltativa
+    (1 se manca); nelle liste la priorità viene prima: [lunghezza, quantità, priorità, materiale]
+    """
+    if isinstance(valore, dict):
+        lunghezza, quantita, materiale = _voce(valore, materiale)
+        return lunghezza, quantita, float(valore.get("priorita", 1.0)), materiale
+    if isinstance(valore, (list, tuple)):
+        lunghezza, quantita, _ = _voce(valore[:2])
+        return (lunghezza, quantita, float(valore[2]) if len(valore) > 2 else 1.0,
+                str(valore[3]) if len(valore) > 3 else materiale)
+    return float(valore), 1, 1.0, materiale
+
+
+def _crea_lavoro(id_lavoro: str, spezzoni: List[Tuple[float, int, str]],
+                 richieste: List[Tuple[float, int, float, str]], soglia: Optional[float] = None) -> Lavoro:
+    # Misure senza senso: errore dell'ordine, non un piano inventato (nemmeno se la quantità è 0)
+    try:
+        primi, prossimo = [], 1  # il primo spezzone di ogni riga, con il suo ID, per il messaggio
+        for lunghezza, quantita, _ in spezzoni:
+            if quantita < 0:
+                raise ValueError(f"Spezzone da {lunghezza} m: quantità negativa ({quantita})")
+            primi.append(Spezzone(lunghezza, prossimo))
+            prossimo += quantita
+        controlla_misure(primi,
+                         [TaglioRichiesto(lunghezza, quantita) for lunghezza, quantita, _, _ in richieste])
+        if soglia is not None:
+            valore = _numero(soglia)
+            if valore is None or not valore >= 0:
+                raise ValueError(f"Soglia non valida ({soglia!r})")
+            soglia = valore
+    except ValueError as e:
+        raise ValueError(f"Ordine {id_lavoro}: {e}") from e
+    # Gli ID degli spezzoni seguono l'ordine del file, come nell'inserimento a mano
+    voci = [(lunghezza, materiale) for lunghezza, quantita, materiale in spezzoni for _ in range(quantita)]
+    return Lavoro(
+        id=id_lavoro,
+        spezzoni=[Spezzone(lunghezza, i, materiale) for i, (lunghezza, materiale) in enumerate(voci, 1)],
+        richieste=[TaglioRichiesto(lunghezza, quantita, priorita, materiale)
+                   for lunghezza, quantita, priorita, materiale in richieste if quantita > 0],
+        soglia=soglia
+    )
+
+
+def lavoro_da_dict(dati: dict, id_predefinito: str = "1") -> Lavoro:
+    """Un lavoro dall'oggetto JSON di una riga JSON Lines (vedi `leggi_lavori`)"""
+    if not isinstance(dati, dict):
+        raise ValueError("ogni ordine deve essere un oggetto JSON")
+    materiale = str(dati.get("materiale", ""))
+    return _crea_lavoro(
+        str(dati.get("id", id_predefinito)),
+        [_voce(v, materiale) for v in dati.get("spezzoni", [])],
+        [_voce_richiesta(v, materiale) for v in dati.get("richieste", [])],
+        dati.get("soglia")
+    )
+
+
+def _leggi_jsonl(percorso: str, errori: bool = False) -> Iterator[Union[Lavoro, OrdineNonValido]]:
+    with _apri_testo(percorso) as file:
+        for numero, riga in enumerate(file, 1):
+            if not riga.strip():
+                continue
+            dati = None
+            try:
+                dati = json.loads(riga)
+                lavoro = lavoro_da_dict(dati, str(numero))
+            except ERRORI_ORDINE as e:
+                if not errori:
+                    raise
+                lavoro = OrdineNonValido.da_errore(
+                    str(dati.get("id", numero)) if isinstance(dati, dict) else str(numero), e)
+            yield lavoro
+
+
+def _righe_csv(percorso: str) -> Iterator[Tuple]:
+    with _apri_testo(percorso) as file:
+        for riga in csv.DictReader(file):
+            yield (riga.get("ordine"), riga.get("tipo"), riga.get("lunghezza"), riga.get("quantita"),
+                   riga.get("priorita"), riga.get("materiale"))
+
+
+def _righe_excel(percorso: str) -> Iterator[Tuple]:
+    from openpyxl import load_workbook
+
+    wb = load_workbook(percorso, read_only=True, data_only=True)
+    try:
+        righe = wb.worksheets[0].iter_rows(values_only=True)
+        intestazione = [str(c).strip().lower() if c is not None else "" for c in next(righe, ())]
+        colonne = [intestazione.index(nome) for nome in ("ordine", "tipo", "lunghezza", "quantita")]
+        # Priorità e materiale sono facoltativi
+        for nome in ("priorita", "materiale"):
+            colonne.append(intestazione.index(nome) if nome in intestazione else len(intestazione))
+        for riga in righe:
+            if riga and any(c is not None for c in riga):
+                yield tuple(riga[c] if c < len(riga) else None for c in colonne)
+    finally:
+        wb.close()
+
+
+def _lavori_da_righe(righe: Iterator[Tuple], errori: bool = False) -> Iterator[Union[Lavoro, OrdineNonValido]]:
+    for ordine, gruppo in groupby(righe, key=lambda r: r[0]):
+        try:
+            lavoro = _lavoro_da_gruppo(str(ordine), gruppo)
+        except ERRORI_ORDINE as e:
+            if not errori:
+                raise
+            lavoro = OrdineNonValido.da_errore(str(ordine), e)
+        yield lavoro
+
+
+def _lavoro_da_gruppo(id_lavoro: str, gruppo: Iterator[Tuple]) -> Lavoro:
+    spezzoni, richieste = [], []
+    for _, tipo, lunghezza, quantita, priorita, materiale in gruppo:
+        voce = (float(lunghezza), int(quantita) if quantita not in (None, "") else 1)
+        materiale = str(materiale).strip() if materiale is not None else ""
+        if str(tipo).strip().lower() in ("spezzone", "s"):
+            spezzoni.append(voce + (materiale,))
+        else:
+            richieste.append(voce + (float(priorita) if priorita not in (None, "") else 1.0, materiale))
+    return _crea_lavoro(id_lavoro, spezzoni, richieste)
+
+
+def _numero(testo) -> Optional[float]:
+    """Numero scritto all'italiana o all'inglese ("6,5" o "6.5"); None se non è un numero"""
+    if isinstance(testo, (int, float)):
+        return float(testo)
+    try:
+        return float(str(testo).strip().replace(",", "."))
+    except ValueError:
+        return None
+
+
+def misure_da_righe(righe) -> List[Tuple[float, int, str]]:
+    """
+    (lunghezza, quantità, materiale) da righe di una, due o tre colonne; la quantità
+    manca = 1, il materiale manca = "". Le righe che non iniziano con un numero
+    (intestazioni, vuote) sono saltate.
+    """
+    misure = []
+    for riga in righe:
+        celle = [c for c in riga if c is not None and str(c).strip() != ""]
+        if not celle:
+            continue
+        lunghezza = _numero(celle[0])
+        quantita = _numero(celle[1]) if len(celle) > 1 else 1
+        if lunghezza is None or quantita is None or lunghezza <= 0 or quantita <= 0:
+            continue
+        misure.append((lunghezza, int(quantita), " ".join(str(c).strip() for c in celle[2:])))
+    return misure
+
+
+def _dividi_riga(riga: str) -> List[str]:
+    # Tabulazione (copia da Excel) o punto e virgola; altrimenti spazi.
+    # La virgola separa solo se non può essere un decimale ("6,5" resta un numero)
+    for separatore in ("\t", ";"):
+        if separatore in riga:
+            return riga.split(separatore)
+    parti = riga.split()
+    if len(parti) == 1 and riga.count(",") == 1 and _numero(riga) is None:
+        parti = riga.split(",")
+    elif len(parti) == 1 and riga.count(",") > 1:
+        parti = riga.split(",")
+    return parti
+
+
+def misure_da_testo(testo: str) -> List[Tuple[float, int, str]]:
+    """Misure incollate dagli appunti o da un file CSV: "lunghezza [quantità [materiale]]" per riga"""
+    return misure_da_righe(_dividi_riga(riga) for riga in testo.splitlines())
+
+
+def misure_da_file(file, nome: str) -> List[Tuple[float, int, str]]:
+    """Misure da un file caricato (CSV/testo o Excel): prime tre colonne del primo foglio"""
+    if nome.lower().endswith((".xlsx", ".xlsm")):
+        from openpyxl import load_workbook
+
+        wb = load_workbook(file, read_only=True, data_only=True)
+        try:
+            return misure_da_righe(riga[:3] for riga in wb.worksheets[0].iter_rows(values_only=True))
+        finally:
+            wb.close()
+    contenuto = file.read()
+    if isinstance(contenuto, bytes):
+        contenuto = contenuto.decode("utf-8-sig", errors="replace")
+    return misure_da_testo(contenuto)
+
+
+def _materiale_dei_piani(risultato: RisultatoCalcolo) -> dict:
+    """ID spezzone -> materiale, per i risultati con più materiali"""
+    return {i: materiale for materiale, parte in (risultato.materiali or {}).items()
+            for i in parte.piani.spezzone_ids.tolist()}
+
+
+def risultato_in_dict(id_lavoro: str, risultato: RisultatoCalcolo, piani: bool = True,
+                      statistiche: bool = True) -> dict:
+    """
+    Risultato in forma JSON (le misure diventano coppie [misura, quantità]).
+    Con più materiali: riepilogo per materiale e materiale di ogni piano.
+    Senza `piani` solo il riepilogo; senza `statistiche` niente tempi, così lo
+    stesso piano dà sempre lo stesso JSON.
+    """
+    dati = {
+        "id": id_lavoro,
+        "completato": risultato.completato,
+        "spezzoni_usati": risultato.spezzoni_usati,
+        "spezzoni_totali": risultato.spezzoni_totali,
+        "scarto_totale": risultato.scarto_totale,
+        "limite_inferiore": risultato.limite_inferiore,
+        "tagli_fatti": [[misura, n] for misura, n in risultato.tagli_fatti.items()],
+        "tagli_mancanti": [[misura, n] for misura, n in risultato.tagli_mancanti.items()],
+        "piani": [
+            {"spezzone_id": p.spezzone_id, "spezzone_lunghezza": p.spezzone_lunghezza,
+             "tagli": p.tagli, "scarto": p.scarto}
+            for p in risultato.piani
+        ] if piani else None,
+        "statistiche": risultato.statistiche.in_dict() if risultato.statistiche and statistiche else None,
+    }
+    if not piani:
+        del dati["piani"]
+    if not statistiche:
+        del dati["statistiche"]
+    if risultato.materiali is not None:
+        materiale_di = _materiale_dei_piani(risultato)
+        dati["materiali"] = riepilogo_materiali(risultato)
+        for piano in dati.get("piani", []):
+            piano["materiale"] = materiale_di.get(piano["spezzone_id"], "")
+    return dati
+
+
+class ScrittoreJSONL:
+    """Un risultato per riga, scritto (e svuotato su disco) appena pronto"""
+
+    def __init__(self, percorso: str):
+        self._file = sys.stdout if percorso == "-" else open(percorso, "w", encoding="utf-8")
+
+    def scrivi(self, id_lavoro: str, risultato: RisultatoCalcolo):
+        self._file.write(json.dumps(risultato_in_dict(id_lavoro, risultato), ensure_ascii=False) + "\n")
+        self._file.flush()
+
+    def scrivi_errore(self, id_lavoro: str, errore: str):
+        """Al posto del risultato di un ordine non valido: {"id": ..., "errore": ...}"""
+        self._file.write(json.dumps({"id": id_lavoro, "errore": errore}, ensure_ascii=False) + "\n")
+        self._file.flush()
+
+    def chiudi(self):
+        if self._file is not sys.stdout:
+            self._file.close()
+
+
+class ScrittoreExcel:
+    """
+    Cartella Excel in modalità write-only: le righe vanno su disco man mano,
+    la memoria non cresce con il numero di ordini.
+    Foglio "Riepilogo" (un ordine per riga, o una per materiale con i suoi tagli
+    mancanti; gli ordini non validi con il motivo nella colonna "Errore") e foglio "Piani" (uno spezzone per riga).
+    """
+
+    def __init__(self, percorso: str):
+        from openpyxl import Workbook
+
+        self._percorso = percorso
+        self._wb = Workbook(write_only=True)
+        self._riepilogo = self._wb.create_sheet("Riepilogo")
+        self._riepilogo.append(["Ordine", "Completato", "Spezzoni usati", "Spezzoni totali",
+                                "Scarto totale (m)", "Tubo mancante (m)", "Materiale", "Tagli mancanti", "Errore"])
+        self._piani = self._wb.create_sheet("Piani")
+        self._piani.append(["Ordine", "Spezzone", "Lunghezza (m)", "Tagli (m)", "Scarto (m)", "Materiale"])
+
+    def scrivi(self, id_lavoro: str, risultato: RisultatoCalcolo):
+        for voce in riepilogo_materiali(risultato):
+            self._riepilogo.append([id_lavoro, "SI" if voce["completato"] else "NO", voce["spezzoni_usati"],
+                                    voce["spezzoni_totali"], voce["scarto_totale"], voce["tubo_mancante"],
+                                    voce["materiale"],
+                                    ", ".join(f"{misura:g} x{n}" for misura, n in voce["tagli_mancanti"]) or None])
+        materiale_di = _materiale_dei_piani(risultato)
+        for piano in risultato.piani:
+            self._piani.append([id_lavoro, piano.spezzone_id, piano.spezzone_lunghezza,
+                                " + ".join(f"{t:g}" for t in piano.tagli), piano.scarto,
+                                materiale_di.get(piano.spezzone_id, "")])
+
+    def scrivi_errore(self, id_lavoro: str, errore: str):
+        self._riepilogo.append([id_lavoro, "NO", None, None, None, None, None, None, errore])
+
+    def chiudi(self):
+        self._wb.save(self._percorso)
+
+
+def apri_scrittore(percorso: str, formato: Optional[str] = None):
+    formato = formato or formato_da_percorso(percorso, "jsonl")
+    if formato == "jsonl":
+        return ScrittoreJSONL(percorso)
+    if formato == "xlsx":
+        if percorso == "-":
+            raise ValueError("L'uscita Excel richiede un file")
+        return ScrittoreExcel(percorso)
+    raise ValueError(f"Formato di uscita non supportato: {formato!r} ({', '.join(FORMATI_USCITA)})")
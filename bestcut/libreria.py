@@ -0,0 +1,218 @@
+# bestcut/libreria.py
+# Libreria dei pattern di taglio: gli schemi buoni trovati restano per gli ordini successivi
+
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterable, List, Tuple
+
+
+def _testo_pezzi(pezzi: Dict[int, int]) -> str:
+    """Forma canonica di un pattern: "3200x1,500x5" (misure decrescenti, in unità intere)"""
+    return ",".join(f"{misura}x{n}" for misura, n in sorted(pezzi.items(), reverse=True) if n)
+
+
+def _pezzi_da_testo(testo: str) -> Dict[int, int]:
+    pezzi = {}
+    for voce in testo.split(","):
+        misura, n = voce.split("x")
+        pezzi[int(misura)] = int(n)
+    return pezzi
+
+
+# Versione dello schema (PRAGMA user_version): 1 = id esplicito e tabella pattern_misure per la ricerca
+_VERSIONE = 1
+
+# Librerie arrivate in questo processo per pickle, per (processo, percorso, opzioni): le
+# opzioni passano ai processi di lavoro a ogni ordine o lotto, la libreria si apre una volta
+_aperte: Dict[tuple, "LibreriaPattern"] = {}
+_lock_aperte = threading.Lock()
+
+
+def _libreria_del_processo(percorso: str, max_pattern: int, resa_minima: float) -> "LibreriaPattern":
+    # Il PID nella chiave: dopo un fork la connessione del processo padre non si usa
+    chiave = (os.getpid(), percorso, max_pattern, resa_minima)
+    with _lock_aperte:
+        libreria = _aperte.get(chiave)
+        if libreria is None:
+            libreria = _aperte[chiave] = LibreriaPattern(percorso, max_pattern, resa_minima)
+        return libreria
+
+
+class LibreriaPattern:
+    """
+    Pattern di taglio ad alta resa su SQLite, per lunghezza dello spezzone e insieme
+    delle misure: gli ordini che si ripetono (stesse misure, quantità un po' diverse)
+    ripartono dagli schemi già trovati invece che da zero.
+
+      - le lunghezze sono in unità intere della `risoluzione` dell'ottimizzatore,
+        come nel motore: niente confronti tra float
+      - si tengono solo i pattern con resa (metri tagliati / lunghezza) di almeno
+        `resa_minima`, o con scarto entro la soglia di chi li registra
+      - ogni pattern ha una riga per misura in `pattern_misure`: la ricerca per
+        insieme di misure si fa in SQL sull'indice e legge solo i pattern che
+        hanno almeno una misura in comune con l'ordine
+      - oltre `max_pattern` si tolgono quelli usati meno di recente (usati: trovati
+        da una ricerca o registrati di nuovo)
+      - si può passare ai processi di lavoro: ogni processo la apre sullo stesso file
+        una volta sola e la riusa per tutti i calcoli che la ricevono
+    """
+
+    def __init__(self, percorso: str, max_pattern: int = 50_000, resa_minima: float = 0.95):
+        self.percorso = percorso
+        self.max_pattern = max_pattern
+        self.resa_minima = resa_minima
+        self._pid = os.getpid()
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(percorso, timeout=30.0, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        precedente = self._db.execute("PRAGMA user_version").fetchone()[0] < _VERSIONE and self._db.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'pattern'").fetchone()
+        if precedente:
+            # Libreria scritta dalla versione senza pattern_misure: si ricopia nello schema nuovo
+            self._db.execute("DROP INDEX IF EXISTS pattern_indice")
+            self._db.execute("DROP INDEX IF EXISTS pattern_uso")
+            self._db.execute("ALTER TABLE pattern RENAME TO pattern_v0")
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS pattern (
+                id INTEGER PRIMARY KEY,
+                risoluzione REAL NOT NULL,
+                lunghezza INTEGER NOT NULL,
+                pezzi TEXT NOT NULL,
+                resa REAL NOT NULL,
+                usi INTEGER NOT NULL,
+                ultimo_uso REAL NOT NULL,
+                UNIQUE (risoluzione, lunghezza, pezzi)
+            )""")
+        # Una riga per misura di ogni pattern (con quante misure ha il pattern)
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS pattern_misure (
+                id_pattern INTEGER NOT NULL,
+                risoluzione REAL NOT NULL,
+                lunghezza INTEGER NOT NULL,
+                misura INTEGER NOT NULL,
+                n_misure INTEGER NOT NULL
+            )""")
+        # Ricerca per lunghezza e misura (coprente); eliminazione per pattern e per ultimo uso
+        self._db.execute("""CREATE INDEX IF NOT EXISTS pattern_misure_indice
+                            ON pattern_misure (risoluzione, lunghezza, misura, id_pattern, n_misure)""")
+        self._db.execute("CREATE INDEX IF NOT EXISTS pattern_misure_id ON pattern_misure (id_pattern)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS pattern_uso ON pattern (ultimo_uso)")
+        self._db.execute("CREATE TEMP TABLE IF NOT EXISTS ammesse (misura INTEGER PRIMARY KEY)")
+        if precedente:
+            for risoluzione, lunghezza, pezzi, resa, usi, ultimo_uso in self._db.execute(
+                    "SELECT risoluzione, lunghezza, pezzi, resa, usi, ultimo_uso FROM pattern_v0").fetchall():
+                nuovo = self._db.execute(
+                    "INSERT INTO pattern (risoluzione, lunghezza, pezzi, resa, usi, ultimo_uso) VALUES (?, ?, ?, ?, ?, ?)",
+                    (risoluzione, lunghezza, pezzi, resa, usi, ultimo_uso))
+                self._indicizza(nuovo.lastrowid, risoluzione, lunghezza, sorted(_pezzi_da_testo(pezzi), reverse=True))
+            self._db.execute("DROP TABLE pattern_v0")
+        self._db.execute(f"PRAGMA user_version = {_VERSIONE}")
+        self._db.commit()
+
+    def nel_processo(self) -> "LibreriaPattern":
+        """Questa libreria, se aperta in questo processo; altrimenti (dopo un fork) quella del processo"""
+        if self._pid == os.getpid():
+            return self
+        return _libreria_del_processo(self.percorso, self.max_pattern, self.resa_minima)
+
+    def __reduce__(self):
+        # Nel pickle solo percorso e opzioni: dall'altra parte la libreria già aperta in quel processo
+        return _libreria_del_processo, (self.percorso, self.max_pattern, self.resa_minima)
+
+    def chiudi(self):
+        with _lock_aperte:
+            for chiave in [chiave for chiave, libreria in _aperte.items() if libreria is self]:
+                del _aperte[chiave]
+        self._db.close()
+
+    def conta(self) -> int:
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM pattern").fetchone()[0]
+
+    def svuota(self):
+        with self._lock:
+            self._db.execute("DELETE FROM pattern")
+            self._db.execute("DELETE FROM pattern_misure")
+            self._db.commit()
+
+    def _indicizza(self, id_pattern: int, risoluzione: float, lunghezza: int, misure: List[int]):
+        self._db.executemany("INSERT INTO pattern_misure VALUES (?, ?, ?, ?, ?)",
+                             [(id_pattern, risoluzione, lunghezza, misura, len(misure)) for misura in misure])
+
+    def registra(self, risoluzione: float, pattern: Iterable[Tuple[int, Dict[int, int]]], soglia: int = 0) -> int:
+        """
+        Registra i pattern (lunghezza dello spezzone, misura -> pezzi) ad alta resa;
+        quelli già noti contano un uso in più. Restituisce quanti ne ha tenuti.
+        """
+        adesso = time.time()
+        righe = {}
+        for lunghezza, pezzi in pattern:
+            riempimento = sum(misura * n for misura, n in pezzi.items())
+            if lunghezza <= 0 or not riempimento or riempimento > lunghezza:
+                continue
+            resa = riempimento / lunghezza
+            if resa < self.resa_minima and lunghezza - riempimento > soglia:
+                continue
+            testo = _testo_pezzi(pezzi)
+            misure = sorted((m for m, n in pezzi.items() if n), reverse=True)
+            chiave = (lunghezza, testo)
+            usi = righe[chiave][4] + 1 if chiave in righe else 1
+            righe[chiave] = (float(risoluzione), int(lunghezza), misure, testo, usi, resa)
+        if not righe:
+            return 0
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            for r, l, misure, t, usi, resa in righe.values():
+                nuovo = self._db.execute("""
+                    INSERT OR IGNORE INTO pattern (risoluzione, lunghezza, pezzi, resa, usi, ultimo_uso)
+                    VALUES (?, ?, ?, ?, ?, ?)""", (r, l, t, resa, usi, adesso))
+                if nuovo.rowcount:
+                    self._indicizza(nuovo.lastrowid, r, l, misure)
+                else:
+                    self._db.execute("""
+                        UPDATE pattern SET usi = usi + ?, ultimo_uso = ?
+                        WHERE risoluzione = ? AND lunghezza = ? AND pezzi = ?""", (usi, adesso, r, l, t))
+            # Oltre il limite si tolgono i pattern usati meno di recente
+            eccesso = self._db.execute("SELECT COUNT(*) FROM pattern").fetchone()[0] - self.max_pattern
+            if eccesso > 0:
+                vecchi = self._db.execute("SELECT id FROM pattern ORDER BY ultimo_uso, usi LIMIT ?",
+                                          (eccesso,)).fetchall()
+                self._db.executemany("DELETE FROM pattern WHERE id = ?", vecchi)
+                self._db.executemany("DELETE FROM pattern_misure WHERE id_pattern = ?", vecchi)
+            self._db.commit()
+        return len(righe)
+
+    def cerca(self, risoluzione: float, lunghezze: Iterable[int], misure: Iterable[int],
+              limite: int = 200) -> Dict[int, List[Dict[int, int]]]:
+        """
+        Per ogni lunghezza di spezzone, i pattern noti che usano solo `misure`
+        (dalla resa più alta, poi dai più usati), al massimo `limite` per lunghezza.
+        I pattern trovati contano come usati: restano in libreria più a lungo.
+        """
+        adesso = time.time()
+        trovati: Dict[int, List[Dict[int, int]]] = {}
+        usati = []
+        with self._lock:
+            # Scrittura riservata subito: una lettura che poi diventa scrittura non aspetta gli
+            # altri processi, fallisce ("database is locked") se nel frattempo hanno scritto
+            self._db.execute("BEGIN IMMEDIATE")
+            self._db.execute("DELETE FROM ammesse")
+            self._db.executemany("INSERT OR IGNORE INTO ammesse VALUES (?)", [(int(m),) for m in misure])
+            for lunghezza in sorted(set(int(l) for l in lunghezze), reverse=True):
+                # Un pattern va bene se tutte le sue misure sono tra quelle ammesse
+                righe = self._db.execute("""
+                    SELECT p.id, p.pezzi FROM (
+                        SELECT m.id_pattern FROM pattern_misure m JOIN ammesse a ON a.misura = m.misura
+                        WHERE m.risoluzione = ? AND m.lunghezza = ?
+                        GROUP BY m.id_pattern HAVING COUNT(*) = MAX(m.n_misure)
+                    ) AS adatti JOIN pattern p ON p.id = adatti.id_pattern
+                    ORDER BY p.resa DESC, p.usi DESC LIMIT ?""", (float(risoluzione), lunghezza, limite)).fetchall()
+                if righe:
+                    trovati[lunghezza] = [_pezzi_da_testo(testo) for _, testo in righe]
+                    usati += [(adesso, id_pattern) for id_pattern, _ in righe]
+            if usati:
+                self._db.executemany("UPDATE pattern SET usi = usi + 1, ultimo_uso = ? WHERE id = ?", usati)
+            self._db.commit()
+        return trovati
@@ -0,0 +1,240 @@
+# bestcut/magazzino.py
+# Magazzino degli scampoli: gli scarti riutilizzabili restano disponibili per i lavori successivi
+
+import sqlite3
+import threading
+import time
+import uuid
+from bisect import bisect_left, insort
+from dataclasses import dataclass, field
+from typing import List, Dict, Optional, Tuple
+
+from .modelli import Spezzone, TaglioRichiesto, PianiCompatti, RisultatoCalcolo
+from .ottimizzatore import OttimizzatoreTagli
+from .sfondo import Avanzamento
+
+
+@dataclass
+class Prelievo:
+    """Piano calcolato usando prima gli scampoli del magazzino, poi gli spezzoni nuovi"""
+    risultato: RisultatoCalcolo
+    sessione: str
+    scampoli: List[Spezzone] = field(default_factory=list)  # scampoli prenotati, con l'ID usato nel piano
+    origine: Dict[int, int] = field(default_factory=dict)  # ID spezzone nel piano -> ID scampolo in magazzino
+
+    def scampoli_usati(self) -> List[int]:
+        return [self.origine[p.spezzone_id] for p in self.risultato.piani if p.spezzone_id in self.origine]
+
+
+class MagazzinoScampoli:
+    """
+    Scampoli riutilizzabili su SQLite, con indice ordinato sulla lunghezza:
+    la ricerca "il più corto che basta" è una query per intervallo, veloce anche
+    con decine di migliaia di scampoli.
+
+    Più sessioni (o processi) possono prenotare insieme: la prenotazione avviene in
+    una transazione esclusiva e uno scampolo prenotato non è visibile agli altri finché
+    non viene rilasciato o la prenotazione scade (`durata_prenotazione` secondi).
+    """
+
+    def __init__(self, percorso: str, durata_prenotazione: float = 3600.0):
+        self.percorso = percorso
+        self.durata_prenotazione = durata_prenotazione
+        self._lock = threading.Lock()
+        # isolation_level=None: le transazioni sono esplicite (BEGIN IMMEDIATE)
+        self._db = sqlite3.connect(percorso, timeout=30.0, isolation_level=None, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS scampoli (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                lunghezza REAL NOT NULL,
+                origine TEXT NOT NULL DEFAULT '',
+                creato REAL NOT NULL,
+                sessione TEXT,
+                prenotato_il REAL
+            )""")
+        self._db.execute("CREATE INDEX IF NOT EXISTS scampoli_liberi ON scampoli (lunghezza) WHERE sessione IS NULL")
+        self._db.execute("CREATE INDEX IF NOT EXISTS scampoli_prenotati ON scampoli (sessione) WHERE sessione IS NOT NULL")
+
+    def chiudi(self):
+        self._db.close()
+
+    # ---------------- inventario ----------------
+
+    def aggiungi(self, lunghezze: List[float], origine: str = "") -> int:
+        """Aggiunge scampoli a mano; restituisce quanti ne ha inseriti"""
+        adesso = time.time()
+        righe = [(float(l), origine, adesso) for l in lunghezze if l > 0]
+        with self._lock, self._transazione():
+            self._db.executemany("INSERT INTO scampoli (lunghezza, origine, creato) VALUES (?, ?, ?)", righe)
+        return len(righe)
+
+    def assorbi(self, risultato: RisultatoCalcolo, soglia: float, origine: str = "") -> int:
+        """Mette in magazzino gli scarti DA RIUTILIZZARE (scarto > soglia) del piano"""
+        return self.aggiungi([p.scarto for p in risultato.piani if p.scarto > soglia], origine)
+
+    def disponibili(self, minimo: float = 0.0, massimo: Optional[float] = None,
+                    limite: Optional[int] = None) -> List[Tuple[int, float]]:
+        """(id, lunghezza) degli scampoli liberi tra `minimo` e `massimo`, dal più corto"""
+        sql = "SELECT id, lunghezza FROM scampoli WHERE sessione IS NULL AND lunghezza >= ?"
+        parametri: list = [minimo]
+        if massimo is not None:
+            sql += " AND lunghezza <= ?"
+            parametri.append(massimo)
+        sql += " ORDER BY lunghezza"
+        if limite is not None:
+            sql += " LIMIT ?"
+            parametri.append(limite)
+        with self._lock:
+            self._libera_scaduti()
+            return self._db.execute(sql, parametri).fetchall()
+
+    def conta(self) -> int:
+        """Scampoli liberi"""
+        with self._lock:
+            self._libera_scaduti()
+            return self._db.execute("SELECT COUNT(*) FROM scampoli WHERE sessione IS NULL").fetchone()[0]
+
+    def rimuovi(self, ids: List[int]):
+        with self._lock, self._transazione():
+            self._db.executemany("DELETE FROM scampoli WHERE id = ?", [(i,) for i in ids])
+
+    # ---------------- prenotazioni ----------------
+
+    def prenota(self, richieste: List[TaglioRichiesto], sessione: str) -> List[Tuple[int, float]]:
+        """
+        Prenota per `sessione` gli scampoli che servono ai tagli richiesti:
+        ogni pezzo (dal più lungo) va nello scampolo già preso dove avanza meno,
+        altrimenti si prende dal magazzino il più corto che basta.
+        Le prenotazioni precedenti della stessa sessione vengono rilasciate.
+        """
+        pezzi = sorted(((r.lunghezza, r.quantita) for r in richieste if r.quantita > 0), reverse=True)
+        presi: List[Tuple[int, float]] = []
+        residui: List[Tuple[float, int]] = []  # (quanto avanza, indice in presi), ordinati
+        adesso = time.time()
+
+        with self._lock, self._transazione():
+            self._libera_scaduti()
+            self._db.execute("UPDATE scampoli SET sessione = NULL, prenotato_il = NULL WHERE sessione = ?",
+                             (sessione,))
+            for misura, quantita in pezzi:
+                while quantita > 0:
+                    pos = bisect_left(residui, (misura, -1))
+                    if pos < len(residui):
+                        residuo, indice = residui.pop(pos)
+                        insort(residui, (residuo - misura, indice))
+                        quantita -= 1
+                        continue
+                    riga = self._db.execute(
+                        "SELECT id, lunghezza FROM scampoli WHERE sessione IS NULL AND lunghezza >= ? "
+                        "ORDER BY lunghezza LIMIT 1", (misura,)).fetchone()
+                    if riga is None:
+                        break  # nessuno scampolo basta: questa misura andrà sugli spezzoni nuovi
+                    self._db.execute("UPDATE scampoli SET sessione = ?, prenotato_il = ? WHERE id = ?",
+                                     (sessione, adesso, riga[0]))
+                    presi.append(riga)
+                    insort(residui, (riga[1] - misura, len(presi) - 1))
+                    quantita -= 1
+        return presi
+
+    def rilascia(self, sessione: str, ids: Optional[List[int]] = None):
+        """Rende di nuovo disponibili gli scampoli prenotati (tutti o solo `ids`)"""
+        with self._lock, self._transazione():
+            if ids is None:
+                self._db.execute("UPDATE scampoli SET sessione = NULL, prenotato_il = NULL WHERE sessione = ?",
+                                 (sessione,))
+            else:
+                self._db.executemany(
+                    "UPDATE scampoli SET sessione = NULL, prenotato_il = NULL WHERE sessione = ? AND id = ?",
+                    [(sessione, i) for i in ids])
+
+    def consuma(self, sessione: str, ids: List[int]):
+        """Toglie dal magazzino gli scampoli tagliati e rilascia gli altri prenotati dalla sessione"""
+        with self._lock, self._transazione():
+            self._db.executemany("DELETE FROM scampoli WHERE sessione = ? AND id = ?", [(sessione, i) for i in ids])
+            self._db.execute("UPDATE scampoli SET sessione = NULL, prenotato_il = NULL WHERE sessione = ?",
+                             (sessione,))
+
+    def _libera_scaduti(self):
+        self._db.execute("UPDATE scampoli SET sessione = NULL, prenotato_il = NULL "
+                         "WHERE sessione IS NOT NULL AND prenotato_il < ?",
+                         (time.time() - self.durata_prenotazione,))
+
+    def _transazione(self):
+        return _Transazione(self._db)
+
+
+class _Transazione:
+    """BEGIN IMMEDIATE ... COMMIT/ROLLBACK: blocca subito la scrittura agli altri processi"""
+
+    def __init__(self, db: sqlite3.Connection):
+        self._db = db
+
+    def __enter__(self):
+        self._db.execute("BEGIN IMMEDIATE")
+
+    def __exit__(self, tipo, valore, traccia):
+        self._db.execute("COMMIT" if tipo is None else "ROLLBACK")
+        return False
+
+
+def _unisci_risultati(primo: RisultatoCalcolo, secondo: RisultatoCalcolo) -> RisultatoCalcolo:
+    """Piano sugli scampoli + piano sugli spezzoni nuovi per quello che restava"""
+    tagli_fatti = dict(primo.tagli_fatti)
+    for misura, n in secondo.tagli_fatti.items():
+        tagli_fatti[misura] = tagli_fatti.get(misura, 0) + n
+    return RisultatoCalcolo(
+        piani=PianiCompatti.da_piani(primo.piani).concatena(secondo.piani),
+        scarto_totale=round(primo.scarto_totale + secondo.scarto_totale, 9),
+        completato=secondo.completato,
+        tagli_fatti=tagli_fatti,
+        tagli_mancanti=dict(secondo.tagli_mancanti),
+        spezzoni_usati=primo.spezzoni_usati + secondo.spezzoni_usati,
+        spezzoni_totali=primo.spezzoni_totali + secondo.spezzoni_totali,
+        statistiche=primo.statistiche.unisci(secondo.statistiche)
+        if primo.statistiche and secondo.statistiche else secondo.statistiche,
+    )
+
+
+def calcola_con_scampoli(ottimizzatore: OttimizzatoreTagli, magazzino: MagazzinoScampoli,
+                         spezzoni: List[Spezzone], richieste: List[TaglioRichiesto],
+                         sessione: Optional[str] = None, avanzamento: Optional[Avanzamento] = None) -> Prelievo:
+    """
+    Prima taglia dagli scampoli del magazzino (prenotati per `sessione`), poi usa
+    gli spezzoni nuovi solo per i pezzi che mancano. Gli scampoli prenotati ma
+    non usati tornano subito disponibili; quelli usati restano prenotati finché
+    non si chiama `magazzino.consuma(prelievo.sessione, prelievo.scampoli_usati())`.
+    Con `avanzamento` si pubblicano solo piani completi: scampoli + spezzoni nuovi.
+    """
+    sessione = sessione or uuid.uuid4().hex
+    presi = magazzino.prenota(richieste, sessione)
+    if not presi:
+        return Prelievo(ottimizzatore.calcola_ottimale(spezzoni, richieste, avanzamento), sessione)
+
+    # Gli scampoli prendono ID dopo quelli degli spezzoni, per non confonderli nel piano
+    primo_id = max((s.id for s in spezzoni), default=0) + 1
+    scampoli = [Spezzone(lunghezza, primo_id + k) for k, (_, lunghezza) in enumerate(presi)]
+    origine = {s.id: id_scampolo for s, (id_scampolo, _) in zip(scampoli, presi)}
+
+    sugli_scampoli = ottimizzatore.calcola_ottimale(
+        scampoli, richieste, avanzamento.derivato(intervallo=(0.0, 0.3)) if avanzamento is not None else None)
+    usati = {p.spezzone_id for p in sugli_scampoli.piani}
+    magazzino.rilascia(sessione, [origine[s.id] for s in scampoli if s.id not in usati])
+
+    priorita = {r.lunghezza: r.priorita for r in richieste}
+    mancanti = [TaglioRichiesto(misura, n, priorita.get(misura, 1.0))
+                for misura, n in sugli_scampoli.tagli_mancanti.items()]
+    sugli_scampoli.spezzoni_totali = len(usati)
+    sugli_spezzoni = ottimizzatore.calcola_ottimale(
+        spezzoni, mancanti,
+        avanzamento.derivato(lambda r: _unisci_risultati(sugli_scampoli, r), (0.3, 1.0))
+        if avanzamento is not None else None)
+    risultato = _unisci_risultati(sugli_scampoli, sugli_spezzoni)
+    if avanzamento is not None:
+        avanzamento.pubblica(risultato)
+    return Prelievo(
+        risultato=risultato,
+        sessione=sessione,
+        scampoli=[s for s in scampoli if s.id in usati],
+        origine={i: origine[i] for i in usati},
+    )
@@ -0,0 +1,167 @@
+# bestcut/materiali.py
+# Ordini con più materiali o profili: un calcolo per materiale, in parallelo, e un piano unico
+
+import copy
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from typing import List, Dict, Optional, Tuple
+
+from .modelli import Spezzone, TaglioRichiesto, PianiCompatti, RisultatoCalcolo
+from .ottimizzatore import OttimizzatoreTagli
+from .sfondo import Avanzamento
+
+
+def materiali_di(spezzoni: List[Spezzone], richieste: List[TaglioRichiesto]) -> List[str]:
+    """Materiali/profili presenti nell'ordine, in ordine alfabetico ("" = senza nome)"""
+    return sorted({s.materiale for s in spezzoni} | {r.materiale for r in richieste if r.quantita > 0})
+
+
+def dividi_per_materiale(spezzoni: List[Spezzone], richieste: List[TaglioRichiesto]
+                         ) -> Dict[str, Tuple[List[Spezzone], List[TaglioRichiesto]]]:
+    """Spezzoni e richieste di ogni materiale (anche solo spezzoni o solo richieste)"""
+    parti: Dict[str, Tuple[List[Spezzone], List[TaglioRichiesto]]] = {
+        materiale: ([], []) for materiale in materiali_di(spezzoni, richieste)}
+    for spezzone in spezzoni:
+        parti[spezzone.materiale][0].append(spezzone)
+    for richiesta in richieste:
+        if richiesta.quantita > 0:
+            parti[richiesta.materiale][1].append(richiesta)
+    return parti
+
+
+def unisci_per_materiale(risultati: Dict[str, RisultatoCalcolo]) -> RisultatoCalcolo:
+    """
+    Piano unico dell'ordine: i piani dei materiali uno dopo l'altro, conteggi sommati
+    per misura. I risultati dei singoli materiali restano in `materiali`: cosa manca
+    di ogni materiale si legge lì (o in riepilogo_materiali), non nei conteggi sommati.
+    """
+    tagli_fatti: Dict[float, int] = {}
+    tagli_mancanti: Dict[float, int] = {}
+    piani = None
+    statistiche = None
+    for risultato in risultati.values():
+        for misura, n in risultato.tagli_fatti.items():
+            tagli_fatti[misura] = tagli_fatti.get(misura, 0) + n
+        for misura, n in risultato.tagli_mancanti.items():
+            tagli_mancanti[misura] = tagli_mancanti.get(misura, 0) + n
+        piani = risultato.piani if piani is None else PianiCompatti.da_piani(piani).concatena(risultato.piani)
+        if risultato.statistiche is not None:
+            statistiche = risultato.statistiche if statistiche is None else statistiche.unisci(risultato.statistiche)
+    limiti = [r.limite_inferiore for r in risultati.values()]
+    return RisultatoCalcolo(
+        piani=PianiCompatti.da_piani(piani if piani is not None else []),
+        scarto_totale=round(sum(r.scarto_totale for r in risultati.values()), 9),
+        completato=all(r.completato for r in risultati.values()),
+        tagli_fatti=tagli_fatti,
+        tagli_mancanti=tagli_mancanti,
+        spezzoni_usati=sum(r.spezzoni_usati for r in risultati.values()),
+        spezzoni_totali=sum(r.spezzoni_totali for r in risultati.values()),
+        limite_inferiore=round(sum(limiti), 9) if limiti and None not in limiti else None,
+        statistiche=statistiche,
+        materiali=dict(risultati),
+    )
+
+
+def riepilogo_materiali(risultato: RisultatoCalcolo) -> List[dict]:
+    """
+    Una riga per materiale (una sola, senza nome, se l'ordine non ne distingue),
+    con i tagli mancanti di quel materiale come coppie [misura, quantità]
+    """
+    materiali = risultato.materiali if risultato.materiali is not None else {"": risultato}
+    return [{
+        "materiale": materiale,
+        "completato": parte.completato,
+        "spezzoni_usati": parte.spezzoni_usati,
+        "spezzoni_totali": parte.spezzoni_totali,
+        "scarto_totale": parte.scarto_totale,
+        "tubo_mancante": round(sum(misura * n for misura, n in parte.tagli_mancanti.items()), 6),
+        "tagli_mancanti": [[misura, n] for misura, n in parte.tagli_mancanti.items()],
+    } for materiale, parte in materiali.items()]
+
+
+# Nei processi di lavoro: l'annullamento del calcolo che li ha avviati (None se non si annulla)
+_annullamento = None
+
+
+def _prepara_processo(annullamento):
+    global _annullamento
+    _annullamento = annullamento
+
+
+def _calcola_parte(ottimizzatore: OttimizzatoreTagli, spezzoni: List[Spezzone],
+                   richieste: List[TaglioRichiesto]) -> RisultatoCalcolo:
+    """Eseguito nei processi di lavoro: un materiale, fermato (col piano migliore) se si annulla"""
+    avanzamento = Avanzamento(_annullamento) if _annullamento is not None else None
+    return ottimizzatore.calcola_ottimale(spezzoni, richieste, avanzamento)
+
+
+def calcola_per_materiale(ottimizzatore: OttimizzatoreTagli, spezzoni: List[Spezzone],
+                          richieste: List[TaglioRichiesto], processi: Optional[int] = None,
+                          avanzamento: Optional[Avanzamento] = None) -> RisultatoCalcolo:
+    """
+    Divide l'ordine per materiale/profilo (spezzoni e richieste con lo stesso
+    `materiale`), calcola i materiali in parallelo su `processi` processi (None = tutti
+    i core) e restituisce il piano unico con il dettaglio in `risultato.materiali`.
+    Gli ID degli spezzoni restano quelli dati: devono essere unici in tutto l'ordine.
+
+    Con un solo materiale o un solo processo i calcoli restano in questo processo,
+    uno dopo l'altro (e durante l'ultimo si pubblicano su `avanzamento` i piani unici
+    man mano che migliorano); in parallelo `avanzamento` riporta i materiali finiti.
+    Se viene annullato, i materiali in corso si fermano col piano migliore trovato
+    (anche nei processi di lavoro) e quelli non ancora partiti si fanno con l'FFD.
+    """
+    parti = dividi_per_materiale(spezzoni, richieste)
+    processi = min(processi or os.cpu_count() or 1, len(parti))
+    risultati: Dict[str, RisultatoCalcolo] = {}
+
+    def in_ordine() -> Dict[str, RisultatoCalcolo]:
+        return {materiale: risultati[materiale] for materiale in parti if materiale in risultati}
+
+    if processi <= 1:
+        for k, (materiale, (spezzoni_m, richieste_m)) in enumerate(parti.items()):
+            calcolatore = ottimizzatore
+            if avanzamento is not None and avanzamento.annullato:
+                calcolatore = copy.copy(ottimizzatore)
+                calcolatore.metodo = "ffd"
+            derivato = None
+            if avanzamento is not None:
+                # Si pubblica solo il piano unico: con l'ultimo materiale, quando tutti ne hanno uno
+                ultimo = k == len(parti) - 1
+                derivato = avanzamento.derivato(
+                    (lambda r, m=materiale: unisci_per_materiale({**in_ordine(), m: r})) if ultimo else None,
+                    (k / len(parti), (k + 1) / len(parti)))
+                avanzamento.aggiorna(k / len(parti), f"Materiale {materiale or '-'} ({k + 1}/{len(parti)})")
+            risultati[materiale] = calcolatore.calcola_ottimale(spezzoni_m, richieste_m, derivato)
+    else:
+        # Il portafoglio resta nel processo del suo materiale: il parallelismo è già qui
+        in_processo = copy.copy(ottimizzatore)
+        in_processo.processi = 1
+        annullamento = multiprocessing.Event() if avanzamento is not None else None
+        with ProcessPoolExecutor(max_workers=processi, initializer=_prepara_processo,
+                                 initargs=(annullamento,)) as pool:
+            futuri = {pool.submit(_calcola_parte, in_processo, *parte): materiale
+                      for materiale, parte in parti.items()}
+            in_corso = set(futuri)
+            while in_corso:
+                if avanzamento is not None and avanzamento.annullato:
+                    annullamento.set()
+                    for futuro in in_corso:
+                        if futuro.cancel():
+                            veloce = copy.copy(in_processo)
+                            veloce.metodo = "ffd"
+                            risultati[futuri[futuro]] = veloce.calcola_ottimale(*parti[futuri[futuro]])
+                    in_corso = {f for f in in_corso if not f.cancelled()}
+                finiti, in_corso = wait(in_corso, timeout=0.1 if avanzamento is not None else None,
+                                        return_when=FIRST_COMPLETED)
+                for futuro in finiti:
+                    risultati[futuri[futuro]] = futuro.result()
+                if avanzamento is not None:
+                    avanzamento.aggiorna(len(risultati) / len(parti),
+                                         f"Materiali calcolati: {len(risultati)}/{len(parti)}")
+
+    risultato = unisci_per_materiale(in_ordine())
+    if avanzamento is not None:
+        avanzamento.pubblica(risultato)
+        avanzamento.aggiorna(1.0, "Calcolo annullato" if avanzamento.annullato else "Calcolo completato")
+    return risultato
@@ -0,0 +1,350 @@
+# bestcut/modelli.py
+# Strutture dati di spezzoni, richieste e risultati
+
+import math
+import time
+from collections.abc import Sequence
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import List, Dict, Optional, Iterable
+
+import numpy as np
+
+@dataclass
+class Spezzone:
+    lunghezza: float
+    id: int
+    materiale: str = ""  # materiale/profilo: si taglia solo per le richieste dello stesso
+    
+@dataclass
+class TaglioRichiesto:
+    lunghezza: float
+    quantita: int
+    priorita: float = 1.0  # peso di ogni metro di questa misura quando il materiale non basta
+    materiale: str = ""
+    
+@dataclass
+class PianoTaglio:
+    __slots__ = ("spezzone_id", "spezzone_lunghezza", "tagli", "scarto")
+    spezzone_id: int
+    spezzone_lunghezza: float
+    tagli: List[float]
+    scarto: float
+
+@dataclass
+class GruppoPiani:
+    """Spezzoni della stessa lunghezza tagliati nello stesso identico modo"""
+    spezzone_lunghezza: float
+    tagli: List[float]
+    scarto: float
+    spezzone_ids: List[int]
+
+    @property
+    def quantita(self) -> int:
+        return len(self.spezzone_ids)
+
+class PianiCompatti(Sequence):
+    """
+    Piani di taglio in forma compatta: ogni schema distinto (lunghezza dello spezzone
+    + pezzi per misura) è memorizzato una sola volta, gli spezzoni indicano solo
+    quale schema usano. Si legge come una lista di PianoTaglio, creati al momento.
+    """
+    __slots__ = ("misure", "schemi", "lunghezze", "scarti", "spezzone_ids", "schema_di", "_tagli")
+
+    def __init__(self, misure: np.ndarray, schemi: np.ndarray, lunghezze: np.ndarray, scarti: np.ndarray,
+                 spezzone_ids: np.ndarray, schema_di: np.ndarray):
+        self.misure = misure  # etichette delle misure (m), decrescenti
+        self.schemi = schemi  # schema x misura -> pezzi
+        self.lunghezze = lunghezze  # lunghezza dello spezzone di ogni schema (m)
+        self.scarti = scarti  # scarto di ogni schema (m)
+        self.spezzone_ids = spezzone_ids  # per spezzone, nell'ordine del piano
+        self.schema_di = schema_di  # per spezzone, indice dello schema
+        self._tagli: Dict[int, List[float]] = {}
+
+    @classmethod
+    def da_matrice(cls, misure, matrice, lunghezze, scarti, spezzone_ids) -> "PianiCompatti":
+        """Da una riga per spezzone (pezzi per misura): gli schemi uguali sono tenuti una volta"""
+        misure = np.asarray(misure, dtype=np.float64)
+        lunghezze = np.asarray(lunghezze, dtype=np.float64)
+        matrice = np.asarray(matrice, dtype=np.int64).reshape(len(lunghezze), len(misure))
+        scarti = np.asarray(scarti, dtype=np.float64)
+        if not len(matrice):
+            return cls(misure, matrice, lunghezze, scarti, np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64))
+        righe = np.column_stack([lunghezze, matrice])
+        _, primi, schema_di = np.unique(righe, axis=0, return_index=True, return_inverse=True)
+        return cls(misure, matrice[primi], lunghezze[primi], scarti[primi],
+                   np.asarray(spezzone_ids, dtype=np.int64), schema_di.reshape(-1).astype(np.int64))
+
+    @classmethod
+    def da_piani(cls, piani: Iterable[PianoTaglio]) -> "PianiCompatti":
+        """Da piani qualsiasi (anche già compatti: non vengono espansi)"""
+        if isinstance(piani, PianiCompatti):
+            return piani
+        piani = list(piani)
+        misure = sorted({t for p in piani for t in p.tagli}, reverse=True)
+        colonna = {m: j for j, m in enumerate(misure)}
+        matrice = np.zeros((len(piani), len(misure)), dtype=np.int64)
+        for i, piano in enumerate(piani):
+            for taglio in piano.tagli:
+                matrice[i, colonna[taglio]] += 1
+        return cls.da_matrice(misure, matrice, [p.spezzone_lunghezza for p in piani],
+                              [p.scarto for p in piani], [p.spezzone_id for p in piani])
+
+    def concatena(self, altri: "PianiCompatti") -> "PianiCompatti":
+        """Questi piani seguiti da `altri`, con le colonne delle misure unificate"""
+        altri = PianiCompatti.da_piani(altri)
+        misure = np.array(sorted(set(self.misure.tolist()) | set(altri.misure.tolist()), reverse=True))
+
+        def per_spezzone(piani: "PianiCompatti") -> np.ndarray:
+            schemi = np.zeros((len(piani.schemi), len(misure)), dtype=np.int64)
+            colonne = [misure.tolist().index(m) for m in piani.misure.tolist()]
+            schemi[:, colonne] = piani.schemi
+            return schemi[piani.schema_di]
+
+        return PianiCompatti.da_matrice(
+            misure, np.vstack([per_spezzone(self), per_spezzone(altri)]),
+            np.concatenate([self.lunghezze[self.schema_di], altri.lunghezze[altri.schema_di]]),
+            np.concatenate([self.scarti[self.schema_di], altri.scarti[altri.schema_di]]),
+            np.concatenate([self.spezzone_ids, altri.spezzone_ids]))
+
+    def rinumera(self, nuovi_id: Iterable[int]) -> "PianiCompatti":
+        """Stessi schemi con altri ID degli spezzoni (uno per spezzone, nell'ordine del piano)"""
+        return PianiCompatti(self.misure, self.schemi, self.lunghezze, self.scarti,
+                             np.fromiter(nuovi_id, dtype=np.int64, count=len(self)), self.schema_di)
+
+    def tagli_schema(self, k: int) -> List[float]:
+        tagli = self._tagli.get(k)
+        if tagli is None:
+            tagli = [m for m, n in zip(self.misure.tolist(), self.schemi[k].tolist()) for _ in range(n)]
+            self._tagli[k] = tagli
+        return tagli
+
+    def pezzi_per_misura(self) -> Dict[float, int]:
+        """Pezzi tagliati per misura, dai soli schemi (senza scorrere i tagli)"""
+        fatti = np.bincount(self.schema_di, minlength=len(self.schemi)) @ self.schemi if len(self) else []
+        return {m: int(n) for m, n in zip(self.misure.tolist(), list(fatti)) if n}
+
+    def lunghezza_totale(self) -> float:
+        """Metri di spezzone usati, dai soli schemi (senza creare i PianoTaglio)"""
+        return float(self.lunghezze[self.schema_di].sum()) if len(self) else 0.0
+
+    def gruppi(self) -> List[GruppoPiani]:
+        """Come raggruppa_piani, ma direttamente dagli schemi"""
+        ordine = np.argsort(self.schema_di, kind="stable")
+        conteggi = np.bincount(self.schema_di, minlength=len(self.schemi))
+        ids = np.split(self.spezzone_ids[ordine], np.cumsum(conteggi)[:-1]) if len(self) else []
+        # A parità, l'ordine è quello in cui lo schema compare per la prima volta nel piano
+        primo = np.full(len(self.schemi), len(self))
+        np.minimum.at(primo, self.schema_di, np.arange(len(self)))
+        ordine_schemi = sorted((k for k in range(len(self.schemi)) if conteggi[k]),
+                               key=lambda k: (-conteggi[k], -self.lunghezze[k], primo[k]))
+        return [GruppoPiani(float(self.lunghezze[k]), list(self.tagli_schema(k)), float(self.scarti[k]),
+                            ids[k].tolist()) for k in ordine_schemi]
+
+    def _piano(self, i: int) -> PianoTaglio:
+        k = int(self.schema_di[i])
+        return PianoTaglio(int(self.spezzone_ids[i]), float(self.lunghezze[k]), list(self.tagli_schema(k)),
+                           float(self.scarti[k]))
+
+    def __len__(self) -> int:
+        return len(self.schema_di)
+
+    def __getitem__(self, indice):
+        if isinstance(indice, slice):
+            return [self._piano(i) for i in range(*indice.indices(len(self)))]
+        if indice < 0:
+            indice += len(self)
+        if not 0 <= indice < len(self):
+            raise IndexError(indice)
+        return self._piano(indice)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self._piano(i)
+
+    def __add__(self, altri) -> "PianiCompatti":
+        return self.concatena(altri)
+
+    def __eq__(self, altri) -> bool:
+        if not isinstance(altri, (PianiCompatti, list, tuple)):
+            return NotImplemented
+        return len(self) == len(altri) and all(a == b for a, b in zip(self, altri))
+
+    def __repr__(self) -> str:
+        return f"PianiCompatti({len(self)} spezzoni, {len(self.schemi)} schemi)"
+
+    def in_array(self) -> tuple:
+        """Solo gli array NumPy, nell'ordine del costruttore"""
+        return (self.misure, self.schemi, self.lunghezze, self.scarti, self.spezzone_ids, self.schema_di)
+
+    @classmethod
+    def da_array(cls, array: tuple) -> "PianiCompatti":
+        return cls(*array)
+
+    # Nel pickle vanno solo gli array: i tagli già espansi si rifanno quando servono
+    def __getstate__(self):
+        return self.in_array()
+
+    def __setstate__(self, stato):
+        self.__init__(*stato)
+
+def controlla_misure(spezzoni: Iterable[Spezzone], richieste: Iterable[TaglioRichiesto]):
+    """
+    ValueError alla prima misura senza senso: lunghezze non positive (o non finite),
+    quantità negative. Meglio un errore che un piano con tagli da 0 o da -1 m.
+    """
+    for spezzone in spezzoni:
+        if not (math.isfinite(spezzone.lunghezza) and spezzone.lunghezza > 0):
+            raise ValueError(f"Spezzone #{spezzone.id}: lunghezza non valida ({spezzone.lunghezza})")
+    for richiesta in richieste:
+        if not (math.isfinite(richiesta.lunghezza) and richiesta.lunghezza > 0):
+            raise ValueError(f"Taglio richiesto: lunghezza non valida ({richiesta.lunghezza})")
+        if richiesta.quantita < 0:
+            raise ValueError(f"Taglio da {richiesta.lunghezza} m: quantità negativa ({richiesta.quantita})")
+
+def raggruppa_piani(piani: List[PianoTaglio]) -> List[GruppoPiani]:
+    """Piani con lo stesso schema di taglio raggruppati (i più numerosi per primi)"""
+    if isinstance(piani, PianiCompatti):
+        return piani.gruppi()
+    gruppi: Dict[tuple, GruppoPiani] = {}
+    for piano in piani:
+        chiave = (piano.spezzone_lunghezza, tuple(piano.tagli))
+        gruppo = gruppi.get(chiave)
+        if gruppo is None:
+            gruppi[chiave] = GruppoPiani(piano.spezzone_lunghezza, piano.tagli, piano.scarto, [piano.spezzone_id])
+        else:
+            gruppo.spezzone_ids.append(piano.spezzone_id)
+    return sorted(gruppi.values(), key=lambda g: (-g.quantita, -g.spezzone_lunghezza))
+
+@dataclass
+class StatisticheCalcolo:
+    """Dove è andato il tempo di un calcolo: durata delle fasi (secondi) e contatori della ricerca"""
+    metodo: str
+    fasi: Dict[str, float] = field(default_factory=dict)
+    contatori: Dict[str, int] = field(default_factory=dict)
+    profilo: Optional[str] = None  # file pstats di cProfile, se richiesto
+
+    @contextmanager
+    def fase(self, nome: str):
+        inizio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.fasi[nome] = self.fasi.get(nome, 0.0) + time.perf_counter() - inizio
+
+    def conta(self, nome: str, n: int = 1):
+        self.contatori[nome] = self.contatori.get(nome, 0) + n
+
+    @property
+    def totale(self) -> float:
+        return sum(self.fasi.values())
+
+    def unisci(self, altre: "StatisticheCalcolo") -> "StatisticheCalcolo":
+        """Somma di due calcoli (fasi e contatori)"""
+        unite = StatisticheCalcolo(self.metodo, dict(self.fasi), dict(self.contatori), self.profilo or altre.profilo)
+        for nome, durata in altre.fasi.items():
+            unite.fasi[nome] = unite.fasi.get(nome, 0.0) + durata
+        for nome, n in altre.contatori.items():
+            unite.conta(nome, n)
+        return unite
+
+    def in_dict(self) -> dict:
+        return {
+            "metodo": self.metodo,
+            "totale_s": round(self.totale, 6),
+            "fasi_s": {nome: round(durata, 6) for nome, durata in self.fasi.items()},
+            "contatori": dict(self.contatori),
+            "profilo": self.profilo,
+        }
+
+@dataclass
+class RisultatoCalcolo:
+    piani: PianiCompatti  # si legge come List[PianoTaglio]
+    scarto_totale: float
+    completato: bool  # True = tutto fatto, False = parziale
+    tagli_fatti: Dict[float, int]  # misura -> quantità fatta
+    tagli_mancanti: Dict[float, int]  # misura -> quantità mancante
+    spezzoni_usati: int
+    spezzoni_totali: int
+    limite_inferiore: Optional[float] = None  # scarto minimo teorico (m), solo con metodo "colgen"
+    statistiche: Optional[StatisticheCalcolo] = None  # tempi e contatori del calcolo
+    materiali: Optional[Dict[str, "RisultatoCalcolo"]] = None  # per materiale, se l'ordine ne ha più d'uno
+
+@dataclass
+class BarraCommerciale:
+    """Barra in vendita, senza limite di quantità: lunghezza commerciale e costo di una barra"""
+    lunghezza: float
+    costo: float
+
+@dataclass
+class PianoAcquisto:
+    """Barre da comprare per fare tutti i tagli, al costo minimo, e il piano completo"""
+    acquisti: Dict[float, int]  # lunghezza della barra -> quante comprarne
+    costo_totale: float
+    risultato: RisultatoCalcolo  # spezzoni esistenti e barre comprate (ID dopo quelli degli spezzoni)
+    costo_minimo: Optional[float] = None  # costo minimo teorico (rilassamento lineare), se si riesce a fare tutto
+
+@dataclass
+class ControlloMateriale:
+    """
+    Verifica immediata, prima di ogni calcolo: se dice carenza il materiale non basta
+    di sicuro; se non la dice, di solito basta (ma l'incastro potrebbe comunque non riuscire).
+    """
+    carenza: bool
+    metri_richiesti: float
+    metri_disponibili: float
+    spezzoni_minimi: int  # limite inferiore (L2 di Martello-Toth sullo spezzone più lungo)
+    spezzoni_disponibili: int
+    misure_troppo_lunghe: List[float] = field(default_factory=list)  # più lunghe di ogni spezzone
+    motivo: str = ""
+
+@dataclass
+class Variazione:
+    """Modifica rispetto all'ultimo calcolo: spezzoni e tagli aggiunti o tolti"""
+    spezzoni_aggiunti: List[Spezzone] = field(default_factory=list)
+    spezzoni_rimossi: List[Spezzone] = field(default_factory=list)
+    tagli_aggiunti: List[TaglioRichiesto] = field(default_factory=list)
+    tagli_rimossi: List[TaglioRichiesto] = field(default_factory=list)
+
+    @classmethod
+    def confronta(cls, spezzoni_prima: List[Spezzone], spezzoni_dopo: List[Spezzone],
+                  richieste_prima: List[TaglioRichiesto], richieste_dopo: List[TaglioRichiesto]) -> "Variazione":
+        """Differenza tra due situazioni, confrontando spezzoni e tagli per lunghezza e materiale"""
+        variazione = cls()
+        prima: Dict[tuple, List[Spezzone]] = {}
+        for s in spezzoni_prima:
+            prima.setdefault((s.lunghezza, s.materiale), []).append(s)
+        for s in spezzoni_dopo:
+            if prima.get((s.lunghezza, s.materiale)):
+                prima[(s.lunghezza, s.materiale)].pop()
+            else:
+                variazione.spezzoni_aggiunti.append(s)
+        variazione.spezzoni_rimossi = [s for v in prima.values() for s in v]
+        
+        quantita: Dict[tuple, int] = {}
+        for r in richieste_dopo:
+            quantita[(r.lunghezza, r.materiale)] = quantita.get((r.lunghezza, r.materiale), 0) + r.quantita
+        for r in richieste_prima:
+            quantita[(r.lunghezza, r.materiale)] = quantita.get((r.lunghezza, r.materiale), 0) - r.quantita
+        for (misura, materiale), delta in quantita.items():
+            if delta > 0:
+                variazione.tagli_aggiunti.append(TaglioRichiesto(misura, delta, materiale=materiale))
+            elif delta < 0:
+                variazione.tagli_rimossi.append(TaglioRichiesto(misura, -delta, materiale=materiale))
+        return variazione
+
+    def del_materiale(self, materiale: str) -> "Variazione":
+        """La parte della modifica che riguarda un solo materiale"""
+        return Variazione(
+            [s for s in self.spezzoni_aggiunti if s.materiale == materiale],
+            [s for s in self.spezzoni_rimossi if s.materiale == materiale],
+            [r for r in self.tagli_aggiunti if r.materiale == materiale],
+            [r for r in self.tagli_rimossi if r.materiale == materiale],
+        )
+
+    def materiali(self) -> set:
+        return ({s.materiale for s in self.spezzoni_aggiunti + self.spezzoni_rimossi}
+                | {r.materiale for r in self.tagli_aggiunti + self.tagli_rimossi})
+
+    def vuota(self) -> bool:
+        return not (self.spezzoni_aggiunti or self.spezzoni_rimossi or self.tagli_aggiunti or self.tagli_rimossi)
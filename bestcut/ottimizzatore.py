@@ -0,0 +1,1931 @@
+# bestcut/ottimizzatore.py
+# Motore di calcolo del piano di taglio (nessuna dipendenza dall'interfaccia)
+
+import cProfile
+import json
+import logging
+import math
+import os
+import heapq
+import pickle
+import random
+import threading
+import time
+from bisect import bisect_left, bisect_right, insort
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from concurrent.futures.process import BrokenProcessPool
+from typing import List, Tuple, Dict, Optional
+
+import numpy as np
+
+from .modelli import (
+    Spezzone, TaglioRichiesto, PianiCompatti, RisultatoCalcolo, Variazione, StatisticheCalcolo, ControlloMateriale,
+    BarraCommerciale, PianoAcquisto, controlla_misure
+)
+from .sfondo import Avanzamento
+from .libreria import LibreriaPattern
+
+RISOLUZIONE_PREDEFINITA = 0.001  # metri per unità intera interna (1 mm)
+
+# Una riga JSON per calcolo (fasi e contatori), al livello INFO
+_log = logging.getLogger("bestcut")
+
+
+class _Istanza:
+    """
+    Spezzoni e richieste convertiti una volta sola in unità intere (multipli di
+    `risoluzione` metri), in array NumPy compatti: il nucleo dell'ottimizzatore
+    non confronta mai float. Si torna ai metri solo componendo il RisultatoCalcolo.
+    """
+
+    def __init__(self, spezzoni: List[Spezzone], richieste: List[TaglioRichiesto], risoluzione: float):
+        self.risoluzione = risoluzione
+        self.decimali = max(0, -math.floor(math.log10(risoluzione)))
+        self.spezzoni_totali = len(spezzoni)
+        controlla_misure(spezzoni, richieste)
+        
+        # Spezzoni dal più grande al più piccolo
+        self.spezzoni = sorted(spezzoni, key=lambda x: x.lunghezza, reverse=True)
+        self.lunghezze = np.array([self.in_unita(s.lunghezza) for s in self.spezzoni], dtype=np.int64)
+        if len(self.lunghezze) and self.lunghezze[-1] <= 0:
+            raise ValueError(f"Spezzone #{self.spezzoni[-1].id}: lunghezza sotto la risoluzione ({risoluzione} m)")
+        
+        # Richieste raggruppate per misura intera (decrescente); l'etichetta è la misura
+        # in metri come l'ha scritta l'utente, usata come chiave nei risultati
+        conteggio: Dict[int, int] = {}
+        priorita: Dict[int, float] = {}
+        self.etichette: Dict[int, float] = {}
+        for richiesta in richieste:
+            if richiesta.quantita > 0:
+                unita = self.in_unita(richiesta.lunghezza)
+                if unita <= 0:
+                    raise ValueError(f"Taglio da {richiesta.lunghezza} m: sotto la risoluzione ({risoluzione} m)")
+                conteggio[unita] = conteggio.get(unita, 0) + richiesta.quantita
+                priorita[unita] = max(priorita.get(unita, 0.0), richiesta.priorita)
+                self.etichette.setdefault(unita, richiesta.lunghezza)
+        self.misure = np.array(sorted(conteggio, reverse=True), dtype=np.int64)
+        self.quantita = np.array([conteggio[u] for u in self.misure.tolist()], dtype=np.int64)
+        self.priorita = np.array([priorita[u] for u in self.misure.tolist()], dtype=np.float64)
+
+    def in_unita(self, metri: float) -> int:
+        return round(metri / self.risoluzione)
+
+    def in_metri(self, unita) -> float:
+        return round(float(unita) * self.risoluzione, self.decimali)
+
+
+# Piano interno: (indice dello spezzone nell'istanza, pezzi per ogni misura)
+_Piano = Tuple[int, np.ndarray]
+
+
+# Secondi minimi tra due piani intermedi pubblicati dalla generazione di colonne
+_INTERVALLO_PUBBLICAZIONE = 0.5
+
+
+class _Scadenza:
+    """Tempo limite di un calcolo, anticipato se chi lo osserva lo annulla"""
+
+    def __init__(self, secondi: float, avanzamento: Optional[Avanzamento] = None):
+        self.inizio = time.perf_counter()
+        self.secondi = secondi
+        self.avanzamento = avanzamento
+
+    def scaduta(self) -> bool:
+        if self.avanzamento is not None and self.avanzamento.annullato:
+            return True
+        return time.perf_counter() >= self.inizio + self.secondi
+
+    def rimanente(self) -> float:
+        if self.avanzamento is not None and self.avanzamento.annullato:
+            return 0.0
+        return max(0.0, self.inizio + self.secondi - time.perf_counter())
+
+    def frazione(self) -> float:
+        """Parte del tempo limite già passata"""
+        return min(1.0, (time.perf_counter() - self.inizio) / self.secondi) if self.secondi > 0 else 1.0
+
+
+# ============================================================
+# Generazione di colonne (Gilmore-Gomory)
+# ============================================================
+
+_EPS = 1e-9
+# Pivot più piccolo accettato dalla regola di Bland (sotto si sceglie il più grande)
+_PIVOT_MINIMO = 1e-6
+# Tipi di spezzone prezzati per giro e scarto relativo tra master e limite lagrangiano
+# a cui la generazione di colonne si ferma
+_COLONNE_PER_GIRO = 30
+_SCARTO_LAGRANGIANO = 1e-4
+# Peso del centro (duali del miglior limite) nella stabilizzazione dei duali
+_STABILIZZAZIONE = 0.5
+# Tipi di spezzone (i più numerosi) su cui si parte dai pattern omogenei
+_TIPI_OMOGENEI = 20
+# Oltre queste lunghezze di spezzone diverse la generazione di colonne le raggruppa in classi
+_CLASSI_LUNGHEZZA = 80
+
+
+class _MasterLP:
+    """
+    Problema master ristretto della generazione di colonne, in forma standard
+    (min c·x con A·x = b, x >= 0), risolto con il simplesso rivisto.
+
+    Righe: una per misura richiesta (domanda) e una per tipo di spezzone (disponibilità).
+    Variabili fisse: eccedenza e mancanza per ogni misura, spezzoni inutilizzati per ogni tipo.
+    Mancanze e spezzoni inutilizzati formano la base iniziale (identità), sempre ammissibile.
+    """
+
+    def __init__(self, domanda: np.ndarray, disponibili: np.ndarray, penalita: np.ndarray):
+        m, k = len(domanda), len(disponibili)
+        self.m = m
+        self.b = np.concatenate([domanda, disponibili]).astype(float)
+        self.n_col = 2 * m + k
+        self.A = np.zeros((m + k, max(4 * self.n_col, 64)))
+        self.A[:m, :m] = -np.eye(m)
+        self.A[:m, m:2 * m] = np.eye(m)
+        self.A[m:, 2 * m:self.n_col] = np.eye(k)
+        self.c = np.zeros(self.A.shape[1])
+        self.c[m:2 * m] = penalita
+        self.primo_pattern = self.n_col
+        self.base = np.arange(m, self.n_col)
+        self.B_inv = np.eye(m + k)
+        self.x_B = self.b.copy()
+        self.iterazioni = 0  # pivot totali, per le statistiche
+
+    def aggiungi_pattern(self, tipo: int, pattern: np.ndarray, costo: float):
+        """Aggiunge la colonna di un pattern di taglio su uno spezzone del tipo dato"""
+        if self.n_col == self.A.shape[1]:
+            self.A = np.hstack([self.A, np.zeros_like(self.A)])
+            self.c = np.concatenate([self.c, np.zeros_like(self.c)])
+        self.A[:self.m, self.n_col] = pattern
+        self.A[self.m + tipo, self.n_col] = 1.0
+        self.c[self.n_col] = costo
+        self.n_col += 1
+
+    def risolvi(self, scadenza: _Scadenza) -> bool:
+        """Simplesso rivisto fino all'ottimo; False se scade il tempo prima"""
+        degeneri = 0
+        iterazioni = 0
+        while not scadenza.scaduta():
+            iterazioni += 1
+            self.iterazioni += 1
+            if iterazioni % 100 == 0:
+                self._rifattorizza()
+            
+            ridotti = self.c[:self.n_col] - self.duali() @ self.A[:, :self.n_col]
+            ridotti[self.base] = 0.0
+            if degeneri > 50:
+                # Regola di Bland per uscire da un ciclo degenere
+                candidati = np.flatnonzero(ridotti < -_EPS)
+                if not len(candidati):
+                    return True
+                entra = int(candidati[0])
+            else:
+                entra = int(np.argmin(ridotti))
+                if ridotti[entra] >= -_EPS:
+                    return True
+            
+            d = self.B_inv @ self.A[:, entra]
+            rapporti = np.full(len(d), np.inf)
+            positivi = d > _EPS
+            rapporti[positivi] = self.x_B[positivi] / d[positivi]
+            theta = rapporti.min()
+            pari = np.flatnonzero(rapporti <= theta + _EPS)
+            if degeneri > 50 and (d[pari] > _PIVOT_MINIMO).any():
+                # Bland anche per chi esce: a pari rapporto la variabile di indice minore
+                pari = pari[d[pari] > _PIVOT_MINIMO]
+                esce = int(pari[np.argmin(self.base[pari])])
+            else:
+                # A pari rapporto il pivot più grande: con quelli minuscoli la base si guasta
+                esce = int(pari[np.argmax(d[pari])])
+            theta = rapporti[esce]
+            degeneri = degeneri + 1 if theta <= _EPS else 0
+            
+            self.x_B -= theta * d
+            self.x_B[esce] = theta
+            riga = self.B_inv[esce] / d[esce]
+            self.B_inv -= np.outer(d, riga)
+            self.B_inv[esce] = riga
+            self.base[esce] = entra
+            np.maximum(self.x_B, 0.0, out=self.x_B)
+        return False
+
+    def _rifattorizza(self):
+        try:
+            self.B_inv = np.linalg.inv(self.A[:, self.base])
+        except np.linalg.LinAlgError:
+            # Base degenere per gli arrotondamenti: si riparte da quella iniziale (identità)
+            self.base = np.arange(self.m, self.m + len(self.b))
+            self.B_inv = np.eye(len(self.b))
+        self.x_B = np.maximum(self.B_inv @ self.b, 0.0)
+
+    def duali(self) -> np.ndarray:
+        return self.c[self.base] @ self.B_inv
+
+    def valore(self) -> float:
+        return float(self.c[self.base] @ self.x_B)
+
+    def soluzione(self) -> np.ndarray:
+        """Valori (frazionari) delle colonne pattern"""
+        x = np.zeros(self.n_col)
+        x[self.base] = self.x_B
+        return x[self.primo_pattern:]
+
+
+def _zaino_limitato(pesi: np.ndarray, valori: np.ndarray, limiti: np.ndarray, capacita: int):
+    """
+    Zaino limitato per programmazione dinamica su lunghezze intere.
+    Ogni misura è scomposta in blocchi 1, 2, 4, ... pezzi (zaino 0/1 equivalente).
+    Restituisce il valore massimo per ogni capacità 0..capacita e le scelte per ricostruire.
+    """
+    blocchi = []
+    for i in range(len(pesi)):
+        if valori[i] <= _EPS or pesi[i] > capacita:
+            continue
+        residuo = int(min(limiti[i], capacita // pesi[i]))
+        q = 1
+        while residuo > 0:
+            t = min(q, residuo)
+            blocchi.append((i, t))
+            residuo -= t
+            q *= 2
+    
+    dp = np.zeros(capacita + 1)
+    scelte = np.zeros((len(blocchi), capacita + 1), dtype=bool)
+    for riga, (i, t) in enumerate(blocchi):
+        peso = int(pesi[i]) * t
+        candidato = dp[:-peso] + valori[i] * t
+        migliora = candidato > dp[peso:] + _EPS
+        scelte[riga, peso:] = migliora
+        dp[peso:][migliora] = candidato[migliora]
+    return dp, scelte, blocchi
+
+
+def _ricostruisci_zaino(scelte: np.ndarray, blocchi, pesi: np.ndarray, capacita: int) -> np.ndarray:
+    """Pattern (pezzi per misura) che realizza il valore ottimo alla capacità data"""
+    pattern = np.zeros(len(pesi), dtype=np.int64)
+    c = capacita
+    for riga in range(len(blocchi) - 1, -1, -1):
+        if scelte[riga, c]:
+            i, t = blocchi[riga]
+            pattern[i] += t
+            c -= int(pesi[i]) * t
+    return pattern
+
+
+def _genera_colonne(pesi: np.ndarray, domanda: np.ndarray, lunghezze: np.ndarray,
+                    disponibili: np.ndarray, pattern_noti: List[Tuple[int, np.ndarray]],
+                    visti: set, scadenza: _Scadenza, statistiche: Optional[StatisticheCalcolo] = None,
+                    costi: Optional[np.ndarray] = None,
+                    tipi_limite: Optional[Tuple[np.ndarray, np.ndarray]] = None
+                    ) -> Tuple[Optional[np.ndarray], Optional[float]]:
+    """
+    Risolve il rilassamento lineare del taglio con generazione di colonne.
+    Il master minimizza il costo degli spezzoni usati (predefinito: i metri, in
+    spezzoni della lunghezza massima; `lunghezze` va dal più lungo) più una penalità
+    per ogni pezzo non fatto, maggiore del costo di qualsiasi spezzone (con materiale
+    scarso massimizza i metri tagliati); i nuovi pattern arrivano dallo zaino limitato
+    e vengono aggiunti a pattern_noti.
+    A ogni giro entrano al più _COLONNE_PER_GIRO pattern, dei tipi di spezzone col
+    costo ridotto più negativo (con centinaia di lunghezze diverse il master resta
+    piccolo), e ci si ferma quando il master è entro _SCARTO_LAGRANGIANO dal limite.
+    Se `lunghezze` sono classi di spezzoni (ognuna lunga quanto il suo più corto),
+    `tipi_limite` dà i tipi veri (lunghezze decrescenti, spezzoni per tipo): il limite
+    restituito si calcola su quelli, coi costi predefiniti, e resta valido.
+    Restituisce i valori dei pattern noti e il limite lagrangiano (nell'unità dei
+    costi); se il tempo scade prima, None e l'ultimo limite valido (dai duali del
+    master, anche se non ottimi).
+    Con `statistiche`: pivot del simplesso, zaini risolti e pattern generati.
+    """
+    attive = np.flatnonzero(domanda > 0)
+    pesi_a, domanda_a = pesi[attive], domanda[attive]
+    capacita = int(lunghezze[0] if tipi_limite is None else tipi_limite[0][0])
+    costi = lunghezze / capacita if costi is None else costi
+    lunghezze_l, disponibili_l = (lunghezze, disponibili) if tipi_limite is None else tipi_limite
+    costi_l = costi if tipi_limite is None else lunghezze_l / capacita
+    penalita = 2.0 * max(float(costi_l.max()), _EPS) * pesi_a / pesi_a.min()
+    master = _MasterLP(domanda_a, disponibili, penalita)
+    colonne = []
+    
+    def aggiungi_colonna(indice: int):
+        tipo, pattern = pattern_noti[indice]
+        # Niente pezzi oltre il residuo: il rilassamento non deve contare sugli eccessi
+        ridotto = np.minimum(pattern[attive], domanda_a)
+        if ridotto.any() and disponibili[tipo]:
+            colonne.append(indice)
+            master.aggiungi_pattern(tipo, ridotto, costi[tipo])
+    
+    for indice in range(len(pattern_noti)):
+        aggiungi_colonna(indice)
+    
+    limite = limite_master = None
+    zaini = generati = 0
+    
+    def lagrangiano(y: np.ndarray, dp: np.ndarray, lunghezze_t: np.ndarray, disponibili_t: np.ndarray,
+                    costi_t: np.ndarray) -> float:
+        # Valido per qualsiasi duale 0 <= y <= penalità, anche prima della convergenza.
+        # Il migliore tra quello sugli spezzoni disponibili e quello di Farley, che
+        # scala il costo ridotto relativo sul costo stesso della soluzione
+        ridotti = costi_t - dp[lunghezze_t]
+        valore = float(y @ domanda_a + disponibili_t @ np.minimum(0.0, ridotti))
+        usabili = disponibili_t > 0
+        if usabili.any() and costi_t.min() > 0:
+            relativo = min(0.0, float((ridotti[usabili] / costi_t[usabili]).min()))
+            valore = max(valore, float(y @ domanda_a) / (1.0 - relativo))
+        return valore
+    
+    def prezza(y: np.ndarray):
+        # Zaino su tutte le capacità coi duali y; si aggiornano il limite restituito e
+        # quello del master (per fermarsi), e il centro della stabilizzazione
+        nonlocal limite, limite_master, centro, zaini
+        dp, scelte, blocchi = _zaino_limitato(pesi_a, y, domanda_a, capacita)
+        zaini += 1
+        valore = lagrangiano(y, dp, lunghezze_l, disponibili_l, costi_l)
+        limite = valore if limite is None else max(limite, valore)
+        if tipi_limite is not None:
+            valore = lagrangiano(y, dp, lunghezze, disponibili, costi)
+        if limite_master is None or valore > limite_master:
+            limite_master, centro = valore, y
+        return dp, scelte, blocchi
+    
+    def nuove_colonne(y: np.ndarray, v: np.ndarray, dp: np.ndarray, scelte, blocchi) -> int:
+        # Solo i _COLONNE_PER_GIRO tipi col costo ridotto più negativo (gli altri aspettano
+        # il giro dopo); il pattern entra se ha costo ridotto negativo coi duali y, v del master
+        ridotti = costi - v - dp[lunghezze]
+        nuovi = 0
+        for k in np.argsort(ridotti, kind="stable")[:_COLONNE_PER_GIRO]:
+            if ridotti[k] >= -_EPS:
+                break
+            if not disponibili[k]:
+                continue
+            ridotto = _ricostruisci_zaino(scelte, blocchi, pesi_a, int(lunghezze[k]))
+            if costi[k] - v[k] - y @ ridotto >= -_EPS:
+                continue
+            pattern = np.zeros(len(pesi), dtype=np.int64)
+            pattern[attive] = ridotto
+            chiave = (int(k), pattern.tobytes())
+            if chiave not in visti:
+                visti.add(chiave)
+                pattern_noti.append((int(k), pattern))
+                aggiungi_colonna(len(pattern_noti) - 1)
+                nuovi += 1
+        return nuovi
+    
+    centro = None
+    try:
+        while True:
+            risolto = master.risolvi(scadenza)
+            duali = master.duali()
+            y, v = np.clip(duali[:len(attive)], 0.0, penalita), duali[len(attive):]
+            if not risolto:
+                if limite is None:
+                    prezza(y)
+                return None, limite
+            # Stabilizzazione di Wentges: si prezza a metà strada tra i duali del master
+            # e quelli del miglior limite, che oscillano meno; se così non esce nessuna
+            # colonna buona si riprova coi duali del master
+            nuovi = 0
+            if centro is not None:
+                nuovi = nuove_colonne(y, v, *prezza(_STABILIZZAZIONE * centro + (1 - _STABILIZZAZIONE) * y))
+            if not nuovi:
+                nuovi = nuove_colonne(y, v, *prezza(y))
+            generati += nuovi
+            valore = master.valore()
+            vicino = valore - limite_master <= _SCARTO_LAGRANGIANO * max(1.0, abs(valore))
+            if not nuovi or vicino or scadenza.scaduta():
+                break
+    finally:
+        if statistiche is not None:
+            statistiche.conta("pivot_simplesso", master.iterazioni)
+            statistiche.conta("zaini_risolti", zaini)
+            statistiche.conta("pattern_generati", generati)
+    
+    x = np.zeros(len(pattern_noti))
+    x[colonne] = master.soluzione()
+    return x, limite
+
+
+# ============================================================
+# Portafoglio di euristiche (varianti in parallelo)
+# ============================================================
+
+REGOLE_VARIANTI = ("ffd", "bfd", "wfd")
+
+# Pool dei processi del portafoglio: avviato al primo calcolo e riusato dai successivi
+# (avviare i processi costa centinaia di millisecondi, più di molte varianti).
+# Con il PID di chi l'ha avviato: un processo figlio (fork) non usa quello del padre
+_pool_varianti: Optional[Tuple[int, int, ProcessPoolExecutor]] = None
+_lock_pool = threading.Lock()
+
+
+def _pool_portafoglio(processi: Optional[int]) -> ProcessPoolExecutor:
+    global _pool_varianti
+    processi = processi or os.cpu_count() or 1
+    with _lock_pool:
+        if _pool_varianti is None or _pool_varianti[:2] != (os.getpid(), processi):
+            if _pool_varianti is not None and _pool_varianti[0] == os.getpid():
+                _pool_varianti[2].shutdown(wait=False)
+            _pool_varianti = (os.getpid(), processi, ProcessPoolExecutor(max_workers=processi))
+        return _pool_varianti[2]
+
+
+def _scarta_pool_portafoglio(pool: ProcessPoolExecutor):
+    """Un pool rotto non si riusa: il prossimo calcolo ne avvia uno nuovo"""
+    global _pool_varianti
+    with _lock_pool:
+        if _pool_varianti is not None and _pool_varianti[2] is pool:
+            _pool_varianti = None
+    pool.shutdown(wait=False)
+
+
+def _impacca_variante(lunghezze: np.ndarray, misure: np.ndarray, quantita: np.ndarray,
+                      ordine_spezzoni: np.ndarray, ordine_misure: np.ndarray,
+                      regola: str) -> Tuple[List[_Piano], np.ndarray]:
+    """
+    Impaccamento con un ordine qualsiasi di spezzoni e misure.
+      - "ffd": uno spezzone alla volta, prendendo le misure nell'ordine dato
+      - "bfd": ogni misura nello spezzone aperto con il residuo più piccolo che la contiene
+      - "wfd": ogni misura nello spezzone aperto con il residuo più grande
+    Uno spezzone nuovo si apre solo se nessuno di quelli aperti va bene: il primo,
+    nell'ordine dato, abbastanza lungo.
+    """
+    residuo_domanda = quantita.copy()
+    piani: List[_Piano] = []
+    misure_l = misure.tolist()
+    
+    if regola == "ffd":
+        for b in ordine_spezzoni.tolist():
+            if not residuo_domanda.any():
+                break
+            residuo = int(lunghezze[b])
+            pattern = np.zeros(len(misure), dtype=np.int64)
+            for i in ordine_misure.tolist():
+                if residuo_domanda[i] and misure_l[i] <= residuo:
+                    n = min(int(residuo_domanda[i]), residuo // misure_l[i])
+                    pattern[i] = n
+                    residuo -= n * misure_l[i]
+                    residuo_domanda[i] -= n
+            if pattern.any():
+                piani.append((b, pattern))
+        return piani, residuo_domanda
+    
+    aperti: List[Tuple[int, int]] = []  # (residuo, indice in piani), ordinati
+    chiusi = list(ordine_spezzoni.tolist())
+    for i in ordine_misure.tolist():
+        misura = misure_l[i]
+        while residuo_domanda[i]:
+            if regola == "wfd":
+                k = len(aperti) - 1 if aperti and aperti[-1][0] >= misura else len(aperti)
+            else:
+                k = bisect_left(aperti, (misura, -1))
+            if k < len(aperti):
+                residuo, indice = aperti.pop(k)
+            else:
+                nuovo = next((p for p, b in enumerate(chiusi) if lunghezze[b] >= misura), None)
+                if nuovo is None:
+                    break
+                b = chiusi.pop(nuovo)
+                residuo, indice = int(lunghezze[b]), len(piani)
+                piani.append((b, np.zeros(len(misure), dtype=np.int64)))
+            
+            # Best fit: stesse misure nello stesso spezzone finché ci stanno;
+            # worst fit: un pezzo alla volta, poi si riconsidera il più vuoto
+            n = min(int(residuo_domanda[i]), residuo // misura) if regola == "bfd" else 1
+            piani[indice][1][i] += n
+            residuo_domanda[i] -= n
+            insort(aperti, (residuo - n * misura, indice))
+    return piani, residuo_domanda
+
+
+def _esegui_variante(lunghezze: np.ndarray, misure: np.ndarray, quantita: np.ndarray,
+                     regola: str, seme: Optional[Tuple[int, int]]) -> Tuple[List[_Piano], np.ndarray]:
+    """
+    Una variante del portafoglio (funzione di modulo, così gira nei processi figli).
+    Senza seme: ordine decrescente puro. Con seme: lunghezze e misure perturbate
+    a caso prima di ordinarle, per esplorare ordini diversi in modo riproducibile.
+    """
+    if seme is None:
+        if regola == "ffd":
+            return OttimizzatoreTagli._impacca_ffd(lunghezze, misure, quantita)
+        if regola == "bfd":
+            return OttimizzatoreTagli._impacca_bfd(lunghezze, misure, quantita)
+        ordine_spezzoni = np.arange(len(lunghezze))
+        ordine_misure = np.arange(len(misure))
+    else:
+        rng = np.random.default_rng(seme)
+        ampiezza = rng.uniform(0.05, 0.5)
+        ordine_spezzoni = np.argsort(-lunghezze * rng.uniform(1 - ampiezza, 1 + ampiezza, len(lunghezze)),
+                                     kind="stable")
+        ordine_misure = np.argsort(-misure * rng.uniform(1 - ampiezza, 1 + ampiezza, len(misure)),
+                                   kind="stable")
+    return _impacca_variante(lunghezze, misure, quantita, ordine_spezzoni, ordine_misure, regola)
+
+
+def _limite_spezzoni(lunghezze: np.ndarray, metri_richiesti: int) -> int:
+    """Minimo numero di spezzoni per la lunghezza totale richiesta (i più lunghi prima)"""
+    cumulata = np.cumsum(lunghezze)
+    return int(np.searchsorted(cumulata, metri_richiesti)) + 1 if metri_richiesti > 0 else 0
+
+
+def _limite_l2(misure: np.ndarray, quantita: np.ndarray, capacita: int) -> int:
+    """
+    Limite inferiore L2 (Martello-Toth) degli spezzoni di lunghezza `capacita` che
+    servono per i pezzi (misure decrescenti, tutte <= capacita). Si provano come
+    soglia alfa le misure fino a capacita/2: con le somme cumulate, O(misure log misure).
+    """
+    if not len(misure):
+        return 0
+    crescenti = misure[::-1]
+    quanti = np.concatenate([[0], np.cumsum(quantita[::-1])])
+    metri = np.concatenate([[0], np.cumsum((misure * quantita)[::-1])])
+
+    def tra(minimo: int, massimo: int) -> Tuple[int, int]:
+        # Pezzi (e metri) con misura in [minimo, massimo]
+        a = int(np.searchsorted(crescenti, minimo, side="left"))
+        b = int(np.searchsorted(crescenti, massimo, side="right"))
+        return int(quanti[b] - quanti[a]), int(metri[b] - metri[a])
+
+    migliore = 0
+    for alfa in [0] + [int(m) for m in crescenti if 2 * m <= capacita]:
+        n1, _ = tra(capacita - alfa + 1, capacita)
+        n2, s2 = tra(capacita // 2 + 1, capacita - alfa)
+        _, s3 = tra(max(alfa, 1), capacita // 2)
+        avanzo = n2 * capacita - s2
+        migliore = max(migliore, n1 + n2 + max(0, -(-(s3 - avanzo) // capacita)))
+    return migliore
+
+
+def _miglior_riempimento(misure: List[int], quantita: List[int], capacita: int) -> Tuple[int, List[int]]:
+    """
+    Pezzi (al massimo quantita[i] di misura misure[i]) che riempiono di più
+    `capacita`: subset-sum limitato su un bitset, un intero Python in cui il bit k
+    vale 1 se la lunghezza k si può comporre. Ogni quantità si spezza in blocchi
+    1, 2, 4, ... (O(log q) spostamenti per misura); ci si ferma al primo
+    riempimento esatto. Restituisce (lunghezza riempita, pezzi per misura).
+    """
+    maschera = (1 << (capacita + 1)) - 1
+    raggiungibili = 1
+    passi: List[Tuple[int, int, int]] = []  # (bitset prima del blocco, misura, pezzi del blocco)
+    for i, (misura, q) in enumerate(zip(misure, quantita)):
+        q = min(q, capacita // misura)
+        blocco = 1
+        while q > 0:
+            n = min(blocco, q)
+            passi.append((raggiungibili, i, n))
+            raggiungibili = (raggiungibili | (raggiungibili << (n * misura))) & maschera
+            q -= n
+            blocco <<= 1
+        if raggiungibili >> capacita:
+            break
+    
+    # A ritroso: un blocco è stato preso se la lunghezza non era già raggiungibile senza
+    pieno = raggiungibili.bit_length() - 1
+    pezzi = [0] * len(misure)
+    resto = pieno
+    for prima, i, n in reversed(passi):
+        if not (prima >> resto) & 1:
+            pezzi[i] += n
+            resto -= n * misure[i]
+    return pieno, pezzi
+
+
+# ============================================================
+# Ricerca locale (miglioramento di un piano già fatto)
+# ============================================================
+
+def _ricerca_locale(lunghezze: np.ndarray, misure: np.ndarray, piani: List[_Piano], soglia: int,
+                    scadenza: _Scadenza, seme: int = 0,
+                    contatori: Optional[Dict[str, int]] = None) -> List[_Piano]:
+    """
+    Sposta e scambia tagli tra gli spezzoni del piano finché c'è tempo, per liberare
+    spezzoni interi o raccogliere lo scarto in pochi avanzi riutilizzabili (> soglia).
+    Mosse: un taglio in un altro spezzone, scambio 1-1, scambio 2-1 e 1-2, più lo
+    svuotamento dello spezzone più vuoto tra quelli cambiati dall'ultimo tentativo
+    (best fit dei suoi tagli negli altri, per bisezione sugli avanzi in ordine).
+    Ogni spezzone costa (in ordine di importanza): 1 se è usato, meno il quadrato
+    dell'avanzo (un avanzo grande vale più di tanti piccoli, e lo spezzone che si
+    svuota arriva a liberarsi), il suo avanzo se è scarto da buttare
+    (0 < avanzo <= soglia). Una mossa tocca due spezzoni: la
+    differenza di costo si calcola in O(1) dai loro riempimenti, e la mossa si fa
+    se non peggiora. Lo spezzone d'origine è il più vuoto di tre presi a caso.
+    """
+    rng = random.Random(seme)
+    misure_l = misure.tolist()
+    lunghezza = [int(lunghezze[b]) for b, _ in piani]
+    # Un indice di misura per ogni taglio: si pesca in O(1) e si toglie scambiandolo con l'ultimo
+    tagli = [[j for j, n in enumerate(pattern.tolist()) for _ in range(n)] for _, pattern in piani]
+    riempito = [sum(misure_l[j] for j in t) for t in tagli]
+    
+    # Pesi interi per l'ordine lessicografico, ognuno oltre la variazione massima
+    # di quelli che seguono (una mossa cambia due spezzoni)
+    massima = max(lunghezza, default=0)
+    peso_quadrato = 2 * soglia + 1
+    peso_spezzone = peso_quadrato * (2 * massima * massima + 1)
+    
+    def costo(riempimento: int, capacita: int) -> int:
+        if not riempimento:
+            return 0
+        avanzo = capacita - riempimento
+        return peso_spezzone - peso_quadrato * avanzo * avanzo + (avanzo if avanzo <= soglia else 0)
+    
+    usati = list(range(len(piani)))  # spezzoni non ancora svuotati
+    posizione = list(range(len(piani)))
+    in_uso = [True] * len(piani)
+    # (avanzo, spezzone) degli spezzoni usati, in ordine: il best fit è una bisezione
+    per_avanzo = sorted((lunghezza[k] - riempito[k], k) for k in usati)
+    # (riempimento, spezzone) da provare a svuotare: all'inizio tutti, poi solo quelli
+    # toccati da una mossa (le voci superate si scartano quando escono)
+    da_svuotare = [(riempito[k], k) for k in usati]
+    heapq.heapify(da_svuotare)
+    libero = sum(lunghezza) - sum(riempito)  # avanzo totale degli spezzoni usati
+    
+    def riempi(k: int, nuovo: int):
+        # Nuovo riempimento di k: si sposta in per_avanzo e torna tra quelli da svuotare
+        del per_avanzo[bisect_left(per_avanzo, (lunghezza[k] - riempito[k], k))]
+        riempito[k] = nuovo
+        insort(per_avanzo, (lunghezza[k] - nuovo, k))
+        heapq.heappush(da_svuotare, (nuovo, k))
+    
+    def libera(a: int):
+        # Spezzone svuotato: esce dalla lista con uno scambio con l'ultimo
+        nonlocal libero
+        del per_avanzo[bisect_left(per_avanzo, (lunghezza[a] - riempito[a], a))]
+        riempito[a] = 0
+        libero -= lunghezza[a]
+        in_uso[a] = False
+        ultimo = usati.pop()
+        if ultimo != a:
+            usati[posizione[a]] = ultimo
+            posizione[ultimo] = posizione[a]
+    
+    def togli(k: int, indici: List[int]) -> List[int]:
+        # Toglie da k i tagli in quelle posizioni (dalla più alta) e restituisce le misure
+        tolti = []
+        for i in sorted(indici, reverse=True):
+            tolti.append(tagli[k][i])
+            tagli[k][i] = tagli[k][-1]
+            tagli[k].pop()
+        return tolti
+    
+    def svuota() -> bool:
+        # Mossa composta: lo spezzone più vuoto tra quelli toccati dall'ultima volta dà tutti
+        # i suoi tagli agli altri (best fit); uno che non si svuota non si riprova finché
+        # una mossa non lo cambia
+        while da_svuotare:
+            pieno, a = heapq.heappop(da_svuotare)
+            if not in_uso[a] or pieno != riempito[a]:
+                continue
+            if libero - (lunghezza[a] - pieno) < pieno:
+                continue
+            proprio = (lunghezza[a] - pieno, a)
+            del per_avanzo[bisect_left(per_avanzo, proprio)]
+            fatte = []  # (voce tolta, voce messa) in per_avanzo, per tornare indietro
+            for j in sorted(tagli[a], key=lambda j: -misure_l[j]):
+                i = bisect_left(per_avanzo, (misure_l[j], -1))
+                if i == len(per_avanzo):
+                    break
+                avanzo, k = per_avanzo.pop(i)
+                insort(per_avanzo, (avanzo - misure_l[j], k))
+                fatte.append(((avanzo, k), (avanzo - misure_l[j], k), j))
+            else:
+                for _, (avanzo, k), j in fatte:
+                    tagli[k].append(j)
+                    riempito[k] = lunghezza[k] - avanzo
+                for k in {k for _, (_, k), _ in fatte}:
+                    heapq.heappush(da_svuotare, (riempito[k], k))
+                tagli[a].clear()
+                insort(per_avanzo, proprio)
+                libera(a)
+                return True
+            for tolta, messa, _ in reversed(fatte):
+                del per_avanzo[bisect_left(per_avanzo, messa)]
+                insort(per_avanzo, tolta)
+            insort(per_avanzo, proprio)
+        return False
+    
+    mosse = tentativi = 0
+    while len(usati) > 1 and not scadenza.scaduta():
+        if svuota():
+            mosse += 1
+            continue
+        for _ in range(256):
+            a = max((usati[rng.randrange(len(usati))] for _ in range(3)),
+                    key=lambda k: lunghezza[k] - riempito[k])
+            b = usati[rng.randrange(len(usati))]
+            if a == b:
+                continue
+            tentativi += 1
+            tipo = rng.randrange(4)
+            # Posizioni dei tagli che escono da a e da b
+            n_a, n_b = len(tagli[a]), len(tagli[b])
+            if not n_b and tipo:
+                continue
+            da_a = [rng.randrange(n_a)]
+            da_b = [] if tipo == 0 else [rng.randrange(n_b)]
+            if tipo == 2 or tipo == 3:
+                altri, n = (da_a, n_a) if tipo == 2 else (da_b, n_b)
+                if n < 2:
+                    continue
+                i = rng.randrange(n - 1)
+                altri.append(i + (i >= altri[0]))
+            if tipo == 1 and tagli[a][da_a[0]] == tagli[b][da_b[0]]:
+                continue
+            passa = sum(misure_l[tagli[a][i]] for i in da_a) - sum(misure_l[tagli[b][i]] for i in da_b)
+            nuovo_a, nuovo_b = riempito[a] - passa, riempito[b] + passa
+            if nuovo_b > lunghezza[b] or nuovo_a > lunghezza[a]:
+                continue
+            delta = (costo(nuovo_a, lunghezza[a]) + costo(nuovo_b, lunghezza[b])
+                     - costo(riempito[a], lunghezza[a]) - costo(riempito[b], lunghezza[b]))
+            if delta > 0:
+                continue
+            
+            mosse += 1
+            verso_b, verso_a = togli(a, da_a), togli(b, da_b)
+            tagli[a] += verso_a
+            tagli[b] += verso_b
+            riempi(b, nuovo_b)
+            if nuovo_a:
+                riempi(a, nuovo_a)
+            else:
+                libera(a)
+                if len(usati) < 2:
+                    break
+        if scadenza.avanzamento is not None:
+            scadenza.avanzamento.aggiorna(
+                scadenza.frazione(), f"Ricerca locale: {len(piani) - len(usati)} spezzoni liberati")
+    
+    if contatori is not None:
+        contatori["mosse_provate"] = contatori.get("mosse_provate", 0) + tentativi
+        contatori["mosse_fatte"] = contatori.get("mosse_fatte", 0) + mosse
+        contatori["spezzoni_liberati"] = contatori.get("spezzoni_liberati", 0) + len(piani) - len(usati)
+    
+    nuovi: List[_Piano] = []
+    for k in sorted(usati):
+        nuovi.append((piani[k][0], np.bincount(np.array(tagli[k], dtype=np.int64), minlength=len(misure))))
+    return nuovi
+
+
+class OttimizzatoreTagli:
+    """
+    Ottimizzatore del piano di taglio.
+    Lavora sulle misure distinte con la loro quantità (non sui singoli pezzi),
+    così il costo dipende dal numero di misure diverse e non dal numero di tagli.
+    Le lunghezze sono convertite in interi (multipli di `risoluzione` metri, 1 mm
+    di default) prima del calcolo.
+
+    Metodi disponibili:
+      - "ffd": riempie uno spezzone alla volta, dal più lungo, con i tagli più grandi che entrano
+      - "bfd": mette ogni taglio (dal più grande) nello spezzone aperto in cui avanza meno
+      - "colgen": generazione di colonne (Gilmore-Gomory) sul rilassamento lineare,
+        poi arrotondamento a un piano intero; riporta il limite inferiore dello scarto
+      - "portfolio": tante varianti (FFD, BFD, worst-fit, ordini perturbati) in parallelo
+        su più processi; tiene il piano migliore
+      - "mbs": minimum bin slack, riempie uno spezzone alla volta (dal più lungo) con la
+        combinazione di tagli rimasti che lascia meno scarto (subset-sum esatto)
+
+    Con `carenza` ("lunghezza" o "priorita"), se il materiale non basta il piano
+    massimizza i metri tagliati (pesati con la priorità delle misure, per "priorita")
+    invece di tagliare finché si può: zaino limitato spezzone per spezzone.
+    
+    Con `ricerca_locale` (secondi) il piano trovato passa per una ricerca locale che
+    prova a liberare spezzoni e a raccogliere lo scarto in avanzi riutilizzabili;
+    `migliora()` fa lo stesso su un piano qualsiasi già calcolato.
+    
+    Con `libreria` (LibreriaPattern) si riparte dai pattern ad alta resa degli ordini
+    precedenti con le stesse misure: colonne iniziali per "colgen", piano che li usa
+    prima dell'FFD/BFD per "ffd" e "bfd" e come partenza della ricerca locale (se è
+    migliore); i pattern buoni del piano finale vengono registrati.
+    """
+
+    METODI = ("ffd", "bfd", "colgen", "portfolio", "mbs")
+    CARENZE = ("lunghezza", "priorita")
+
+    def __init__(self, soglia_scarto: float = 0.3, metodo: str = "ffd", tempo_limite: float = 10.0,
+                 risoluzione: float = RISOLUZIONE_PREDEFINITA, n_varianti: int = 32, seme: int = 0,
+                 processi: Optional[int] = None, profilo: Optional[str] = None, carenza: Optional[str] = None,
+                 ricerca_locale: float = 0.0, libreria: Optional[LibreriaPattern] = None):
+        if metodo not in self.METODI:
+            raise ValueError(f"Metodo sconosciuto: {metodo!r} (disponibili: {', '.join(self.METODI)})")
+        if carenza is not None and carenza not in self.CARENZE:
+            raise ValueError(f"Obiettivo di carenza sconosciuto: {carenza!r} (disponibili: {', '.join(self.CARENZE)})")
+        if risoluzione <= 0:
+            raise ValueError("La risoluzione deve essere positiva")
+        self.soglia_scarto = soglia_scarto
+        self.metodo = metodo
+        self.tempo_limite = tempo_limite  # secondi, per "colgen" e "portfolio"
+        self.risoluzione = risoluzione  # metri per unità intera
+        self.n_varianti = n_varianti  # per "portfolio"
+        self.seme = seme  # per "portfolio": stesso seme, stesse varianti
+        self.processi = processi  # per "portfolio": None = tutti i core
+        self.profilo = profilo  # file dove salvare il profilo cProfile (pstats) di ogni calcolo
+        self.carenza = carenza  # None = taglio parziale semplice quando il materiale non basta
+        self.ricerca_locale = ricerca_locale  # secondi di miglioramento dopo il calcolo (0 = niente)
+        self.libreria = libreria  # pattern degli ordini precedenti (None = si parte da zero)
+
+    def opzioni(self) -> Dict[str, object]:
+        """Opzioni che cambiano il piano calcolato (entrano nella chiave della cache)"""
+        opzioni = {"metodo": self.metodo, "risoluzione": self.risoluzione}
+        if self.metodo in ("colgen", "portfolio"):
+            opzioni["tempo_limite"] = self.tempo_limite
+        if self.metodo == "portfolio":
+            opzioni.update(n_varianti=self.n_varianti, seme=self.seme)
+        if self.carenza is not None:
+            opzioni["carenza"] = self.carenza
+        if self.ricerca_locale > 0:
+            opzioni["ricerca_locale"] = self.ricerca_locale
+        if self.libreria is not None:
+            # Il piano dipende anche da cosa c'è in libreria: i calcoli con e senza restano separati
+            opzioni["libreria"] = True
+        return opzioni
+
+    def controlla_materiale(self, spezzoni: List[Spezzone], richieste: List[TaglioRichiesto]) -> ControlloMateriale:
+        """Verifica immediata (senza cercare un piano) se il materiale non può bastare"""
+        return self._controlla(_Istanza(spezzoni, richieste, self.risoluzione))
+
+    @staticmethod
+    def _controlla(istanza: _Istanza) -> ControlloMateriale:
+        misure, quantita, lunghezze = istanza.misure, istanza.quantita, istanza.lunghezze
+        capacita = int(lunghezze[0]) if len(lunghezze) else 0
+        troppo_lunghe = misure > capacita
+        richiesti = int(misure @ quantita)
+        disponibili = int(lunghezze.sum())
+        minimi = _limite_l2(misure[~troppo_lunghe], quantita[~troppo_lunghe], capacita) if capacita else 0
+        
+        motivi = []
+        if troppo_lunghe.any():
+            motivi.append("misure più lunghe di ogni spezzone")
+        if richiesti > disponibili:
+            motivi.append(f"servono {istanza.in_metri(richiesti)} m, ci sono {istanza.in_metri(disponibili)} m")
+        if minimi > len(lunghezze):
+            motivi.append(f"servono almeno {minimi} spezzoni, ce ne sono {len(lunghezze)}")
+        return ControlloMateriale(
+            carenza=bool(motivi),
+            metri_richiesti=istanza.in_metri(richiesti),
+            metri_disponibili=istanza.in_metri(disponibili),
+            spezzoni_minimi=minimi,
+            spezzoni_disponibili=len(lunghezze),
+            misure_troppo_lunghe=[istanza.etichette[u] for u in misure[troppo_lunghe].tolist()],
+            motivo="; ".join(motivi),
+        )
+
+    def calcola_ottimale(self, spezzoni: List[Spezzone], richieste: List[TaglioRichiesto],
+                         avanzamento: Optional[Avanzamento] = None) -> RisultatoCalcolo:
+        """
+        Calcola il piano di taglio.
+        Se non basta il materiale, fa quello che può e indica cosa manca.
+        Il risultato porta le statistiche del calcolo (fasi e contatori).
+        Con `avanzamento` ("colgen", "portfolio" e "mbs"): riporta a che punto è, pubblica
+        i piani man mano che migliorano e si ferma prima se viene annullato.
+        Con più materiali ogni materiale si taglia solo dai suoi spezzoni, uno dopo
+        l'altro in questo processo (come calcola_per_materiale con processi=1).
+        """
+        from .materiali import materiali_di, calcola_per_materiale  # materiali importa questo modulo
+        if len(materiali_di(spezzoni, richieste)) > 1:
+            return calcola_per_materiale(self, spezzoni, richieste, 1, avanzamento)
+        risultato = self._misura(self._calcola, spezzoni, richieste, avanzamento)
+        if avanzamento is not None:
+            avanzamento.pubblica(risultato)
+            avanzamento.aggiorna(1.0, "Calcolo annullato" if avanzamento.annullato else "Calcolo completato")
+        return risultato
+
+    def _calcola(self, statistiche: StatisticheCalcolo, spezzoni: List[Spezzone],
+                 richieste: List[TaglioRichiesto], avanzamento: Optional[Avanzamento] = None) -> RisultatoCalcolo:
+        # Ordinamento e raggruppamento per misura (i pezzi non vengono mai espansi uno a uno)
+        with statistiche.fase("preparazione"):
+            istanza = _Istanza(spezzoni, richieste, self.risoluzione)
+        
+        # Carenza certa: si passa subito al piano che massimizza il valore tagliato
+        controllo = None
+        if self.carenza is not None:
+            with statistiche.fase("controllo"):
+                controllo = self._controlla(istanza)
+        
+        noti = None
+        if self.libreria is not None and len(istanza.lunghezze) and len(istanza.misure):
+            with statistiche.fase("libreria"):
+                noti = self._pattern_noti(istanza)
+                statistiche.conta("pattern_libreria", sum(len(v) for v in noti.values()))
+        
+        limite = None
+        with statistiche.fase("impacchettamento"):
+            if controllo is not None and controllo.carenza:
+                statistiche.conta("carenze_rilevate")
+                piani, residuo = self._impacca_carenza(istanza, statistiche, avanzamento)
+            elif self.metodo == "colgen":
+                piani, residuo, limite = self._impacca_colgen(istanza, statistiche, avanzamento, noti)
+            elif self.metodo == "portfolio":
+                piani, residuo = self._impacca_portfolio(istanza, statistiche, avanzamento)
+            elif self.metodo == "mbs":
+                piani, residuo = self._impacca_mbs(istanza, statistiche, avanzamento)
+            elif self.metodo == "bfd":
+                piani, residuo = self._impacca_bfd(istanza.lunghezze, istanza.misure, istanza.quantita,
+                                                   statistiche.contatori)
+            else:
+                piani, residuo = self._impacca_ffd(istanza.lunghezze, istanza.misure, istanza.quantita,
+                                                   statistiche.contatori)
+            if noti and (self.metodo in ("ffd", "bfd") or self.ricerca_locale > 0) and not (
+                    controllo is not None and controllo.carenza):
+                piani, residuo = self._impacca_libreria(istanza, noti, piani, residuo, statistiche)
+            if controllo is not None and not controllo.carenza and residuo.any():
+                # Il controllo non l'aveva vista, ma l'incastro non è riuscito a fare tutto
+                piani, residuo = self._impacca_carenza(istanza, statistiche, avanzamento, [(piani, residuo)])
+        
+        if self.ricerca_locale > 0 and len(piani) > 1:
+            with statistiche.fase("ricerca_locale"):
+                piani = _ricerca_locale(istanza.lunghezze, istanza.misure, piani,
+                                        istanza.in_unita(self.soglia_scarto),
+                                        _Scadenza(self.ricerca_locale, avanzamento), self.seme,
+                                        statistiche.contatori)
+        
+        if self.libreria is not None and piani:
+            with statistiche.fase("libreria"):
+                misure = istanza.misure.tolist()
+                statistiche.conta("pattern_registrati", self.libreria.registra(
+                    self.risoluzione,
+                    ((int(istanza.lunghezze[b]), {misure[j]: int(pattern[j]) for j in np.flatnonzero(pattern)})
+                     for b, pattern in piani),
+                    istanza.in_unita(self.soglia_scarto)))
+        
+        with statistiche.fase("composizione"):
+            return self._componi_risultato(istanza, piani, residuo, limite)
+
+    def _pattern_noti(self, istanza: _Istanza) -> Dict[int, List[np.ndarray]]:
+        """Pattern della libreria per le lunghezze degli spezzoni, come vettori sulle misure dell'istanza"""
+        posizione = {u: j for j, u in enumerate(istanza.misure.tolist())}
+        noti: Dict[int, List[np.ndarray]] = {}
+        for lunghezza, elenco in self.libreria.cerca(self.risoluzione, np.unique(istanza.lunghezze).tolist(),
+                                                     posizione).items():
+            for pezzi in elenco:
+                pattern = np.zeros(len(posizione), dtype=np.int64)
+                for misura, n in pezzi.items():
+                    pattern[posizione[misura]] = n
+                noti.setdefault(lunghezza, []).append(pattern)
+        return noti
+
+    def migliora(self, risultato: RisultatoCalcolo, secondi: Optional[float] = None,
+                 avanzamento: Optional[Avanzamento] = None) -> RisultatoCalcolo:
+        """
+        Ricerca locale su un piano già calcolato (con qualsiasi metodo, anche dalla
+        cache): stessi tagli sugli stessi spezzoni, per al massimo `secondi`
+        (predefinito: `ricerca_locale`, o 1 secondo). Il piano di partenza non cambia.
+        Con più materiali ognuno ha la sua parte del tempo e resta sui suoi spezzoni.
+        """
+        secondi = secondi if secondi is not None else (self.ricerca_locale or 1.0)
+        if risultato.materiali is not None:
+            from .materiali import unisci_per_materiale  # materiali importa questo modulo
+            migliorato = unisci_per_materiale({
+                materiale: self._misura(self._migliora, parte, secondi / len(risultato.materiali), avanzamento)
+                for materiale, parte in risultato.materiali.items()})
+        else:
+            migliorato = self._misura(self._migliora, risultato, secondi, avanzamento)
+        if avanzamento is not None:
+            avanzamento.pubblica(migliorato)
+            avanzamento.aggiorna(1.0, "Miglioramento completato")
+        return migliorato
+
+    def _migliora(self, statistiche: StatisticheCalcolo, risultato: RisultatoCalcolo, secondi: float,
+                  avanzamento: Optional[Avanzamento] = None) -> RisultatoCalcolo:
+        with statistiche.fase("preparazione"):
+            compatti = PianiCompatti.da_piani(risultato.piani)
+            spezzoni = [Spezzone(lunghezza, i) for lunghezza, i in
+                        zip(compatti.lunghezze[compatti.schema_di].tolist(), compatti.spezzone_ids.tolist())]
+            domanda = dict(risultato.tagli_fatti)
+            for misura, n in risultato.tagli_mancanti.items():
+                domanda[misura] = domanda.get(misura, 0) + n
+            istanza = _Istanza(spezzoni, [TaglioRichiesto(m, n) for m, n in domanda.items()], self.risoluzione)
+            istanza.spezzoni_totali = risultato.spezzoni_totali
+            
+            # Colonne degli schemi -> misure dell'istanza; spezzoni del piano -> indici dell'istanza
+            posizione = {u: j for j, u in enumerate(istanza.misure.tolist())}
+            colonne = [posizione[max(1, istanza.in_unita(m))] for m in compatti.misure.tolist()]
+            matrice = np.zeros((len(spezzoni), len(istanza.misure)), dtype=np.int64)
+            np.add.at(matrice.T, colonne, compatti.schemi[compatti.schema_di].T)
+            indice = {id(s): b for b, s in enumerate(istanza.spezzoni)}
+            piani = [(indice[id(s)], matrice[k]) for k, s in enumerate(spezzoni)]
+            residuo = istanza.quantita - matrice.sum(axis=0)
+        
+        with statistiche.fase("ricerca_locale"):
+            piani = _ricerca_locale(istanza.lunghezze, istanza.misure, piani, istanza.in_unita(self.soglia_scarto),
+                                    _Scadenza(secondi, avanzamento), self.seme, statistiche.contatori)
+        
+        with statistiche.fase("composizione"):
+            migliorato = self._componi_risultato(istanza, piani, residuo)
+            migliorato.limite_inferiore = risultato.limite_inferiore
+            return migliorato
+
+    def pianifica_acquisti(self, spezzoni: List[Spezzone], richieste: List[TaglioRichiesto],
+                           catalogo: List[BarraCommerciale], avanzamento: Optional[Avanzamento] = None
+                           ) -> PianoAcquisto:
+        """
+        Cosa comprare quando gli spezzoni non bastano: si usano prima gli spezzoni
+        che ci sono (non costano nulla), poi le barre del `catalogo` (lunghezze
+        commerciali senza limite di quantità, ognuna col suo costo), spendendo il
+        meno possibile. Spezzoni e barre entrano insieme nella stessa generazione di
+        colonne (entro `tempo_limite`); il piano completo ha le barre comprate con
+        ID dopo quelli degli spezzoni. Le misure più lunghe di ogni barra restano mancanti.
+        """
+        if not catalogo:
+            raise ValueError("Catalogo delle barre vuoto")
+        from .materiali import materiali_di  # materiali importa questo modulo
+        if len(materiali_di(spezzoni, richieste)) > 1:
+            raise ValueError("Il catalogo non distingue i materiali: acquisti da pianificare un materiale alla volta")
+        if any(barra.costo < 0 or barra.lunghezza <= 0 for barra in catalogo):
+            raise ValueError("Le barre del catalogo devono avere lunghezza positiva e costo non negativo")
+        dettagli: Dict[str, object] = {}
+        risultato = self._misura(self._acquista, spezzoni, richieste, catalogo, avanzamento, dettagli)
+        if avanzamento is not None:
+            avanzamento.pubblica(risultato)
+            avanzamento.aggiorna(1.0, "Calcolo annullato" if avanzamento.annullato else "Calcolo completato")
+        
+        # Le barre comprate sono gli spezzoni del piano con gli ID nuovi
+        piani = risultato.piani
+        comprate = piani.spezzone_ids >= dettagli["primo_id"]
+        lunghezze, quante = np.unique(piani.lunghezze[piani.schema_di][comprate], return_counts=True)
+        acquisti = {float(l): int(n) for l, n in sorted(zip(lunghezze.tolist(), quante.tolist()), reverse=True)}
+        costo_di = dettagli["costo_di"]
+        limite = dettagli.get("limite")
+        return PianoAcquisto(
+            acquisti=acquisti,
+            costo_totale=round(float(sum(costo_di[l] * n for l, n in acquisti.items())), 6),
+            risultato=risultato,
+            costo_minimo=round(limite, 6) if limite is not None and risultato.completato else None,
+        )
+
+    def _acquista(self, statistiche: StatisticheCalcolo, spezzoni: List[Spezzone], richieste: List[TaglioRichiesto],
+                  catalogo: List[BarraCommerciale], avanzamento: Optional[Avanzamento],
+                  dettagli: Dict[str, object]) -> RisultatoCalcolo:
+        with statistiche.fase("preparazione"):
+            istanza = _Istanza(spezzoni, richieste, self.risoluzione)
+            # Una barra per lunghezza intera: la più economica
+            barre: Dict[int, BarraCommerciale] = {}
+            for barra in catalogo:
+                unita = istanza.in_unita(barra.lunghezza)
+                if unita > 0 and (unita not in barre or barra.costo < barre[unita].costo):
+                    barre[unita] = barra
+            dettagli["costo_di"] = {barra.lunghezza: barra.costo for barra in barre.values()}
+        
+        with statistiche.fase("impacchettamento"):
+            piani, comprate, residuo, limite = self._impacca_acquisti(
+                istanza, {unita: barra.costo for unita, barra in barre.items()}, statistiche, avanzamento)
+            dettagli["limite"] = limite
+        
+        with statistiche.fase("composizione"):
+            # Piano su spezzoni e barre comprate insieme: stesse misure, spezzoni ritrovati per identità
+            primo = max((s.id for s in spezzoni), default=0) + 1
+            dettagli["primo_id"] = primo
+            nuove = [Spezzone(barre[unita].lunghezza, primo + k) for k, (unita, _) in enumerate(comprate)]
+            completa = _Istanza(list(spezzoni) + nuove, richieste, self.risoluzione)
+            indice = {id(s): b for b, s in enumerate(completa.spezzoni)}
+            piani = ([(indice[id(istanza.spezzoni[b])], pattern) for b, pattern in piani]
+                     + [(indice[id(s)], pattern) for s, (_, pattern) in zip(nuove, comprate)])
+            return self._componi_risultato(completa, piani, residuo)
+
+    def _misura(self, calcolo, *argomenti) -> RisultatoCalcolo:
+        """Esegue un calcolo raccogliendo le statistiche (e il profilo cProfile, se richiesto)"""
+        statistiche = StatisticheCalcolo(self.metodo)
+        if self.profilo:
+            profilatore = cProfile.Profile()
+            profilatore.enable()
+            try:
+                risultato = calcolo(statistiche, *argomenti)
+            finally:
+                profilatore.disable()
+                profilatore.dump_stats(self.profilo)
+            statistiche.profilo = self.profilo
+        else:
+            risultato = calcolo(statistiche, *argomenti)
+        risultato.statistiche = statistiche
+        if _log.isEnabledFor(logging.INFO):
+            _log.info(json.dumps({"evento": "calcolo", "piani": len(risultato.piani), **statistiche.in_dict()}))
+        return risultato
+
+    def ripianifica(self, precedente: RisultatoCalcolo, spezzoni: List[Spezzone],
+                    variazione: Variazione) -> RisultatoCalcolo:
+        """
+        Aggiorna un piano già calcolato dopo piccole modifiche, senza rifarlo da capo.
+        `spezzoni` è il magazzino attuale (già con la variazione): i piani precedenti
+        vengono riassegnati agli spezzoni attuali della stessa lunghezza, perché gli ID
+        possono essere stati rinumerati. Poi si ripara solo dove serve:
+          - i piani rimasti senza spezzone (tolto dal magazzino) liberano i loro tagli
+          - i tagli tolti escono dagli spezzoni più vuoti, che a volte si liberano del tutto
+          - i tagli da fare vanno prima negli scarti esistenti (best fit), poi negli
+            spezzoni liberi (FFD)
+        Con più materiali (nel piano, negli spezzoni o nella modifica) ogni materiale
+        si aggiorna per conto suo, sui suoi spezzoni, e il piano torna unico come
+        quello di calcola_per_materiale.
+        """
+        prima = self._materiali_precedenti(precedente, spezzoni, variazione)
+        materiali = set(prima) | {s.materiale for s in spezzoni} | variazione.materiali()
+        if precedente.materiali is None and len(materiali) <= 1:
+            return self._misura(self._ripianifica, precedente, spezzoni, variazione)
+        
+        from .materiali import unisci_per_materiale  # materiali importa questo modulo
+        vuoto = RisultatoCalcolo(PianiCompatti.da_piani([]), 0.0, True, {}, {}, 0, 0)
+        risultati = {}
+        for materiale in sorted(materiali):
+            parte = self._misura(self._ripianifica, prima.get(materiale, vuoto),
+                                 [s for s in spezzoni if s.materiale == materiale], variazione.del_materiale(materiale))
+            # Un materiale sparito del tutto (niente spezzoni, niente tagli) non resta nel piano
+            if parte.spezzoni_totali or parte.tagli_fatti or parte.tagli_mancanti:
+                risultati[materiale] = parte
+        return unisci_per_materiale(risultati or {"": vuoto})
+
+    @staticmethod
+    def _materiali_precedenti(precedente: RisultatoCalcolo, spezzoni: List[Spezzone],
+                              variazione: Variazione) -> Dict[str, RisultatoCalcolo]:
+        """
+        Il piano precedente per materiale. Se era di un materiale solo non lo dice:
+        è quello degli spezzoni di prima (gli attuali senza gli aggiunti, più i tolti).
+        """
+        if precedente.materiali is not None:
+            return dict(precedente.materiali)
+        aggiunti: Dict[tuple, int] = {}
+        for s in variazione.spezzoni_aggiunti:
+            aggiunti[(s.lunghezza, s.materiale)] = aggiunti.get((s.lunghezza, s.materiale), 0) + 1
+        materiali = {s.materiale for s in variazione.spezzoni_rimossi}
+        for s in spezzoni:
+            if aggiunti.get((s.lunghezza, s.materiale)):
+                aggiunti[(s.lunghezza, s.materiale)] -= 1
+            else:
+                materiali.add(s.materiale)
+        if len(materiali) > 1:
+            raise ValueError("Il piano precedente è di un solo materiale, gli spezzoni di prima di più: "
+                             "serve un calcolo nuovo")
+        return {materiali.pop() if materiali else "": precedente}
+
+    def _ripianifica(self, statistiche: StatisticheCalcolo, precedente: RisultatoCalcolo,
+                     spezzoni: List[Spezzone], variazione: Variazione) -> RisultatoCalcolo:
+        # Nuova domanda: quella di prima più la variazione
+        domanda: Dict[float, int] = {}
+        for misura, n in list(precedente.tagli_fatti.items()) + list(precedente.tagli_mancanti.items()):
+            domanda[misura] = domanda.get(misura, 0) + n
+        for richiesta in variazione.tagli_aggiunti:
+            domanda[richiesta.lunghezza] = domanda.get(richiesta.lunghezza, 0) + richiesta.quantita
+        for richiesta in variazione.tagli_rimossi:
+            domanda[richiesta.lunghezza] = domanda.get(richiesta.lunghezza, 0) - richiesta.quantita
+        with statistiche.fase("preparazione"):
+            istanza = _Istanza(spezzoni, [TaglioRichiesto(m, n) for m, n in domanda.items() if n > 0],
+                               self.risoluzione)
+        with statistiche.fase("riparazione"):
+            misure = istanza.misure
+            posizione = {u: j for j, u in enumerate(misure.tolist())}
+        
+            # Spezzoni attuali per lunghezza intera (ognuno riusabile una volta sola)
+            per_lunghezza: Dict[int, List[int]] = {}
+            for b in range(len(istanza.lunghezze) - 1, -1, -1):
+                per_lunghezza.setdefault(int(istanza.lunghezze[b]), []).append(b)
+        
+            # Piani precedenti: i migliori (meno scarto) tengono lo spezzone per primi
+            indice_taglio = {m: posizione.get(max(1, istanza.in_unita(m))) for m in domanda}
+            piani: List[_Piano] = []
+            for piano in sorted(precedente.piani, key=lambda p: p.scarto):
+                liberi = per_lunghezza.get(istanza.in_unita(piano.spezzone_lunghezza))
+                if not liberi:
+                    continue
+                pattern = np.zeros(len(misure), dtype=np.int64)
+                for taglio in piano.tagli:
+                    j = indice_taglio.get(taglio)
+                    if j is not None:
+                        pattern[j] += 1
+                piani.append((liberi.pop(), pattern))
+        
+            def conta_fatti() -> np.ndarray:
+                if not piani:
+                    return np.zeros(len(misure), dtype=np.int64)
+                return np.array([p for _, p in piani]).sum(axis=0)
+        
+            # Tagli in eccesso rispetto alla nuova domanda: si tolgono dai piani più vuoti
+            fatti = conta_fatti()
+            eccesso = np.maximum(fatti - istanza.quantita, 0)
+            if eccesso.any():
+                piani.sort(key=lambda p: int(p[1] @ misure))
+                for _, pattern in piani:
+                    togli = np.minimum(pattern, eccesso)
+                    pattern -= togli
+                    eccesso -= togli
+                    if not eccesso.any():
+                        break
+                piani = [p for p in piani if p[1].any()]
+                fatti = conta_fatti()
+            da_fare = istanza.quantita - fatti
+        
+            # Prima negli scarti dei piani esistenti (best fit sui residui ordinati)...
+            if da_fare.any() and piani:
+                residui = sorted((int(istanza.lunghezze[b] - p @ misure), k) for k, (b, p) in enumerate(piani))
+                for i in np.flatnonzero(da_fare).tolist():
+                    misura = int(misure[i])
+                    while da_fare[i]:
+                        k = bisect_left(residui, (misura, -1))
+                        if k == len(residui):
+                            break
+                        residuo, indice = residui.pop(k)
+                        n = min(int(da_fare[i]), residuo // misura)
+                        piani[indice][1][i] += n
+                        da_fare[i] -= n
+                        insort(residui, (residuo - n * misura, indice))
+        
+            # ...poi negli spezzoni rimasti liberi
+            if da_fare.any():
+                liberi = np.array(sorted(b for v in per_lunghezza.values() for b in v), dtype=np.int64)
+                piani_nuovi, da_fare = self._impacca_ffd(istanza.lunghezze[liberi], misure, da_fare)
+                piani += [(int(liberi[b]), pattern) for b, pattern in piani_nuovi]
+        
+        with statistiche.fase("composizione"):
+            return self._componi_risultato(istanza, piani, da_fare)
+
+    @staticmethod
+    def _impacca_ffd(lunghezze: np.ndarray, misure: np.ndarray, quantita: np.ndarray,
+                     contatori: Optional[Dict[str, int]] = None) -> Tuple[List[_Piano], np.ndarray]:
+        """
+        Riempie gli spezzoni uno alla volta con i tagli più grandi che ci stanno.
+        Indice ordinato (crescente) delle misure ancora da tagliare: con una ricerca
+        binaria si salta subito alla misura più grande che entra nel residuo.
+        In `contatori` aggiunge le ricerche d'incastro e gli spezzoni provati.
+        """
+        chiavi = misure[::-1].tolist()
+        conteggi = quantita[::-1].tolist()
+        indici = list(range(len(misure) - 1, -1, -1))
+        rimanenti = sum(conteggi)
+        piani = []
+        tentativi = provati = 0
+        
+        for b, lunghezza in enumerate(lunghezze.tolist()):
+            if not rimanenti:
+                break
+            provati += 1
+            residuo = lunghezza
+            pattern = None
+            limite = len(chiavi)
+            
+            while True:
+                tentativi += 1
+                j = bisect_right(chiavi, residuo, 0, limite) - 1
+                if j < 0:
+                    break
+                n = min(conteggi[j], residuo // chiavi[j])
+                if pattern is None:
+                    pattern = np.zeros(len(misure), dtype=np.int64)
+                pattern[indici[j]] = n
+                residuo -= n * chiavi[j]
+                rimanenti -= n
+                conteggi[j] -= n
+                if not conteggi[j]:
+                    del chiavi[j], conteggi[j], indici[j]
+                # Le misure da j in su non entrano più nel residuo
+                limite = j
+            
+            if pattern is not None:
+                piani.append((b, pattern))
+        
+        if contatori is not None:
+            contatori["tentativi_incastro"] = contatori.get("tentativi_incastro", 0) + tentativi
+            contatori["spezzoni_provati"] = contatori.get("spezzoni_provati", 0) + provati
+        residuo_domanda = np.zeros(len(misure), dtype=np.int64)
+        residuo_domanda[indici] = conteggi
+        return piani, residuo_domanda
+
+    @staticmethod
+    def _impacca_bfd(lunghezze: np.ndarray, misure: np.ndarray, quantita: np.ndarray,
+                     contatori: Optional[Dict[str, int]] = None) -> Tuple[List[_Piano], np.ndarray]:
+        """
+        Best-fit decreasing: ogni taglio va nello spezzone già aperto con il residuo
+        più piccolo che lo contiene; se nessuno lo contiene si apre il prossimo spezzone.
+        I residui degli spezzoni aperti stanno in una lista ordinata (ricerca binaria).
+        In `contatori` aggiunge le ricerche d'incastro e gli spezzoni aperti.
+        """
+        aperti: List[Tuple[int, int]] = []  # (residuo, indice in piani)
+        piani: List[_Piano] = []
+        lunghezze_l = lunghezze.tolist()
+        prossimo = 0
+        residuo_domanda = quantita.copy()
+        tentativi = 0
+        
+        for i, misura in enumerate(misure.tolist()):
+            qta = int(quantita[i])
+            while qta:
+                tentativi += 1
+                k = bisect_left(aperti, (misura, -1))
+                if k < len(aperti):
+                    residuo, indice = aperti.pop(k)
+                elif prossimo < len(lunghezze_l) and lunghezze_l[prossimo] >= misura:
+                    residuo, indice = lunghezze_l[prossimo], len(piani)
+                    piani.append((prossimo, np.zeros(len(misure), dtype=np.int64)))
+                    prossimo += 1
+                else:
+                    # Nessuno spezzone può più contenere questa misura
+                    break
+                
+                # Con la stessa misura il residuo resta il migliore finché ci sta
+                n = min(qta, residuo // misura)
+                piani[indice][1][i] += n
+                qta -= n
+                insort(aperti, (residuo - n * misura, indice))
+            residuo_domanda[i] = qta
+        
+        if contatori is not None:
+            contatori["tentativi_incastro"] = contatori.get("tentativi_incastro", 0) + tentativi
+            contatori["spezzoni_provati"] = contatori.get("spezzoni_provati", 0) + prossimo
+        return piani, residuo_domanda
+
+    def _impacca_mbs(self, istanza: _Istanza, statistiche: Optional[StatisticheCalcolo] = None,
+                     avanzamento: Optional[Avanzamento] = None) -> Tuple[List[_Piano], np.ndarray]:
+        """
+        Minimum bin slack: ogni spezzone, dal più lungo, riceve la combinazione dei tagli
+        ancora da fare che lo riempie di più (`_miglior_riempimento`). I pezzi rimasti
+        sono un sottoinsieme di quelli di prima, quindi finché bastano lo stesso
+        riempimento resta il migliore e si ripete sugli spezzoni uguali senza ricalcolarlo.
+        Quando tutto quello che resta entra in uno spezzone, si usa il più corto che basta.
+        Se viene annullato, finisce con l'FFD; se l'FFD da solo è migliore, vince lui.
+        """
+        lunghezze, misure = istanza.lunghezze, istanza.misure
+        misure_l = misure.tolist()
+        residuo = istanza.quantita.copy()
+        piani: List[_Piano] = []
+        n_spezzoni = len(lunghezze)
+        decrescenti = -lunghezze  # crescente: per searchsorted
+        b = riempimenti = 0
+        
+        while b < n_spezzoni and residuo.any():
+            if avanzamento is not None:
+                if avanzamento.annullato:
+                    resto, residuo = self._impacca_ffd(lunghezze[b:], misure, residuo)
+                    piani += [(b + k, pattern) for k, pattern in resto]
+                    break
+                avanzamento.aggiorna(b / n_spezzoni, f"Riempimento ottimo: {b}/{n_spezzoni} spezzoni")
+            capacita = int(lunghezze[b])
+            totale = int(misure @ residuo)
+            if totale <= capacita:
+                # Lunghezze decrescenti: l'ultimo spezzone libero che contiene tutto è il più corto
+                ultimo = b + int(np.count_nonzero(lunghezze[b:] >= totale)) - 1
+                piani.append((ultimo, residuo.copy()))
+                residuo[:] = 0
+                break
+            
+            # Il taglio più lungo rimasto va comunque in questo spezzone (MBS'): così i
+            # pezzi difficili non restano tutti per la fine
+            primo = int(np.flatnonzero(residuo)[0])
+            if misure_l[primo] > capacita:
+                break  # non entra nemmeno nello spezzone più lungo rimasto
+            residuo[primo] -= 1
+            _, pezzi = _miglior_riempimento(misure_l, residuo.tolist(), capacita - misure_l[primo])
+            residuo[primo] += 1
+            riempimenti += 1
+            pattern = np.array(pezzi, dtype=np.int64)
+            pattern[primo] += 1
+            usati = np.flatnonzero(pattern)
+            uguali = int(np.searchsorted(decrescenti, -capacita, side="right")) - b
+            ripetizioni = min(uguali, int((residuo[usati] // pattern[usati]).min()))
+            piani += [(b + k, pattern.copy()) for k in range(ripetizioni)]
+            residuo -= ripetizioni * pattern
+            b += ripetizioni
+        
+        if statistiche is not None:
+            statistiche.conta("riempimenti_calcolati", riempimenti)
+            statistiche.conta("spezzoni_provati", b)
+        
+        # Rete di sicurezza, costa poco: se l'FFD fa meglio (più metri tagliati, poi
+        # meno spezzoni, poi meno metri di spezzone usati) si tiene quello
+        def valuta(candidato: Tuple[List[_Piano], np.ndarray]) -> Tuple[int, int, int]:
+            piani_c, residuo_c = candidato
+            return int(residuo_c @ misure), len(piani_c), int(sum(lunghezze[b] for b, _ in piani_c))
+        
+        return min([(piani, residuo), self._impacca_ffd(lunghezze, misure, istanza.quantita)], key=valuta)
+
+    def _impacca_colgen(self, istanza: _Istanza, statistiche: Optional[StatisticheCalcolo] = None,
+                        avanzamento: Optional[Avanzamento] = None,
+                        noti: Optional[Dict[int, List[np.ndarray]]] = None
+                        ) -> Tuple[List[_Piano], np.ndarray, Optional[float]]:
+        """
+        Generazione di colonne di Gilmore-Gomory sugli spezzoni raggruppati per lunghezza.
+        Il piano intero si ottiene "tuffandosi" nel rilassamento: si fissano le parti
+        intere dei pattern (o il pattern più usato, se sono tutti frazionari), si
+        risolve di nuovo il rilassamento sul residuo e così via; allo scadere del tempo
+        il resto va all'FFD. Se l'FFD puro fa meglio, vince lui.
+        Il limite restituito è lo scarto minimo teorico, in unità intere.
+        Con `avanzamento` si pubblica subito il piano FFD e poi, ogni tanto, il piano
+        parziale del tuffo completato con l'FFD, se è migliore.
+        I pattern `noti` (lunghezza -> pattern, dalla libreria) entrano tra le colonne iniziali.
+        """
+        statistiche = statistiche or StatisticheCalcolo(self.metodo)
+        scadenza = _Scadenza(self.tempo_limite, avanzamento)
+        misure, quantita = istanza.misure, istanza.quantita
+        piani_ffd, residuo_ffd = self._impacca_ffd(istanza.lunghezze, misure, quantita)
+        self._pubblica(avanzamento, istanza, piani_ffd, residuo_ffd)
+        if not len(istanza.lunghezze) or not len(misure):
+            return piani_ffd, residuo_ffd, None
+        
+        # Tipi di spezzone: lunghezza -> indici degli spezzoni (dal più lungo)
+        lunghezze, inizio_tipo = np.unique(-istanza.lunghezze, return_index=True)
+        lunghezze = -lunghezze
+        tipo_di = np.searchsorted(inizio_tipo, np.arange(len(istanza.lunghezze)), side="right") - 1
+        # Le misure più lunghe di ogni spezzone restano comunque mancanti
+        collocabili = np.flatnonzero(misure <= lunghezze[0])
+        if not len(collocabili):
+            return piani_ffd, residuo_ffd, None
+        
+        # Con più di _CLASSI_LUNGHEZZA lunghezze il master avrebbe una riga per ognuna:
+        # si raggruppano in classi di lunghezze consecutive, ognuna lunga quanto il suo
+        # spezzone più corto (i pattern entrano in tutti); il limite resta sui tipi veri
+        quanti = np.diff(np.append(inizio_tipo, len(istanza.lunghezze)))
+        tipi_veri = None
+        if len(lunghezze) > _CLASSI_LUNGHEZZA:
+            tipi_veri = (lunghezze, quanti)
+            primi = np.linspace(0, len(lunghezze), _CLASSI_LUNGHEZZA, endpoint=False).astype(np.int64)
+            lunghezze = lunghezze[np.append(primi[1:], len(lunghezze)) - 1]
+            inizio_tipo = inizio_tipo[primi]
+            tipo_di = np.searchsorted(inizio_tipo, np.arange(len(istanza.lunghezze)), side="right") - 1
+            quanti = np.diff(np.append(inizio_tipo, len(istanza.lunghezze)))
+        
+        pesi = misure[collocabili]
+        domanda = quantita[collocabili]
+        pattern_noti: List[Tuple[int, np.ndarray]] = []
+        visti = set()
+        
+        def aggiungi(tipo: int, pattern: np.ndarray):
+            chiave = (tipo, pattern.tobytes())
+            if pattern.any() and chiave not in visti:
+                visti.add(chiave)
+                pattern_noti.append((tipo, pattern))
+        
+        # Colonne iniziali: pattern omogenei e quelli del piano FFD. Gli omogenei solo sui
+        # _TIPI_OMOGENEI tipi con più spezzoni: con centinaia di lunghezze diverse sarebbero
+        # decine di migliaia di colonne, e al resto pensa la generazione
+        omogenei = np.minimum(domanda[None, :], lunghezze[:, None] // pesi[None, :])
+        for k in np.argsort(-quanti, kind="stable")[:_TIPI_OMOGENEI]:
+            for j in np.flatnonzero(omogenei[k]):
+                pattern = np.zeros(len(pesi), dtype=np.int64)
+                pattern[j] = omogenei[k, j]
+                aggiungi(k, pattern)
+        for b, pattern in piani_ffd:
+            # Con le classi lo spezzone può essere più lungo della sua classe
+            if pattern @ misure <= lunghezze[tipo_di[b]]:
+                aggiungi(int(tipo_di[b]), pattern[collocabili])
+        for k, lunghezza in enumerate(lunghezze.tolist()):
+            for pattern in (noti or {}).get(lunghezza, []):
+                aggiungi(k, pattern[collocabili])
+        
+        residuo = domanda.copy()
+        liberi = [list(range(fine - 1, inizio - 1, -1)) for inizio, fine in
+                  zip(inizio_tipo, np.append(inizio_tipo[1:], len(istanza.lunghezze)))]  # pop() dà il primo
+        scelti: List[_Piano] = []
+        limite_lp = None
+        
+        def prendi(tipo: int, pattern: np.ndarray) -> bool:
+            effettivo = np.minimum(pattern, residuo)
+            if not liberi[tipo] or not effettivo.any():
+                return False
+            residuo[:] -= effettivo
+            completo = np.zeros(len(misure), dtype=np.int64)
+            completo[collocabili] = effettivo
+            scelti.append((liberi[tipo].pop(), completo))
+            return True
+        
+        def valuta(p: List[_Piano]):
+            if not p:
+                return (0, 0, 0)
+            indici = np.array([b for b, _ in p])
+            riempimenti = np.array([pattern for _, pattern in p]) @ misure
+            return (-int(riempimenti.sum()), int((istanza.lunghezze[indici] - riempimenti).sum()), len(p))
+        
+        def completa() -> Tuple[List[_Piano], np.ndarray]:
+            # Quello che il tuffo non ha ancora fissato va all'FFD sugli spezzoni liberi
+            quantita_residue = quantita.copy()
+            quantita_residue[collocabili] = residuo
+            avanzati = np.array(sorted(b for v in liberi for b in v), dtype=np.int64)
+            piani_resto, residuo_finale = self._impacca_ffd(istanza.lunghezze[avanzati], misure, quantita_residue,
+                                                            statistiche.contatori)
+            return scelti + [(int(avanzati[b]), pattern) for b, pattern in piani_resto], residuo_finale
+        
+        migliore = (valuta(piani_ffd), piani_ffd, residuo_ffd)
+        pubblicato = time.perf_counter()
+        totale = max(1, int(domanda.sum()))
+        while residuo.any() and any(liberi):
+            statistiche.conta("nodi_esplorati")
+            if avanzamento is not None:
+                avanzamento.aggiorna(max(scadenza.frazione(), 1 - int(residuo.sum()) / totale),
+                                     f"Generazione di colonne: {statistiche.contatori['nodi_esplorati']} nodi, "
+                                     f"{len(pattern_noti)} pattern")
+                if time.perf_counter() - pubblicato >= _INTERVALLO_PUBBLICAZIONE:
+                    piani, residuo_finale = completa()
+                    if valuta(piani) < migliore[0]:
+                        migliore = (valuta(piani), piani, residuo_finale)
+                        self._pubblica(avanzamento, istanza, piani, residuo_finale)
+                    pubblicato = time.perf_counter()
+            disponibili = np.array([len(v) for v in liberi])
+            # Il limite serve solo sul rilassamento di partenza
+            x, lagrangiano = _genera_colonne(pesi, residuo, lunghezze, disponibili, pattern_noti, visti,
+                                             scadenza, statistiche,
+                                             tipi_limite=tipi_veri if limite_lp is None else None)
+            if limite_lp is None:
+                limite_lp = lagrangiano
+            if x is None:
+                break
+            
+            presi = 0
+            ordine = np.argsort(-x, kind="stable")
+            for j in ordine:
+                if x[j] < 1 - 1e-6:
+                    break
+                for _ in range(int(x[j] + 1e-6)):
+                    if not prendi(*pattern_noti[j]):
+                        break
+                    presi += 1
+            if not presi and not prendi(*pattern_noti[int(ordine[0])]):
+                break
+        
+        piani, residuo_finale = completa()
+        
+        # Scarto minimo teorico: lunghezza di spezzone del rilassamento meno quella richiesta
+        limite = None
+        if limite_lp is not None:
+            limite = max(0.0, limite_lp * int(istanza.lunghezze[0]) - float(pesi @ domanda))
+        
+        if migliore[0] < valuta(piani):
+            return migliore[1], migliore[2], limite
+        return piani, residuo_finale, limite
+
+    def _impacca_portfolio(self, istanza: _Istanza, statistiche: Optional[StatisticheCalcolo] = None,
+                           avanzamento: Optional[Avanzamento] = None) -> Tuple[List[_Piano], np.ndarray]:
+        """
+        Portafoglio: le tre regole in ordine decrescente puro più varianti con ordini
+        perturbati (seme, indice variante), in parallelo su un ProcessPoolExecutor
+        condiviso tra i calcoli (i processi si avviano una volta sola).
+        Si ferma appena una variante completa il taglio col numero minimo teorico di
+        spezzoni, o allo scadere di tempo_limite. Vince il piano che taglia più metri,
+        poi quello con meno spezzoni, poi con meno scarto; a pari merito la variante
+        con l'indice più basso, così con lo stesso seme il risultato si ripete.
+        Con `avanzamento` ogni nuovo piano migliore viene pubblicato appena arriva.
+        """
+        scadenza = _Scadenza(self.tempo_limite, avanzamento)
+        varianti = [(regola, None) for regola in REGOLE_VARIANTI]
+        varianti += [(REGOLE_VARIANTI[i % len(REGOLE_VARIANTI)], (self.seme, i))
+                     for i in range(len(varianti), self.n_varianti)]
+        argomenti = (istanza.lunghezze, istanza.misure, istanza.quantita)
+        obiettivo = _limite_spezzoni(istanza.lunghezze, int(istanza.misure @ istanza.quantita))
+        migliore = None
+        valutate = set()
+        
+        def valuta(indice: int, piani: List[_Piano], residuo: np.ndarray) -> bool:
+            """Tiene il piano migliore; True se ha raggiunto il limite inferiore"""
+            nonlocal migliore
+            valutate.add(indice)
+            tagliato = int((istanza.quantita - residuo) @ istanza.misure)
+            usato = int(sum(istanza.lunghezze[b] for b, _ in piani))
+            chiave = (-tagliato, len(piani), usato - tagliato, indice)
+            if migliore is None or chiave < migliore[0]:
+                migliore = (chiave, piani, residuo)
+                self._pubblica(avanzamento, istanza, piani, residuo)
+            if avanzamento is not None:
+                avanzamento.aggiorna(max(scadenza.frazione(), len(valutate) / len(varianti)),
+                                     f"Varianti valutate: {len(valutate)}/{len(varianti)}")
+            return not residuo.any() and len(piani) <= obiettivo
+        
+        try:
+            if self.processi != 1 and len(varianti) > 1:
+                pool = _pool_portafoglio(self.processi)
+                futuri = {}
+                try:
+                    futuri = {pool.submit(_esegui_variante, *argomenti, regola, seme): i
+                              for i, (regola, seme) in enumerate(varianti)}
+                    in_corso = set(futuri)
+                    # Attese brevi: un annullamento viene visto entro un decimo di secondo
+                    while in_corso and not scadenza.scaduta():
+                        finiti, in_corso = wait(in_corso, timeout=min(0.1, scadenza.rimanente()),
+                                                return_when=FIRST_COMPLETED)
+                        for futuro in finiti:
+                            if valuta(futuri[futuro], *futuro.result()):
+                                return migliore[1], migliore[2]
+                except (BrokenProcessPool, pickle.PicklingError, AttributeError, OSError, RuntimeError):
+                    # Processi non disponibili: le varianti mancanti girano qui
+                    _scarta_pool_portafoglio(pool)
+                finally:
+                    # Le varianti non ancora partite lasciano il pool libero per il prossimo calcolo
+                    for futuro in futuri:
+                        futuro.cancel()
+        
+            for indice, (regola, seme) in enumerate(varianti):
+                if indice in valutate:
+                    continue
+                if migliore is not None and scadenza.scaduta():
+                    break
+                if valuta(indice, *_esegui_variante(*argomenti, regola, seme)):
+                    break
+            return migliore[1], migliore[2]
+        finally:
+            if statistiche is not None:
+                statistiche.conta("varianti_valutate", len(valutate))
+                statistiche.conta("varianti_totali", len(varianti))
+
+    def _impacca_carenza(self, istanza: _Istanza, statistiche: Optional[StatisticheCalcolo] = None,
+                         avanzamento: Optional[Avanzamento] = None,
+                         candidati: Optional[List[Tuple[List[_Piano], np.ndarray]]] = None
+                         ) -> Tuple[List[_Piano], np.ndarray]:
+        """
+        Materiale insufficiente: zaino multiplo risolto uno spezzone alla volta.
+        Ogni spezzone riceve il pattern di valore massimo (metri, per la priorità con
+        carenza="priorita") tra i pezzi ancora da fare, con lo zaino limitato esatto
+        sulle lunghezze intere; lo stesso pattern si ripete sugli spezzoni uguali
+        finché la domanda lo permette. Si provano gli spezzoni dal più corto e dal più
+        lungo, e vince il piano di valore più alto tra questi, l'FFD e i `candidati`;
+        a pari valore quello con meno spezzoni, poi con meno scarto.
+        """
+        misure, quantita = istanza.misure, istanza.quantita
+        pesi = istanza.priorita if self.carenza == "priorita" else np.ones(len(misure))
+        valori = misure * pesi
+        candidati = list(candidati or [])
+        candidati.append(self._impacca_ffd(istanza.lunghezze, misure, quantita))
+        
+        # Tipi di spezzone: lunghezza -> indici degli spezzoni
+        tipi: Dict[int, List[int]] = {}
+        for b, lunghezza in enumerate(istanza.lunghezze.tolist()):
+            tipi.setdefault(lunghezza, []).append(b)
+        zaini = 0
+        for crescente in (True, False):
+            residuo = quantita.copy()
+            piani: List[_Piano] = []
+            for lunghezza in sorted(tipi, reverse=not crescente):
+                liberi = list(reversed(tipi[lunghezza]))
+                while liberi and residuo.any():
+                    if avanzamento is not None and avanzamento.annullato:
+                        break
+                    dp, scelte, blocchi = _zaino_limitato(misure, valori, residuo, lunghezza)
+                    zaini += 1
+                    pattern = _ricostruisci_zaino(scelte, blocchi, misure, lunghezza)
+                    if not pattern.any():
+                        break
+                    usati = np.flatnonzero(pattern)
+                    ripetizioni = min(len(liberi), int((residuo[usati] // pattern[usati]).min()))
+                    for _ in range(ripetizioni):
+                        piani.append((liberi.pop(), pattern.copy()))
+                    residuo -= ripetizioni * pattern
+            candidati.append((piani, residuo))
+            if avanzamento is not None:
+                avanzamento.aggiorna(0.5 if crescente else 1.0, f"Materiale insufficiente: {zaini} zaini risolti")
+        if statistiche is not None:
+            statistiche.conta("zaini_risolti", zaini)
+        
+        def valuta(candidato: Tuple[List[_Piano], np.ndarray]):
+            piani, residuo = candidato
+            usato = int(sum(istanza.lunghezze[b] for b, _ in piani))
+            tagliato = int((quantita - residuo) @ misure)
+            return (-float((quantita - residuo) @ valori), len(piani), usato - tagliato)
+        
+        return min(candidati, key=valuta)
+
+    def _impacca_libreria(self, istanza: _Istanza, noti: Dict[int, List[np.ndarray]], piani: List[_Piano],
+                          residuo: np.ndarray, statistiche: StatisticheCalcolo) -> Tuple[List[_Piano], np.ndarray]:
+        """
+        Piano che parte dalla libreria: per ogni lunghezza (dalla più lunga) il primo
+        pattern noto, in ordine di resa, che la domanda rimasta permette, ripetuto sugli
+        spezzoni uguali finché si può; il resto con la regola del metodo ("bfd" o FFD)
+        sugli spezzoni liberi. Resta il piano dato se questo non è migliore (più metri
+        tagliati, poi meno spezzoni, poi meno scarto).
+        """
+        misure, quantita = istanza.misure, istanza.quantita
+        da_fare = quantita.copy()
+        scelti: List[_Piano] = []
+        usati = np.zeros(len(istanza.lunghezze), dtype=bool)
+        inizio = 0
+        for lunghezza, quanti in zip(*np.unique(-istanza.lunghezze, return_counts=True)):
+            lunghezza, quanti = int(-lunghezza), int(quanti)
+            liberi = list(range(inizio, inizio + quanti))
+            inizio += quanti
+            elenco = noti.get(lunghezza)
+            if not elenco:
+                continue
+            candidati = np.array(elenco)
+            while liberi and da_fare.any():
+                entrano = np.flatnonzero((candidati <= da_fare).all(axis=1))
+                if not len(entrano):
+                    break
+                pattern = candidati[entrano[0]]
+                usa = np.flatnonzero(pattern)
+                ripetizioni = min(len(liberi), int((da_fare[usa] // pattern[usa]).min()))
+                for _ in range(ripetizioni):
+                    b = liberi.pop(0)
+                    usati[b] = True
+                    scelti.append((b, pattern.copy()))
+                da_fare -= ripetizioni * pattern
+        if not scelti:
+            return piani, residuo
+        
+        avanzati = np.flatnonzero(~usati)
+        regola = self._impacca_bfd if self.metodo == "bfd" else self._impacca_ffd
+        piani_resto, da_fare = regola(istanza.lunghezze[avanzati], misure, da_fare, statistiche.contatori)
+        candidato = scelti + [(int(avanzati[b]), pattern) for b, pattern in piani_resto]
+        
+        def valuta(piani: List[_Piano], residuo: np.ndarray):
+            tagliato = int((quantita - residuo) @ misure)
+            usato = int(sum(istanza.lunghezze[b] for b, _ in piani))
+            return (-tagliato, len(piani), usato - tagliato)
+        
+        if valuta(candidato, da_fare) < valuta(piani, residuo):
+            statistiche.conta("piani_da_libreria")
+            return candidato, da_fare
+        return piani, residuo
+
+    def _impacca_acquisti(self, istanza: _Istanza, costo_di: Dict[int, float],
+                          statistiche: StatisticheCalcolo, avanzamento: Optional[Avanzamento] = None
+                          ) -> Tuple[List[_Piano], List[Tuple[int, np.ndarray]], np.ndarray, Optional[float]]:
+        """
+        Stock misto: spezzoni (pochi, gratis) e barre del catalogo (lunghezza intera ->
+        costo, quante se ne vuole). Tipi di spezzone come in "colgen", con le barre del
+        catalogo come tipi in più, di disponibilità pari ai pezzi ancora da fare (ogni
+        barra comprata ne porta almeno uno); gli spezzoni costano un'inezia, proporzionale
+        alla lunghezza, così a parità di spesa se ne consumano meno. Tuffo nel rilassamento
+        come in "colgen"; il resto va all'FFD sugli spezzoni liberi e poi all'acquisto
+        goloso. Vince il piano più economico tra questo e quello goloso (FFD sugli
+        spezzoni, poi acquisto goloso).
+        Restituisce i piani sugli spezzoni, le barre comprate (lunghezza intera, pattern),
+        i pezzi mancanti e il costo minimo teorico, se il rilassamento è arrivato all'ottimo.
+        """
+        scadenza = _Scadenza(self.tempo_limite, avanzamento)
+        misure, quantita = istanza.misure, istanza.quantita
+        catalogo = sorted(costo_di, reverse=True)
+        
+        def compra(residuo: np.ndarray) -> Tuple[List[Tuple[int, np.ndarray]], np.ndarray]:
+            """
+            Acquisto goloso: la barra che entra il pezzo più lungo rimasto al costo per metro
+            tagliato più basso (riempita con l'FFD), ripetuta finché il pattern serve
+            """
+            residuo = residuo.copy()
+            comprate: List[Tuple[int, np.ndarray]] = []
+            while True:
+                da_fare = np.flatnonzero((residuo > 0) & (misure <= catalogo[0]))
+                if not len(da_fare):
+                    return comprate, residuo
+                migliore = None
+                for unita in catalogo:
+                    if unita < misure[da_fare[0]]:
+                        break
+                    (_, pattern), = self._impacca_ffd(np.array([unita]), misure, residuo)[0]
+                    rapporto = costo_di[unita] / int(pattern @ misure)
+                    if migliore is None or rapporto < migliore[0]:
+                        migliore = (rapporto, unita, pattern)
+                _, unita, pattern = migliore
+                usati = np.flatnonzero(pattern)
+                ripetizioni = int((residuo[usati] // pattern[usati]).min())
+                comprate.extend((unita, pattern) for _ in range(ripetizioni))
+                residuo -= ripetizioni * pattern
+        
+        def valuta(piani: List[_Piano], comprate: List[Tuple[int, np.ndarray]], residuo: np.ndarray):
+            tagliato = int((quantita - residuo) @ misure)
+            usato = int(sum(istanza.lunghezze[b] for b, _ in piani))
+            return (-tagliato, round(sum(costo_di[u] for u, _ in comprate), 9), usato, len(piani))
+        
+        piani_ffd, residuo_ffd = self._impacca_ffd(istanza.lunghezze, misure, quantita, statistiche.contatori)
+        comprate_ffd, residuo_golosi = compra(residuo_ffd)
+        migliore = (valuta(piani_ffd, comprate_ffd, residuo_golosi), piani_ffd, comprate_ffd, residuo_golosi)
+        massima = max(catalogo[0], int(istanza.lunghezze[0]) if len(istanza.lunghezze) else 0)
+        collocabili = np.flatnonzero(misure <= massima)
+        if not len(collocabili):
+            return migliore[1:] + (None,)
+        
+        # Tipi: lunghezze degli spezzoni (con quanti ce ne sono) e barre del catalogo,
+        # tutti dal più lungo; liberi[k] = None per le barre, che non finiscono mai
+        tipi: Dict[int, List[int]] = {}
+        for b, lunghezza in enumerate(istanza.lunghezze.tolist()):
+            tipi.setdefault(lunghezza, []).append(b)
+        voci = [(lunghezza, False) for lunghezza in tipi] + [(unita, True) for unita in catalogo]
+        voci.sort(key=lambda voce: voce[0], reverse=True)
+        lunghezze = np.array([lunghezza for lunghezza, _ in voci], dtype=np.int64)
+        piccolo = (min(costo_di.values()) or 1.0) * 1e-4 / lunghezze[0]
+        costi = np.array([costo_di[l] if barra else piccolo * l for l, barra in voci])
+        liberi: List[Optional[List[int]]] = [None if barra else list(reversed(tipi[l])) for l, barra in voci]
+        tipo_di = {lunghezza: k for k, (lunghezza, barra) in enumerate(voci) if not barra}
+        tipo_barra = {unita: k for k, (unita, barra) in enumerate(voci) if barra}
+        
+        pesi = misure[collocabili]
+        domanda = quantita[collocabili]
+        pattern_noti: List[Tuple[int, np.ndarray]] = []
+        visti = set()
+        
+        def aggiungi(tipo: int, pattern: np.ndarray):
+            chiave = (tipo, pattern.tobytes())
+            if pattern.any() and chiave not in visti:
+                visti.add(chiave)
+                pattern_noti.append((tipo, pattern))
+        
+        # Colonne iniziali: pattern omogenei e quelli del piano goloso
+        omogenei = np.minimum(domanda[None, :], lunghezze[:, None] // pesi[None, :])
+        for k in range(len(lunghezze)):
+            for j in np.flatnonzero(omogenei[k]):
+                pattern = np.zeros(len(pesi), dtype=np.int64)
+                pattern[j] = omogenei[k, j]
+                aggiungi(k, pattern)
+        for b, pattern in piani_ffd:
+            aggiungi(tipo_di[int(istanza.lunghezze[b])], pattern[collocabili])
+        for unita, pattern in comprate_ffd:
+            aggiungi(tipo_barra[unita], pattern[collocabili])
+        
+        residuo = domanda.copy()
+        scelti: List[_Piano] = []
+        comprate: List[Tuple[int, np.ndarray]] = []
+        limite = None
+        
+        def prendi(tipo: int, pattern: np.ndarray) -> bool:
+            effettivo = np.minimum(pattern, residuo)
+            if (liberi[tipo] is not None and not liberi[tipo]) or not effettivo.any():
+                return False
+            residuo[:] -= effettivo
+            completo = np.zeros(len(misure), dtype=np.int64)
+            completo[collocabili] = effettivo
+            if liberi[tipo] is None:
+                comprate.append((int(lunghezze[tipo]), completo))
+            else:
+                scelti.append((liberi[tipo].pop(), completo))
+            return True
+        
+        totale = max(1, int(domanda.sum()))
+        while residuo.any():
+            statistiche.conta("nodi_esplorati")
+            if avanzamento is not None:
+                avanzamento.aggiorna(max(scadenza.frazione(), 1 - int(residuo.sum()) / totale),
+                                     f"Acquisto: {statistiche.contatori['nodi_esplorati']} nodi, "
+                                     f"{len(pattern_noti)} pattern")
+            disponibili = np.array([int(residuo.sum()) if v is None else len(v) for v in liberi])
+            x, lagrangiano = _genera_colonne(pesi, residuo, lunghezze, disponibili, pattern_noti, visti,
+                                             scadenza, statistiche, costi)
+            if limite is None and lagrangiano is not None:
+                # Senza il costo simbolico degli spezzoni: resta un limite valido
+                limite = max(0.0, lagrangiano - float(costi[[v is not None for v in liberi]] @
+                                                      disponibili[[v is not None for v in liberi]]))
+            if x is None:
+                break
+            
+            presi = 0
+            ordine = np.argsort(-x, kind="stable")
+            for j in ordine:
+                if x[j] < 1 - 1e-6:
+                    break
+                for _ in range(int(x[j] + 1e-6)):
+                    if not prendi(*pattern_noti[j]):
+                        break
+                    presi += 1
+            if not presi and not prendi(*pattern_noti[int(ordine[0])]):
+                break
+        
+        # Il resto: spezzoni ancora liberi con l'FFD, poi acquisto goloso
+        quantita_residue = quantita.copy()
+        quantita_residue[collocabili] = residuo
+        avanzati = np.array(sorted(b for v in liberi if v is not None for b in v), dtype=np.int64)
+        piani_resto, quantita_residue = self._impacca_ffd(istanza.lunghezze[avanzati], misure, quantita_residue,
+                                                          statistiche.contatori)
+        altre, residuo_finale = compra(quantita_residue)
+        piani = scelti + [(int(avanzati[b]), pattern) for b, pattern in piani_resto]
+        comprate += altre
+        
+        candidato = (valuta(piani, comprate, residuo_finale), piani, comprate, residuo_finale)
+        statistiche.conta("barre_comprate", len(min(candidato, migliore, key=lambda c: c[0])[2]))
+        return min(candidato, migliore, key=lambda c: c[0])[1:] + (limite,)
+
+    def _pubblica(self, avanzamento: Optional[Avanzamento], istanza: _Istanza, piani: List[_Piano],
+                  residuo: np.ndarray):
+        """Piano intermedio a chi segue il calcolo (se qualcuno lo segue)"""
+        if avanzamento is not None:
+            avanzamento.pubblica(self._componi_risultato(istanza, piani, residuo))
+
+    @staticmethod
+    def _componi_risultato(istanza: _Istanza, piani: List[_Piano], residuo: np.ndarray,
+                           limite: Optional[float] = None) -> RisultatoCalcolo:
+        """
+        Riporta il piano interno in metri: i pattern sono valutati tutti insieme
+        (riempimenti e scarti con un solo prodotto matrice-vettore).
+        """
+        piani = sorted(piani, key=lambda p: p[0])
+        misure = istanza.misure
+        etichette = [istanza.etichette[u] for u in misure.tolist()]
+        
+        if piani:
+            indici = np.array([b for b, _ in piani])
+            matrice = np.array([pattern for _, pattern in piani])
+            scarti = istanza.lunghezze[indici] - matrice @ misure
+            fatti = matrice.sum(axis=0)
+        else:
+            indici = np.zeros(0, dtype=np.int64)
+            matrice = np.zeros((0, len(misure)), dtype=np.int64)
+            scarti = np.zeros(0, dtype=np.int64)
+            fatti = np.zeros(len(misure), dtype=np.int64)
+        
+        # Schemi uguali memorizzati una volta sola; gli scarti distinti sono pochi
+        valori, quale = np.unique(scarti, return_inverse=True)
+        scarti_metri = np.array([istanza.in_metri(v) for v in valori.tolist()], dtype=np.float64)[quale.reshape(-1)]
+        piani_taglio = PianiCompatti.da_matrice(
+            etichette, matrice,
+            [istanza.spezzoni[b].lunghezza for b in indici.tolist()], scarti_metri,
+            [istanza.spezzoni[b].id for b in indici.tolist()])
+        
+        # Cosa è stato fatto e cosa manca, per misura
+        tagli_fatti = {etichette[j]: int(n) for j, n in enumerate(fatti.tolist()) if n}
+        tagli_mancanti = {etichette[j]: int(n) for j, n in enumerate(residuo.tolist()) if n}
+        completato = not residuo.any()
+        
+        return RisultatoCalcolo(
+            piani=piani_taglio,
+            scarto_totale=istanza.in_metri(scarti.sum()),
+            completato=completato,
+            tagli_fatti=tagli_fatti,
+            tagli_mancanti=tagli_mancanti,
+            spezzoni_usati=len(piani_taglio),
+            spezzoni_totali=istanza.spezzoni_totali,
+            limite_inferiore=istanza.in_metri(limite) if limite is not None and completato else None
+        )
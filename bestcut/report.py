@@ -0,0 +1,110 @@
+# bestcut/report.py
+# Esportazione del piano (Excel, CSV, JSON) generata su richiesta e tenuta in cache
+
+import csv
+import hashlib
+import io
+import json
+import pickle
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from typing import List
+
+from .modelli import Spezzone, TaglioRichiesto, RisultatoCalcolo
+from .lavori import risultato_in_dict
+
+FORMATI_REPORT = ("xlsx", "csv", "json")
+
+TIPI_MIME = {
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    "csv": "text/csv",
+    "json": "application/json",
+}
+
+
+def chiave_report(formato: str, spezzoni: List[Spezzone], richieste: List[TaglioRichiesto],
+                  risultato: RisultatoCalcolo, soglia: float) -> str:
+    """Impronta (SHA-256) di tutto ciò che finisce nel report"""
+    dati = pickle.dumps((formato, spezzoni, richieste, risultato, soglia), protocol=pickle.HIGHEST_PROTOCOL)
+    return hashlib.sha256(dati).hexdigest()
+
+
+def _crea_csv(spezzoni, richieste, risultato, soglia) -> bytes:
+    # Una riga per taglio: nessuna formattazione, adatto ai piani molto grandi.
+    # Con più materiali, in fondo la colonna del materiale dello spezzone
+    materiale_di = {s.id: s.materiale for s in spezzoni} if risultato.materiali is not None else None
+    testo = io.StringIO()
+    scrittore = csv.writer(testo)
+    scrittore.writerow(["Spezzone", "Lunghezza (m)", "N°", "Misura (m)", "Inizio (m)", "Fine (m)",
+                        "Scarto (m)", "Stato scarto"] + (["Materiale"] if materiale_di is not None else []))
+    for piano in risultato.piani:
+        stato = "OTTIMALE" if piano.scarto <= soglia else "DA RIUTILIZZARE"
+        extra = [materiale_di.get(piano.spezzone_id, "")] if materiale_di is not None else []
+        posizione = 0.0
+        for i, taglio in enumerate(piano.tagli, 1):
+            scrittore.writerow([piano.spezzone_id, piano.spezzone_lunghezza, i, taglio,
+                                round(posizione, 6), round(posizione + taglio, 6), piano.scarto, stato] + extra)
+            posizione += taglio
+    return testo.getvalue().encode("utf-8")
+
+
+def _crea_json(spezzoni, richieste, risultato, soglia) -> bytes:
+    dati = {
+        "generato": datetime.now().isoformat(timespec="seconds"),
+        "soglia": soglia,
+        "spezzoni": [{"id": s.id, "lunghezza": s.lunghezza} for s in spezzoni],
+        "richieste": [{"lunghezza": r.lunghezza, "quantita": r.quantita} for r in richieste],
+        "risultato": risultato_in_dict("BestCut", risultato),
+    }
+    if risultato.materiali is not None:
+        for voce, origine in zip(dati["spezzoni"] + dati["richieste"], list(spezzoni) + list(richieste)):
+            voce["materiale"] = origine.materiale
+    return json.dumps(dati, ensure_ascii=False).encode("utf-8")
+
+
+def _crea_xlsx(spezzoni, richieste, risultato, soglia) -> bytes:
+    from .excel import crea_excel_download
+    return crea_excel_download(spezzoni, richieste, risultato, soglia).getvalue()
+
+
+_GENERATORI = {"xlsx": _crea_xlsx, "csv": _crea_csv, "json": _crea_json}
+
+
+class CacheReport:
+    """
+    Report già generati, per impronta del contenuto (LRU limitata in byte).
+    Scaricare di nuovo lo stesso piano non rigenera il file.
+    """
+
+    def __init__(self, max_byte: int = 64 * 1024 * 1024):
+        self.max_byte = max_byte
+        self._voci: "OrderedDict[str, bytes]" = OrderedDict()
+        self._byte = 0
+        self._lock = threading.Lock()
+
+    def genera(self, formato: str, spezzoni: List[Spezzone], richieste: List[TaglioRichiesto],
+               risultato: RisultatoCalcolo, soglia: float) -> bytes:
+        if formato not in _GENERATORI:
+            raise ValueError(f"Formato non supportato: {formato!r} ({', '.join(FORMATI_REPORT)})")
+        chiave = chiave_report(formato, spezzoni, richieste, risultato, soglia)
+        with self._lock:
+            if chiave in self._voci:
+                self._voci.move_to_end(chiave)
+                return self._voci[chiave]
+
+        contenuto = _GENERATORI[formato](spezzoni, richieste, risultato, soglia)
+
+        with self._lock:
+            if chiave not in self._voci and len(contenuto) <= self.max_byte:
+                self._voci[chiave] = contenuto
+                self._byte += len(contenuto)
+                while self._byte > self.max_byte:
+                    _, vecchio = self._voci.popitem(last=False)
+                    self._byte -= len(vecchio)
+        return contenuto
+
+    def svuota(self):
+        with self._lock:
+            self._voci.clear()
+            self._byte = 0
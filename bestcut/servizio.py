@@ -0,0 +1,522 @@
+# bestcut/servizio.py
+# Servizio HTTP locale per i gestionali: ordini in JSON, piani in JSON o NDJSON (solo libreria standard)
+#
+#   bestcut-servizio --porta 8765 -j 4
+#   curl -s localhost:8765/calcola -d '{"spezzoni": [6, 6], "richieste": [[3.2, 1], [0.5, 5]]}'
+#   curl -s -H "Accept: application/x-ndjson" localhost:8765/calcola -d @ordini.json
+#
+#   POST /calcola   un ordine (come una riga JSON Lines di `bestcut`), una lista di ordini,
+#                   {"ordini": [...], "opzioni": {...}} o un corpo NDJSON (un ordine per riga).
+#                   Le opzioni (metodo, tempo_limite, ...) valgono solo per quella richiesta.
+#                   Risposta: il risultato come lo scrive `bestcut` (senza tempi: stesso piano,
+#                   stesso JSON; con ?statistiche=1 ci sono) o {"risultati": [...]}.
+#                   Con Accept: application/x-ndjson o ?formato=ndjson: per ogni ordine una riga
+#                   di riepilogo e una per schema di taglio, inviate man mano che gli ordini finiscono.
+#   GET  /salute    stato del servizio e dei processi di lavoro
+#   GET  /metriche  richieste, lotti, errori, attese e durate recenti
+
+import argparse
+import json
+import logging
+import math
+import signal
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Deque, Dict, Iterator, List, Optional, Tuple
+from urllib.parse import urlparse, parse_qs
+
+from .modelli import Spezzone, TaglioRichiesto, raggruppa_piani
+from .ottimizzatore import OttimizzatoreTagli, RISOLUZIONE_PREDEFINITA
+from .lavori import Lavoro, lavoro_da_dict, risultato_in_dict
+from .materiali import dividi_per_materiale, unisci_per_materiale
+from .libreria import LibreriaPattern
+from .coda import _percentile
+
+_log = logging.getLogger("bestcut")
+
+# Opzioni che una richiesta può cambiare, con il loro tipo; processi e profilo restano quelli del servizio
+OPZIONI_RICHIESTA = {"soglia_scarto": float, "metodo": str, "tempo_limite": float, "risoluzione": float,
+                     "n_varianti": int, "seme": int, "carenza": str, "ricerca_locale": float}
+
+MAX_CORPO = 64 * 2**20  # byte di una richiesta
+MAX_VARIANTI = 64
+RISOLUZIONE_MINIMA = 0.0001  # metri: più fine le tabelle del calcolo crescono senza guadagno
+
+
+def _valore_opzione(nome: str, valore, tipo: type):
+    """Il valore di un'opzione della richiesta, del suo tipo; ValueError se non lo è"""
+    if tipo is str:
+        if nome == "carenza" and valore is None:
+            return None
+        if not isinstance(valore, str):
+            raise ValueError(f"Opzione {nome!r}: serve un testo")
+        return valore
+    # I booleani JSON sono interi per Python, ma qui non hanno senso
+    if isinstance(valore, bool) or not isinstance(valore, (int, float)) or not math.isfinite(valore):
+        raise ValueError(f"Opzione {nome!r}: serve un numero")
+    if tipo is int and valore != int(valore):
+        raise ValueError(f"Opzione {nome!r}: serve un numero intero")
+    if valore < 0:
+        raise ValueError(f"Opzione {nome!r}: non può essere negativa")
+    return tipo(valore)
+
+
+def _riscalda():
+    """Avvio di ogni processo di lavoro: moduli importati e un calcolo minimo, prima delle richieste"""
+    # Ctrl+C è per il servizio, che chiude i processi di lavoro da sé
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    OttimizzatoreTagli().calcola_ottimale([Spezzone(6.0, 1)], [TaglioRichiesto(1.0, 1)])
+
+
+def _pronto() -> bool:
+    return True
+
+
+def _calcola_lotto(voci: List[Tuple[Lavoro, dict]]) -> List[object]:
+    """Eseguito nei processi di lavoro: i calcoli di un lotto in fila; l'errore di uno resta suo"""
+    risultati: List[object] = []
+    for lavoro, opzioni in voci:
+        try:
+            if lavoro.soglia is not None:
+                opzioni = dict(opzioni, soglia_scarto=lavoro.soglia)
+            risultati.append(OttimizzatoreTagli(**opzioni).calcola_ottimale(lavoro.spezzoni, lavoro.richieste))
+        except Exception as e:  # torna alla richiesta dell'ordine, le altre del lotto proseguono
+            risultati.append(e)
+    return risultati
+
+
+class _Lotti:
+    """
+    Calcoli verso il pool a lotti. Finché ci sono processi liberi ogni calcolo parte
+    da solo; quando sono tutti occupati i calcoli aspettano qui e, appena un processo
+    si libera, quelli in attesa partono insieme in un solo compito (al massimo
+    `dimensione`, divisi tra i processi liberi): con tante richieste piccole si paga
+    il passaggio al processo una volta per lotto e non per calcolo.
+    """
+
+    def __init__(self, pool: ProcessPoolExecutor, processi: int, dimensione: int):
+        self._pool = pool
+        self.processi = processi
+        self.dimensione = dimensione
+        self._condizione = threading.Condition()
+        self._in_attesa: Deque[Tuple[Lavoro, dict, Future]] = deque()
+        self._in_volo = 0
+        self._chiuso = False
+        self.lotti = 0
+        self.calcoli = 0
+        self._thread = threading.Thread(target=self._raccogli, name="bestcut-lotti", daemon=True)
+        self._thread.start()
+
+    def invia(self, lavoro: Lavoro, opzioni: dict) -> Future:
+        futuro: Future = Future()
+        with self._condizione:
+            if self._chiuso:
+                raise RuntimeError("Servizio chiuso")
+            self._in_attesa.append((lavoro, opzioni, futuro))
+            self._condizione.notify()
+        return futuro
+
+    def stato(self) -> Tuple[int, int]:
+        """(calcoli in attesa, lotti nei processi)"""
+        with self._condizione:
+            return len(self._in_attesa), self._in_volo
+
+    def chiudi(self):
+        with self._condizione:
+            self._chiuso = True
+            while self._in_attesa:
+                futuro = self._in_attesa.popleft()[2]
+                if futuro.set_running_or_notify_cancel():
+                    futuro.set_exception(RuntimeError("Servizio chiuso"))
+            self._condizione.notify_all()
+        self._thread.join()
+
+    def _raccogli(self):
+        while True:
+            with self._condizione:
+                while not self._chiuso and (not self._in_attesa or self._in_volo >= self.processi):
+                    self._condizione.wait()
+                if self._chiuso:
+                    return
+                liberi = self.processi - self._in_volo
+                dimensione = min(self.dimensione, math.ceil(len(self._in_attesa) / liberi))
+                lotto = []
+                while self._in_attesa and len(lotto) < dimensione:
+                    voce = self._in_attesa.popleft()
+                    # Annullati mentre aspettavano (il cliente se n'è andato): non partono
+                    if voce[2].set_running_or_notify_cancel():
+                        lotto.append(voce)
+                if not lotto:
+                    continue
+                self._in_volo += 1
+                self.lotti += 1
+                self.calcoli += len(lotto)
+            try:
+                compito = self._pool.submit(_calcola_lotto, [(lavoro, opzioni) for lavoro, opzioni, _ in lotto])
+            except RuntimeError as e:
+                self._consegna(lotto, [e] * len(lotto))
+                continue
+            compito.add_done_callback(lambda compito, lotto=lotto: self._consegna(lotto, self._esito(compito, lotto)))
+
+    @staticmethod
+    def _esito(compito: Future, lotto) -> List[object]:
+        try:
+            return compito.result()
+        except Exception as e:  # processo caduto: l'errore va a tutto il lotto
+            return [e] * len(lotto)
+
+    def _consegna(self, lotto, risultati: List[object]):
+        for (_, _, futuro), risultato in zip(lotto, risultati):
+            if isinstance(risultato, BaseException):
+                futuro.set_exception(risultato)
+            else:
+                futuro.set_result(risultato)
+        with self._condizione:
+            self._in_volo -= 1
+            self._condizione.notify()
+
+
+class ServizioCalcoli:
+    """
+    Il motore dietro al servizio HTTP, usabile anche da solo: processi di lavoro
+    avviati e riscaldati una volta (niente import né avvio a ogni chiamata), calcoli
+    raccolti in lotti e metriche. `opzioni` sono quelle di OttimizzatoreTagli.
+    Una richiesta non tiene un processo oltre `tempo_massimo` secondi per ordine
+    (tempo limite e ricerca locale chiesti di più sono ridotti a questo).
+    """
+
+    def __init__(self, opzioni: Optional[dict] = None, processi: Optional[int] = None,
+                 dimensione_lotto: int = 16, campioni: int = 500, tempo_massimo: float = 60.0):
+        import os
+
+        self.opzioni = dict(opzioni or {})
+        self.tempo_massimo = float(tempo_massimo)
+        # Il parallelismo è già tra i calcoli: il portfolio resta nel suo processo
+        self.opzioni["processi"] = 1
+        OttimizzatoreTagli(**self.opzioni)  # opzioni sbagliate: errore subito, non alla prima richiesta
+        self.processi = processi or os.cpu_count() or 1
+        self._pool = ProcessPoolExecutor(max_workers=self.processi, initializer=_riscalda)
+        self._lotti = _Lotti(self._pool, self.processi, dimensione_lotto)
+        # Un compito per processo: partono tutti subito e si scaldano insieme
+        self._avvio = [self._pool.submit(_pronto) for _ in range(self.processi)]
+        self._inizio = time.perf_counter()
+        self._lock = threading.Lock()
+        self._durate: Deque[float] = deque(maxlen=campioni)
+        self._contatori = {"richieste": 0, "ordini": 0, "errori_richiesta": 0, "errori_calcolo": 0}
+
+    def opzioni_richiesta(self, opzioni: Optional[dict]) -> dict:
+        """Opzioni del servizio con quelle ammesse della richiesta; ValueError se non valgono"""
+        opzioni = opzioni or {}
+        if not isinstance(opzioni, dict):
+            raise ValueError("'opzioni' deve essere un oggetto JSON")
+        sconosciute = set(opzioni) - set(OPZIONI_RICHIESTA)
+        if sconosciute:
+            raise ValueError(f"Opzioni non ammesse: {', '.join(sorted(sconosciute))} "
+                             f"(ammesse: {', '.join(OPZIONI_RICHIESTA)})")
+        opzioni = {nome: _valore_opzione(nome, valore, OPZIONI_RICHIESTA[nome]) for nome, valore in opzioni.items()}
+        for nome in ("tempo_limite", "ricerca_locale"):
+            if nome in opzioni:
+                opzioni[nome] = min(opzioni[nome], self.tempo_massimo)
+        if "n_varianti" in opzioni:
+            opzioni["n_varianti"] = max(1, min(opzioni["n_varianti"], MAX_VARIANTI))
+        if opzioni.get("risoluzione", RISOLUZIONE_MINIMA) < RISOLUZIONE_MINIMA:
+            raise ValueError(f"Opzione 'risoluzione': almeno {RISOLUZIONE_MINIMA} m")
+        unite = dict(self.opzioni, **opzioni)
+        try:
+            OttimizzatoreTagli(**unite)
+        except TypeError as e:
+            raise ValueError(str(e)) from e
+        return unite
+
+    def calcola(self, ordini: List[Lavoro], opzioni: Optional[dict] = None
+                ) -> Iterator[Tuple[str, object]]:
+        """
+        (id, risultato) nell'ordine degli ordini, man mano che sono pronti; al posto
+        del risultato l'eccezione, se il calcolo di quell'ordine è fallito. I calcoli
+        partono tutti subito; un ordine con più materiali è un calcolo per materiale.
+        Chiudendo il generatore prima della fine, i calcoli non ancora partiti si annullano.
+        """
+        opzioni = self.opzioni_richiesta(opzioni)
+        futuri: List[Tuple[str, List[Tuple[Optional[str], Future]]]] = []
+        for lavoro in ordini:
+            parti = dividi_per_materiale(lavoro.spezzoni, lavoro.richieste)
+            if len(parti) <= 1:
+                futuri.append((lavoro.id, [(None, self._lotti.invia(lavoro, opzioni))]))
+            else:
+                futuri.append((lavoro.id, [
+                    (materiale, self._lotti.invia(Lavoro(lavoro.id, spezzoni, richieste, lavoro.soglia), opzioni))
+                    for materiale, (spezzoni, richieste) in parti.items()]))
+        with self._lock:
+            self._contatori["ordini"] += len(ordini)
+        try:
+            for id_lavoro, parti in futuri:
+                try:
+                    if parti[0][0] is None:
+                        risultato = parti[0][1].result()
+                    else:
+                        risultato = unisci_per_materiale({materiale: futuro.result() for materiale, futuro in parti})
+                except Exception as e:
+                    with self._lock:
+                        self._contatori["errori_calcolo"] += 1
+                    yield id_lavoro, e
+                else:
+                    yield id_lavoro, risultato
+        finally:
+            for _, parti in futuri:
+                for _, futuro in parti:
+                    futuro.cancel()
+
+    def registra(self, durata: Optional[float], errore: bool = False):
+        """Una richiesta servita (durata in secondi) o rifiutata"""
+        with self._lock:
+            self._contatori["richieste"] += 1
+            if errore:
+                self._contatori["errori_richiesta"] += 1
+            if durata is not None:
+                self._durate.append(durata)
+
+    def salute(self) -> Dict[str, object]:
+        pronti = sum(futuro.done() for futuro in self._avvio)
+        return {
+            "stato": "ok" if pronti == len(self._avvio) else "avvio",
+            "processi": self.processi,
+            "processi_pronti": pronti,
+            "attivo_da_s": round(time.perf_counter() - self._inizio, 3),
+        }
+
+    def metriche(self) -> Dict[str, object]:
+        in_attesa, in_volo = self._lotti.stato()
+        with self._lock:
+            return {
+                "processi": self.processi,
+                **self._contatori,
+                "lotti": self._lotti.lotti,
+                "calcoli": self._lotti.calcoli,
+                "calcoli_per_lotto": round(self._lotti.calcoli / self._lotti.lotti, 3) if self._lotti.lotti else None,
+                "calcoli_in_attesa": in_attesa,
+                "lotti_in_corso": in_volo,
+                "durata_media_s": round(sum(self._durate) / len(self._durate), 6) if self._durate else None,
+                "durata_p95_s": _percentile(self._durate, 0.95),
+            }
+
+    def chiudi(self):
+        self._lotti.chiudi()
+        # Niente compiti in coda nel pool: i lotti partono solo verso processi liberi
+        self._pool.shutdown(wait=True)
+
+
+def _ordini_da_corpo(corpo: bytes, ndjson: bool) -> Tuple[List[Lavoro], Optional[dict], bool]:
+    """(ordini, opzioni, True se era un ordine solo) dal corpo della richiesta"""
+    if ndjson:
+        righe = [json.loads(riga) for riga in corpo.decode("utf-8").splitlines() if riga.strip()]
+        return [lavoro_da_dict(dati, str(i)) for i, dati in enumerate(righe, 1)], None, False
+    dati = json.loads(corpo.decode("utf-8") or "null")
+    if isinstance(dati, list):
+        return [lavoro_da_dict(voce, str(i)) for i, voce in enumerate(dati, 1)], None, False
+    if isinstance(dati, dict) and "ordini" in dati:
+        if not isinstance(dati["ordini"], list):
+            raise ValueError("'ordini' deve essere una lista")
+        return ([lavoro_da_dict(voce, str(i)) for i, voce in enumerate(dati["ordini"], 1)],
+                dati.get("opzioni"), False)
+    if isinstance(dati, dict):
+        return [lavoro_da_dict(dati)], dati.get("opzioni"), True
+    raise ValueError("serve un ordine, una lista di ordini o {\"ordini\": [...]}")
+
+
+def _righe_ndjson(id_lavoro: str, risultato: object, statistiche: bool) -> Iterator[dict]:
+    """Riepilogo dell'ordine, poi uno schema di taglio per riga (per materiale, se più d'uno)"""
+    if isinstance(risultato, BaseException):
+        yield {"tipo": "errore", "id": id_lavoro, "errore": str(risultato)}
+        return
+    yield {"tipo": "riepilogo", **risultato_in_dict(id_lavoro, risultato, piani=False, statistiche=statistiche)}
+    parti = risultato.materiali.items() if risultato.materiali is not None else [(None, risultato)]
+    for materiale, parte in parti:
+        for gruppo in raggruppa_piani(parte.piani):
+            riga = {"tipo": "schema", "id": id_lavoro, "spezzone_lunghezza": gruppo.spezzone_lunghezza,
+                    "tagli": gruppo.tagli, "scarto": gruppo.scarto, "quantita": gruppo.quantita,
+                    "spezzone_ids": gruppo.spezzone_ids}
+            if materiale is not None:
+                riga["materiale"] = materiale
+            yield riga
+
+
+class _Gestore(BaseHTTPRequestHandler):
+    server_version = "bestcut"
+    protocol_version = "HTTP/1.1"  # connessioni tenute aperte tra una richiesta e l'altra
+
+    @property
+    def servizio(self) -> ServizioCalcoli:
+        return self.server.servizio
+
+    def do_GET(self):
+        percorso = urlparse(self.path).path
+        if percorso == "/salute":
+            self._json(200, self.servizio.salute())
+        elif percorso == "/metriche":
+            self._json(200, self.servizio.metriche())
+        else:
+            self._json(404, {"errore": f"percorso sconosciuto: {percorso}"})
+
+    def do_POST(self):
+        inizio = time.perf_counter()
+        url = urlparse(self.path)
+        parametri = parse_qs(url.query)
+        # Finché il corpo non è stato letto, dopo un rifiuto la connessione si chiude
+        if url.path != "/calcola":
+            self._rifiuta(404, f"percorso sconosciuto: {url.path}", chiudi=True)
+            return
+        if self.headers.get("Transfer-Encoding"):
+            self._rifiuta(411, "serve Content-Length (corpo a pezzi non supportato)", chiudi=True)
+            return
+        try:
+            lunghezza = int(self.headers.get("Content-Length") or 0)
+        except ValueError:
+            lunghezza = -1
+        if lunghezza < 0:
+            self._rifiuta(400, "Content-Length non valido", chiudi=True)
+            return
+        if lunghezza > MAX_CORPO:
+            self._rifiuta(413, f"richiesta oltre {MAX_CORPO} byte", chiudi=True)
+            return
+        corpo = self.rfile.read(lunghezza)
+        ndjson_dentro = "ndjson" in (self.headers.get("Content-Type") or "")
+        ndjson = ("ndjson" in (self.headers.get("Accept") or "")
+                  or parametri.get("formato", [""])[0] == "ndjson")
+        statistiche = parametri.get("statistiche", ["0"])[0] in ("1", "true", "si")
+        try:
+            ordini, opzioni, singolo = _ordini_da_corpo(corpo, ndjson_dentro)
+            risultati = self.servizio.calcola(ordini, opzioni)
+            # Le opzioni si controllano qui, prima di rispondere 200
+            primo = next(risultati, None)
+        except KeyError as e:
+            self._rifiuta(400, f"campo mancante: {e}")
+            return
+        except (ValueError, TypeError) as e:
+            self._rifiuta(400, str(e))
+            return
+
+        tutti = ([primo] if primo is not None else [])
+        if ndjson:
+            self._flusso(tutti, risultati, statistiche)
+        else:
+            tutti.extend(risultati)
+            dati = [{"id": id_lavoro, "errore": str(r)} if isinstance(r, BaseException)
+                    else risultato_in_dict(id_lavoro, r, statistiche=statistiche) for id_lavoro, r in tutti]
+            if singolo:
+                self._json(422 if "errore" in dati[0] else 200, dati[0])
+            else:
+                self._json(200, {"risultati": dati})
+        self.servizio.registra(time.perf_counter() - inizio)
+
+    def _flusso(self, primi, altri, statistiche: bool):
+        """NDJSON a pezzi (chunked): ogni ordine parte appena è pronto"""
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        try:
+            for elenco in (primi, altri):
+                for id_lavoro, risultato in elenco:
+                    righe = "".join(json.dumps(riga, ensure_ascii=False) + "\n"
+                                    for riga in _righe_ndjson(id_lavoro, risultato, statistiche))
+                    blocco = righe.encode("utf-8")
+                    self.wfile.write(f"{len(blocco):X}\r\n".encode("ascii") + blocco + b"\r\n")
+                    self.wfile.flush()
+            self.wfile.write(b"0\r\n\r\n")
+        except (BrokenPipeError, ConnectionResetError):
+            # Il cliente se n'è andato: i calcoli non ancora partiti si annullano
+            altri.close()
+            self.close_connection = True
+
+    def _rifiuta(self, codice: int, messaggio: str, chiudi: bool = False):
+        self.servizio.registra(None, errore=True)
+        if chiudi:
+            self.close_connection = True
+        self._json(codice, {"errore": messaggio})
+
+    def _json(self, codice: int, dati: dict):
+        corpo = json.dumps(dati, ensure_ascii=False).encode("utf-8")
+        self.send_response(codice)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(corpo)))
+        if self.close_connection:
+            self.send_header("Connection", "close")
+        self.end_headers()
+        self.wfile.write(corpo)
+
+    def log_message(self, formato, *argomenti):
+        # Sul log "bestcut" (DEBUG) invece che su standard error a ogni richiesta
+        _log.debug("%s %s", self.address_string(), formato % argomenti)
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 128  # connessioni in attesa di accept: i gestionali mandano a raffica
+
+
+def crea_server(servizio: ServizioCalcoli, host: str = "127.0.0.1", porta: int = 8765) -> ThreadingHTTPServer:
+    """Server HTTP (un thread per connessione) sul servizio; si avvia con serve_forever()"""
+    server = _Server((host, porta), _Gestore)
+    server.servizio = servizio
+    return server
+
+
+def _analizza_argomenti(argv: Optional[List[str]]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        prog="bestcut-servizio",
+        description="Servizio HTTP locale: ordini in JSON, piani di taglio in JSON o NDJSON"
+    )
+    parser.add_argument("--host", default="127.0.0.1", help="indirizzo di ascolto (predefinito: solo locale)")
+    parser.add_argument("--porta", type=int, default=8765)
+    parser.add_argument("-j", "--processi", type=int, default=None,
+                        help="processi di lavoro sempre pronti (predefinito: numero di CPU)")
+    parser.add_argument("--lotto", type=int, default=16, help="calcoli al massimo per lotto")
+    parser.add_argument("--metodo", choices=OttimizzatoreTagli.METODI, default="ffd")
+    parser.add_argument("--soglia", type=float, default=0.3, help="scarto minimo riutilizzabile in metri")
+    parser.add_argument("--tempo-limite", type=float, default=10.0, help="secondi per ordine (colgen/portfolio)")
+    parser.add_argument("--risoluzione", type=float, default=RISOLUZIONE_PREDEFINITA, help="precisione in metri")
+    parser.add_argument("--carenza", choices=OttimizzatoreTagli.CARENZE)
+    parser.add_argument("--ricerca-locale", type=float, default=0.0, metavar="SECONDI")
+    parser.add_argument("--tempo-massimo", type=float, default=60.0, metavar="SECONDI",
+                        help="tempo limite e ricerca locale al massimo chiedibili da una richiesta")
+    parser.add_argument("--libreria", metavar="DB", help="libreria dei pattern SQLite (vedi `bestcut --libreria`)")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = _analizza_argomenti(argv)
+    opzioni = {
+        "soglia_scarto": args.soglia,
+        "metodo": args.metodo,
+        "tempo_limite": args.tempo_limite,
+        "risoluzione": args.risoluzione,
+        "carenza": args.carenza,
+        "ricerca_locale": args.ricerca_locale,
+    }
+    try:
+        if args.libreria:
+            opzioni["libreria"] = LibreriaPattern(args.libreria)
+        servizio = ServizioCalcoli(opzioni, args.processi, args.lotto, tempo_massimo=args.tempo_massimo)
+        server = crea_server(servizio, args.host, args.porta)
+    except (OSError, ValueError) as e:
+        print(f"bestcut-servizio: {e}", file=sys.stderr)
+        return 2
+
+    print(f"bestcut-servizio: in ascolto su http://{args.host}:{args.porta} "
+          f"({servizio.processi} processi)", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        servizio.chiudi()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
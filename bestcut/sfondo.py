@@ -0,0 +1,130 @@
+# bestcut/sfondo.py
+# Calcolo in un thread a parte: avanzamento, annullamento e piano migliore trovato finora
+
+import threading
+import time
+from typing import Callable, Optional, Tuple
+
+from .modelli import RisultatoCalcolo
+
+
+class Avanzamento:
+    """
+    Stato condiviso tra un calcolo e chi lo osserva (thread-safe).
+    Il calcolo riporta a che punto è e pubblica i piani man mano che migliorano
+    (ognuno migliore del precedente secondo il criterio del suo metodo, l'ultimo è
+    il risultato finale); chi osserva può leggerli in ogni momento e chiedere di fermarsi.
+    `annulla` può essere un multiprocessing.Event: l'annullamento arriva allora anche
+    ai calcoli in altri processi.
+    """
+
+    def __init__(self, annulla=None):
+        self._lock = threading.Lock()
+        self._annulla = annulla if annulla is not None else threading.Event()
+        self.inizio = time.perf_counter()
+        self.frazione = 0.0  # 0..1
+        self.messaggio = ""
+        self.migliore: Optional[RisultatoCalcolo] = None
+        self.versione = 0  # cresce a ogni piano migliore pubblicato
+
+    def annulla(self):
+        """Chiede al calcolo di fermarsi: restituirà il piano migliore trovato fin lì"""
+        self._annulla.set()
+
+    @property
+    def annullato(self) -> bool:
+        return self._annulla.is_set()
+
+    @property
+    def trascorso(self) -> float:
+        return time.perf_counter() - self.inizio
+
+    def aggiorna(self, frazione: float, messaggio: Optional[str] = None):
+        with self._lock:
+            self.frazione = min(1.0, max(self.frazione, frazione))
+            if messaggio is not None:
+                self.messaggio = messaggio
+
+    def pubblica(self, risultato: RisultatoCalcolo):
+        with self._lock:
+            self.migliore = risultato
+            self.versione += 1
+
+    def stato(self) -> Tuple[float, str, Optional[RisultatoCalcolo], int]:
+        """(frazione, messaggio, piano migliore, versione) letti insieme"""
+        with self._lock:
+            return self.frazione, self.messaggio, self.migliore, self.versione
+
+    def derivato(self, trasforma: Optional[Callable[[RisultatoCalcolo], RisultatoCalcolo]] = None,
+                 intervallo: Tuple[float, float] = (0.0, 1.0)) -> "Avanzamento":
+        """
+        Avanzamento di una parte del calcolo: stesso annullamento, la sua barra occupa
+        `intervallo` di quella principale; i piani pubblicati passano da `trasforma`
+        (senza, non vengono pubblicati).
+        """
+        return _AvanzamentoDerivato(self, trasforma, intervallo)
+
+
+class _AvanzamentoDerivato(Avanzamento):
+
+    def __init__(self, padre: Avanzamento, trasforma, intervallo: Tuple[float, float]):
+        super().__init__()
+        self._annulla = padre._annulla
+        self._padre = padre
+        self._trasforma = trasforma
+        self._intervallo = intervallo
+
+    def aggiorna(self, frazione: float, messaggio: Optional[str] = None):
+        inizio, fine = self._intervallo
+        self._padre.aggiorna(inizio + (fine - inizio) * min(1.0, max(0.0, frazione)), messaggio)
+
+    def pubblica(self, risultato: RisultatoCalcolo):
+        if self._trasforma is not None:
+            self._padre.pubblica(self._trasforma(risultato))
+
+
+class CalcoloInSfondo:
+    """
+    Esegue `calcolo(avanzamento)` in un thread daemon (`avvia`) o in un thread di
+    chi lo gestisce (`esegui`, vedi CodaCalcoli). La pagina resta libera:
+    legge `avanzamento.stato()` per la barra e il piano migliore finora, e può
+    chiamare `annulla()`. Un calcolo annullato termina comunque con un piano valido;
+    uno annullato prima di partire si può chiudere con `salta()`, senza risultato.
+    """
+
+    def __init__(self, calcolo: Callable[[Avanzamento], object]):
+        self.avanzamento = Avanzamento()
+        self.risultato = None
+        self.errore: Optional[BaseException] = None
+        self._calcolo = calcolo
+        self._fine = threading.Event()
+
+    def avvia(self) -> "CalcoloInSfondo":
+        threading.Thread(target=self.esegui, name="bestcut-calcolo", daemon=True).start()
+        return self
+
+    def esegui(self):
+        """Esegue il calcolo nel thread corrente"""
+        try:
+            self.risultato = self._calcolo(self.avanzamento)
+        except Exception as errore:
+            self.errore = errore
+        finally:
+            self.avanzamento.aggiorna(1.0)
+            self._fine.set()
+
+    def salta(self):
+        """Chiude il calcolo senza eseguirlo: `risultato` ed `errore` restano None"""
+        self.avanzamento.aggiorna(1.0)
+        self._fine.set()
+
+    def annulla(self):
+        self.avanzamento.annulla()
+
+    @property
+    def finito(self) -> bool:
+        return self._fine.is_set()
+
+    def attendi(self, timeout: Optional[float] = None) -> bool:
+        """True se il calcolo è finito entro `timeout` secondi"""
+        return self._fine.wait(timeout)
@@ -1,594 +1,896 @@
-# bestcut_webapp.py
-# Versione con taglio parziale - dice cosa si può fare e cosa manca
-
-import streamlit as st
-from dataclasses import dataclass
-from typing import List, Tuple, Dict
-import copy
-from itertools import combinations
-from datetime import datetime
-import pandas as pd
-from io import BytesIO
-
-# Importazione openpyxl
-try:
-    from openpyxl import Workbook
-    from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
-    EXCEL_DISPONIBILE = True
-except ImportError:
-    EXCEL_DISPONIBILE = False
-
-# Configurazione pagina
-st.set_page_config(
-    page_title="BestCut - Taglio Parziale",
-    page_icon="🔧",
-    layout="wide",
-    initial_sidebar_state="expanded"
-)
-
-# CSS personalizzato
-st.markdown("""
-<style>
-    .main-header {
-        font-size: 3rem;
-        font-weight: bold;
-        color: #2196F3;
-        text-align: center;
-        margin-bottom: 0;
-    }
-    .sub-header {
-        font-size: 1.2rem;
-        color: #666;
-        text-align: center;
-        margin-bottom: 2rem;
-    }
-    .partial-box {
-        background-color: #E3F2FD;
-        color: #1565C0;
-        padding: 1rem;
-        border-radius: 10px;
-        border-left: 5px solid #2196F3;
-        margin: 1rem 0;
-    }
-    .success-box {
-        background-color: #d4edda;
-        color: #155724;
-        padding: 1rem;
-        border-radius: 10px;
-        border-left: 5px solid #28a745;
-    }
-    .error-box {
-        background-color: #f8d7da;
-        color: #721c24;
-        padding: 1rem;
-        border-radius: 10px;
-        border-left: 5px solid #dc3545;
-    }
-    .missing-box {
-        background-color: #ffebee;
-        color: #c62828;
-        padding: 1rem;
-        border-radius: 10px;
-        border-left: 5px solid #f44336;
-        margin: 0.5rem 0;
-    }
-</style>
-""", unsafe_allow_html=True)
-
-@dataclass
-class Spezzone:
-    lunghezza: float
-    id: int
-    
-@dataclass
-class TaglioRichiesto:
-    lunghezza: float
-    quantita: int
-    
-@dataclass
-class PianoTaglio:
-    spezzone_id: int
-    spezzone_lunghezza: float
-    tagli: List[float]
-    scarto: float
-
-@dataclass
-class RisultatoCalcolo:
-    piani: List[PianoTaglio]
-    scarto_totale: float
-    completato: bool  # True = tutto fatto, False = parziale
-    tagli_fatti: Dict[float, int]  # misura -> quantità fatta
-    tagli_mancanti: Dict[float, int]  # misura -> quantità mancante
-    spezzoni_usati: int
-    spezzoni_totali: int
-
-class OttimizzatoreTagli:
-    def __init__(self, soglia_scarto: float = 0.3):
-        self.soglia_scarto = soglia_scarto
-        
-    def calcola_ottimale(self, spezzoni: List[Spezzone], richieste: List[TaglioRichiesto]) -> RisultatoCalcolo:
-        """
-        Calcola il piano di taglio.
-        Se non basta il materiale, fa quello che può e indica cosa manca.
-        """
-        # Crea lista di tutti i tagli necessari con la loro misura
-        tagli_necessari = []
-        for richiesta in richieste:
-            for _ in range(richiesta.quantita):
-                tagli_necessari.append(richiesta.lunghezza)
-        
-        # Ordina per lunghezza decrescente (i più grandi prima)
-        tagli_necessari.sort(reverse=True)
-        
-        # Copia per tenere traccia di cosa riusciamo a fare
-        tagli_originali = tagli_necessari.copy()
-        
-        # Ordina spezzoni dal più grande al più piccolo
-        spezzoni_ordinati = sorted(spezzoni, key=lambda x: x.lunghezza, reverse=True)
-        spezzoni_work = copy.deepcopy(spezzoni_ordinati)
-        tagli_rimanenti = tagli_necessari.copy()
-        piani = []
-        
-        while tagli_rimanenti and spezzoni_work:
-            spezzone_corrente = spezzoni_work[0]
-            tagli_da_tagliare = []
-            tagli_temp = tagli_rimanenti.copy()
-            
-            # Prova a infilare tagli dal più grande al più piccolo
-            for taglio in tagli_temp:
-                if sum(tagli_da_tagliare) + taglio <= spezzone_corrente.lunghezza:
-                    tagli_da_tagliare.append(taglio)
-                    tagli_rimanenti.remove(taglio)
-            
-            if tagli_da_tagliare:
-                scarto = spezzone_corrente.lunghezza - sum(tagli_da_tagliare)
-                piani.append(PianoTaglio(
-                    spezzone_id=spezzone_corrente.id,
-                    spezzone_lunghezza=spezzone_corrente.lunghezza,
-                    tagli=tagli_da_tagliare,
-                    scarto=scarto
-                ))
-            
-            spezzoni_work.pop(0)
-        
-        # Calcola cosa è stato fatto e cosa manca
-        tagli_fatti = {}
-        tagli_mancanti = {}
-        
-        for piano in piani:
-            for taglio in piano.tagli:
-                tagli_fatti[taglio] = tagli_fatti.get(taglio, 0) + 1
-        
-        # Per ogni richiesta originale, calcola quanti ne mancano
-        for richiesta in richieste:
-            fatti = tagli_fatti.get(richiesta.lunghezza, 0)
-            if fatti < richiesta.quantita:
-                tagli_mancanti[richiesta.lunghezza] = richiesta.quantita - fatti
-        
-        scarto_totale = sum(p.scarto for p in piani)
-        completato = len(tagli_rimanenti) == 0
-        
-        return RisultatoCalcolo(
-            piani=piani,
-            scarto_totale=scarto_totale,
-            completato=completato,
-            tagli_fatti=tagli_fatti,
-            tagli_mancanti=tagli_mancanti,
-            spezzoni_usati=len(piani),
-            spezzoni_totali=len(spezzoni)
-        )
-
-def crea_excel_download(spezzoni, richieste, risultato, soglia):
-    """Crea file Excel in memoria per il download"""
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "Piano Taglio"
-    
-    header_font = Font(name='Calibri', size=14, bold=True, color="FFFFFF")
-    header_fill = PatternFill(start_color="2196F3", end_color="2196F3", fill_type="solid")
-    subheader_font = Font(name='Calibri', size=12, bold=True)
-    border = Border(left=Side(style='thin'), right=Side(style='thin'), 
-                  top=Side(style='thin'), bottom=Side(style='thin'))
-    
-    ws.merge_cells('A1:E1')
-    ws['A1'] = "PIANO DI TAGLIO TUBI"
-    ws['A1'].font = Font(size=18, bold=True, color="2196F3")
-    ws['A1'].alignment = Alignment(horizontal='center')
-    ws.row_dimensions[1].height = 30
-    
-    ws['A2'] = f"Generato: {datetime.now().strftime('%d/%m/%Y %H:%M')}"
-    ws['A2'].font = Font(italic=True)
-    
-    # Stato completamento
-    row = 4
-    if risultato.completato:
-        ws.merge_cells(f'A{row}:E{row}')
-        ws[f'A{row}'] = "✅ TAGLIO COMPLETATO - Tutti i pezzi realizzabili"
-        ws[f'A{row}'].font = Font(size=12, bold=True, color="4CAF50")
-    else:
-        ws.merge_cells(f'A{row}:E{row}')
-        ws[f'A{row}'] = "⚠️ TAGLIO PARZIALE - Materiali insufficienti"
-        ws[f'A{row}'].font = Font(size=12, bold=True, color="FF9800")
-    
-    # Spezzoni disponibili
-    row = 6
-    ws.merge_cells(f'A{row}:E{row}')
-    ws[f'A{row}'] = "SPEZZONI DISPONIBILI"
-    ws[f'A{row}'].font = header_font
-    ws[f'A{row}'].fill = header_fill
-    ws[f'A{row}'].alignment = Alignment(horizontal='center')
-    
-    row += 1
-    for col, title in [('A', 'ID'), ('B', 'Lunghezza (m)'), ('C', 'Lunghezza (cm)')]:
-        ws[f'{col}{row}'] = title
-        ws[f'{col}{row}'].font = subheader_font
-        ws[f'{col}{row}'].border = border
-    
-    for spezzone in spezzoni:
-        row += 1
-        ws[f'A{row}'] = spezzone.id
-        ws[f'B{row}'] = spezzone.lunghezza
-        ws[f'C{row}'] = spezzone.lunghezza * 100
-        for col in ['A', 'B', 'C']:
-            ws[f'{col}{row}'].border = border
-    
-    # Tagli richiesti vs fatti
-    row += 2
-    ws.merge_cells(f'A{row}:E{row}')
-    ws[f'A{row}'] = "RIEPILOGO TAGLI"
-    ws[f'A{row}'].font = header_font
-    ws[f'A{row}'].fill = header_fill
-    ws[f'A{row}'].alignment = Alignment(horizontal='center')
-    
-    row += 1
-    headers = [('A', 'Misura (m)'), ('B', 'Misura (cm)'), ('C', 'Quantita'), ('D', 'Totale (m)'), ('E', 'Tubo mancante (m)')]
-    for col, title in headers:
-        ws[f'{col}{row}'] = title
-        ws[f'{col}{row}'].font = subheader_font
-        ws[f'{col}{row}'].border = border
-    
-    for richiesta in richieste:
-        row += 1
-        ws[f'A{row}'] = richiesta.lunghezza
-        ws[f'B{row}'] = richiesta.lunghezza * 100
-        ws[f'C{row}'] = richiesta.quantita
-        ws[f'D{row}'] = richiesta.lunghezza * richiesta.quantita
-        
-        # NUOVO: Calcola tubo mancante
-        fatti = risultato.tagli_fatti.get(richiesta.lunghezza, 0)
-        mancanti = risultato.tagli_mancanti.get(richiesta.lunghezza, 0)
-        tubo_mancante = mancanti * richiesta.lunghezza if mancanti > 0 else 0
-        ws[f'E{row}'] = tubo_mancante if tubo_mancante > 0 else "-"
-        
-        for col in ['A', 'B', 'C', 'D', 'E']:
-            ws[f'{col}{row}'].border = border
-
-    # AGGIUNTO: Riga vuota per separazione
-    row += 1
-    
-    # Riga totale tubo mancante
-    row += 1
-    ws[f'A{row}'] = "TOTALE TUBO MANCANTE:"
-    ws[f'A{row}'].font = Font(bold=True)
-    ws.merge_cells(f'B{row}:E{row}')
-    totale_mancante = sum(misura * qty for misura, qty in risultato.tagli_mancanti.items())
-    ws[f'B{row}'] = f"{totale_mancante:.2f} m" if totale_mancante > 0 else "0 m"
-    ws[f'B{row}'].font = Font(bold=True, color="f44336" if totale_mancante > 0 else "4CAF50")
-    for col in ['A', 'B']:
-        ws[f'{col}{row}'].border = border
-    
-    # Piano di taglio dettagliato
-    row += 2
-    ws.merge_cells(f'A{row}:E{row}')
-    ws[f'A{row}'] = "PIANO DI TAGLIO DETTAGLIATO"
-    ws[f'A{row}'].font = header_font
-    ws[f'A{row}'].fill = header_fill
-    ws[f'A{row}'].alignment = Alignment(horizontal='center')
-    
-    for piano in risultato.piani:
-        row += 1
-        ws.merge_cells(f'A{row}:E{row}')
-        ws[f'A{row}'] = f"Spezzone #{piano.spezzone_id} ({piano.spezzone_lunghezza:.3f}m)"
-        ws[f'A{row}'].font = subheader_font
-        ws[f'A{row}'].fill = PatternFill(start_color="E3F2FD", fill_type="solid")
-        
-        row += 1
-        headers = [('A', 'N°'), ('B', 'Misura (m)'), ('C', 'Misura (cm)'), 
-                  ('D', 'Inizio (m)'), ('E', 'Fine (m)')]
-        for col, title in headers:
-            ws[f'{col}{row}'] = title
-            ws[f'{col}{row}'].font = Font(bold=True)
-            ws[f'{col}{row}'].border = border
-            ws[f'{col}{row}'].fill = PatternFill(start_color="F5F5F5", fill_type="solid")
-        
-        posizione = 0.0
-        for i, taglio in enumerate(piano.tagli, 1):
-            row += 1
-            ws[f'A{row}'] = i
-            ws[f'B{row}'] = taglio
-            ws[f'C{row}'] = taglio * 100
-            ws[f'D{row}'] = posizione
-            ws[f'E{row}'] = posizione + taglio
-            for col in ['A', 'B', 'C', 'D', 'E']:
-                ws[f'{col}{row}'].border = border
-            posizione += taglio
-        
-        row += 1
-        ws[f'A{row}'] = "SCARTO"
-        color = "4CAF50" if piano.scarto <= soglia else "f44336"
-        ws[f'A{row}'].font = Font(bold=True, color=color)
-        ws.merge_cells(f'B{row}:C{row}')
-        ws[f'B{row}'] = piano.scarto
-        ws[f'B{row}'].font = Font(bold=True)
-        ws[f'D{row}'] = "OTTIMALE" if piano.scarto <= soglia else "DA RIUTILIZZARE"
-        for col in ['A', 'B', 'C', 'D']:
-            ws[f'{col}{row}'].border = border
-        row += 1
-    
-    for i, w in enumerate([15, 15, 15, 18, 18], 1):
-        ws.column_dimensions[chr(64+i)].width = w
-    
-    excel_buffer = BytesIO()
-    wb.save(excel_buffer)
-    excel_buffer.seek(0)
-    return excel_buffer
-
-def main():
-    # Header
-    st.markdown('<p class="main-header">🔧 BestCut v3.2</p>', unsafe_allow_html=True)
-    st.markdown('<p class="sub-header">Ottimizzatore con supporto TAGLIO PARZIALE</p>', unsafe_allow_html=True)
-    
-    # Info
-    st.markdown("""
-    <div class="partial-box">
-        <strong>🆕 NOVITÀ:</strong> Se i tubi non bastano, il programma ti dice cosa riesci a fare 
-        con quello che hai e quanto ne manca!
-    </div>
-    """, unsafe_allow_html=True)
-    
-    # Inizializza session state
-    if 'spezzoni' not in st.session_state:
-        st.session_state.spezzoni = []
-        st.session_state.prossimo_id = 1
-        st.session_state.risultato = None
-        st.session_state.richieste = None
-        st.session_state.soglia = 0.3
-    
-    # Layout a colonne
-    col1, col2 = st.columns([1, 1])
-    
-    with col1:
-        st.subheader("📦 Spezzoni Disponibili")
-        
-        st.info("💡 Inserisci prima i tubi PIÙ GRANDI")
-        
-        nuovo_spezzone = st.number_input(
-            "Lunghezza spezzone (metri)",
-            min_value=0.0,
-            value=6.0,
-            step=0.1,
-            format="%.2f",
-            key="input_spezzone"
-        )
-        
-        if st.button("➕ Aggiungi Spezzone", use_container_width=True):
-            if nuovo_spezzone > 0:
-                st.session_state.spezzoni.append(
-                    Spezzone(nuovo_spezzone, st.session_state.prossimo_id)
-                )
-                st.session_state.spezzoni.sort(key=lambda x: x.lunghezza, reverse=True)
-                for i, s in enumerate(st.session_state.spezzoni, 1):
-                    s.id = i
-                st.session_state.prossimo_id = len(st.session_state.spezzoni) + 1
-                st.success(f"✅ Aggiunto: {nuovo_spezzone:.2f}m")
-                st.rerun()
-            else:
-                st.error("❌ Lunghezza non valida")
-        
-        if st.session_state.spezzoni:
-            data = [{"ID": s.id, "Lunghezza (m)": f"{s.lunghezza:.2f}", "Lunghezza (cm)": f"{s.lunghezza*100:.0f}"} 
-                   for s in st.session_state.spezzoni]
-            df = pd.DataFrame(data)
-            st.dataframe(df, use_container_width=True, hide_index=True)
-            
-            id_da_rimuovere = st.selectbox(
-                "Seleziona da rimuovere",
-                options=[s.id for s in st.session_state.spezzoni],
-                format_func=lambda x: f"ID {x} - {next(s.lunghezza for s in st.session_state.spezzoni if s.id == x):.2f}m"
-            )
-            
-            col_btn1, col_btn2 = st.columns(2)
-            with col_btn1:
-                if st.button("🗑️ Rimuovi", use_container_width=True):
-                    st.session_state.spezzoni = [s for s in st.session_state.spezzoni if s.id != id_da_rimuovere]
-                    for i, s in enumerate(st.session_state.spezzoni, 1):
-                        s.id = i
-                    st.session_state.prossimo_id = len(st.session_state.spezzoni) + 1
-                    st.success("✅ Rimosso!")
-                    st.rerun()
-            with col_btn2:
-                if st.button("🗑️🗑️ Tutti", use_container_width=True):
-                    st.session_state.spezzoni = []
-                    st.session_state.prossimo_id = 1
-                    st.success("✅ Tutti rimossi!")
-                    st.rerun()
-        else:
-            st.warning("⚠️ Nessuno spezzone inserito")
-    
-    with col2:
-        st.subheader("✂️ Tagli Richiesti")
-        
-        st.session_state.soglia = st.number_input(
-            "Soglia scarto (metri)",
-            min_value=0.0,
-            value=0.3,
-            step=0.05,
-            format="%.2f"
-        )
-        
-        st.markdown("---")
-        richieste = []
-        
-        for i in range(5):
-            cols = st.columns([1, 2, 2])
-            with cols[0]:
-                st.markdown(f"**#{i+1}**")
-            with cols[1]:
-                misura = st.number_input(
-                    f"M{i+1}", min_value=0.0,
-                    value=3.2 if i == 0 else (0.5 if i == 1 else 0.0),
-                    step=0.1, format="%.2f",
-                    key=f"misura_{i}", label_visibility="collapsed"
-                )
-            with cols[2]:
-                qty = st.number_input(
-                    f"Q{i+1}", min_value=0,
-                    value=1 if i == 0 else (5 if i == 1 else 0),
-                    step=1, key=f"qty_{i}", label_visibility="collapsed"
-                )
-            
-            if misura > 0 and qty > 0:
-                richieste.append(TaglioRichiesto(misura, qty))
-        
-        richieste.sort(key=lambda x: x.lunghezza, reverse=True)
-        st.session_state.richieste = richieste
-        
-        st.markdown("---")
-        st.write(f"**{len(richieste)} tipi di tagli configurati**")
-    
-    # Bottone calcola
-    st.markdown("---")
-    col_center = st.columns([1, 2, 1])
-    with col_center[1]:
-        if st.button("🚀 CALCOLA (anche parziale)", use_container_width=True, type="primary"):
-            if not st.session_state.spezzoni:
-                st.error("❌ Aggiungi almeno uno spezzone!")
-            elif not richieste:
-                st.error("❌ Inserisci almeno un taglio!")
-            else:
-                with st.spinner("⏳ Calcolo in corso..."):
-                    ottim = OttimizzatoreTagli(st.session_state.soglia)
-                    risultato = ottim.calcola_ottimale(
-                        copy.deepcopy(st.session_state.spezzoni), 
-                        richieste
-                    )
-                    st.session_state.risultato = risultato
-                
-                if risultato.completato:
-                    st.success("✅ TAGLIO COMPLETATO! Tutti i pezzi realizzabili")
-                else:
-                    st.warning("⚠️ TAGLIO PARZIALE - Materiali insufficienti")
-    
-    # Risultati
-    if st.session_state.risultato:
-        st.markdown("---")
-        
-        risultato = st.session_state.risultato
-        richieste = st.session_state.richieste
-        
-        # Box stato
-        if risultato.completato:
-            st.markdown('<div class="success-box">✅ <strong>COMPLETATO!</strong> Tutti i tagli sono realizzabili con gli spezzoni disponibili.</div>', unsafe_allow_html=True)
-        else:
-            st.markdown('<div class="partial-box">⚠️ <strong>PARZIALE!</strong> Con gli spezzoni disponibili riesci a fare solo una parte dei tagli richiesti.</div>', unsafe_allow_html=True)
-        
-        # Metriche
-        scarto_tot = risultato.scarto_totale
-        efficienza = (1 - scarto_tot/sum(p.spezzone_lunghezza for p in risultato.piani))*100 if risultato.piani else 0
-        
-        col_m1, col_m2, col_m3, col_m4 = st.columns(4)
-        with col_m1:
-            st.metric("Spezzoni usati", f"{risultato.spezzoni_usati}/{risultato.spezzoni_totali}")
-        with col_m2:
-            st.metric("Scarto totale", f"{scarto_tot:.3f}m")
-        with col_m3:
-            st.metric("Efficienza", f"{efficienza:.1f}%")
-        with col_m4:
-            risparmiati = risultato.spezzoni_totali - risultato.spezzoni_usati
-            st.metric("💰 Risparmiati", risparmiati if risparmiati > 0 else 0)
-        
-        # Tabella riepilogo: Richiesti vs Fatti vs Mancanti
-        st.subheader("📊 Riepilogo Tagli")
-        
-        data_riep = []
-        for rich in richieste:
-            fatti = risultato.tagli_fatti.get(rich.lunghezza, 0)
-            mancanti = risultato.tagli_mancanti.get(rich.lunghezza, 0)
-            
-            data_riep.append({
-                "Misura": f"{rich.lunghezza:.2f}m",
-                "Richiesti": rich.quantita,
-                "✅ Fatti": fatti,
-                "❌ Mancanti": mancanti if mancanti > 0 else "-",
-                "Stato": "🟢 OK" if mancanti == 0 else f"🟡 Mancano {mancanti}"
-            })
-        
-        df_riep = pd.DataFrame(data_riep)
-        st.dataframe(df_riep, use_container_width=True, hide_index=True)
-        
-        # Avviso se manca qualcosa
-        if not risultato.completato:
-            st.markdown("---")
-            st.subheader("❌ Tagli Mancanti")
-            
-            for misura, qty in risultato.tagli_mancanti.items():
-                st.markdown(f"""
-                <div class="missing-box">
-                    <strong>{misura:.2f}m</strong>: mancano <strong>{qty} pezzi</strong><br>
-                    <small>Servono altri {misura * qty:.2f}m di tubo per completare</small>
-                </div>
-                """, unsafe_allow_html=True)
-            
-            totale_mancante = sum(misura * qty for misura, qty in risultato.tagli_mancanti.items())
-            st.info(f"💡 In totale mancano {totale_mancante:.2f}m di tubo per completare tutti i tagli")
-        
-        # Dettaglio piano di taglio
-        st.markdown("---")
-        st.subheader("🔧 Piano di Taglio Dettagliato")
-        
-        for piano in risultato.piani:
-            with st.expander(f"Spezzone #{piano.spezzone_id} ({piano.spezzone_lunghezza:.3f}m)"):
-                data_tagli = []
-                pos = 0.0
-                for i, taglio in enumerate(piano.tagli, 1):
-                    data_tagli.append({
-                        "N°": i,
-                        "Misura (m)": f"{taglio:.3f}",
-                        "Misura (cm)": f"{taglio*100:.1f}",
-                        "Inizio": f"{pos:.3f}m",
-                        "Fine": f"{pos+taglio:.3f}m"
-                    })
-                    pos += taglio
-                
-                df_tagli = pd.DataFrame(data_tagli)
-                st.dataframe(df_tagli, use_container_width=True, hide_index=True)
-                
-                if piano.scarto <= st.session_state.soglia:
-                    st.success(f"✅ Scarto: {piano.scarto:.3f}m - OTTIMALE")
-                else:
-                    st.warning(f"⚠️ Scarto: {piano.scarto:.3f}m - DA RIUTILIZZARE")
-        
-        # Download Excel
-        st.markdown("---")
-        if EXCEL_DISPONIBILE:
-            excel_buffer = crea_excel_download(
-                st.session_state.spezzoni,
-                richieste,
-                risultato,
-                st.session_state.soglia
-            )
-            
-            col_dl1, col_dl2, col_dl3 = st.columns([1, 2, 1])
-            with col_dl2:
-                st.download_button(
-                    label="📥 Scarica Report Excel",
-                    data=excel_buffer,
-                    file_name=f"BestCut_{datetime.now().strftime('%Y%m%d_%H%M')}.xlsx",
-                    mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-                    use_container_width=True
-                )
-        else:
-            st.error("⚠️ openpyxl non installato")
-
-if __name__ == "__main__":
-    main()
+# bestcut_webapp.py
+# Versione con taglio parziale - dice cosa si può fare e cosa manca
+# Interfaccia Streamlit: il motore di calcolo sta nel pacchetto bestcut
+
+import io
+import logging
+import os
+import pstats
+import tempfile
+import uuid
+import streamlit as st
+from datetime import datetime
+import pandas as pd
+
+from bestcut.lavori import misure_da_righe, misure_da_testo, misure_da_file
+from bestcut import (
+    Spezzone, TaglioRichiesto, Variazione, OttimizzatoreTagli, raggruppa_piani,
+    CacheCalcoli, CacheReport, TIPI_MIME, EXCEL_DISPONIBILE,
+    MagazzinoScampoli, calcola_con_scampoli, CodaCalcoli, chiave_istanza, LibreriaPattern,
+    dividi_per_materiale, calcola_per_materiale, riepilogo_materiali, BarraCommerciale, controlla_misure,
+    PianiCompatti
+)
+
+# Statistiche di ogni calcolo come righe JSON sul log del server (BESTCUT_LOG_JSON=1)
+if os.environ.get("BESTCUT_LOG_JSON") and not logging.getLogger("bestcut").handlers:
+    _gestore = logging.StreamHandler()
+    _gestore.setFormatter(logging.Formatter("%(message)s"))
+    logging.getLogger("bestcut").addHandler(_gestore)
+    logging.getLogger("bestcut").setLevel(logging.INFO)
+
+# Configurazione pagina
+st.set_page_config(
+    page_title="BestCut - Taglio Parziale",
+    page_icon="🔧",
+    layout="wide",
+    initial_sidebar_state="expanded"
+)
+
+# CSS personalizzato
+st.markdown("""
+<style>
+    .main-header {
+        font-size: 3rem;
+        font-weight: bold;
+        color: #2196F3;
+        text-align: center;
+        margin-bottom: 0;
+    }
+    .sub-header {
+        font-size: 1.2rem;
+        color: #666;
+        text-align: center;
+        margin-bottom: 2rem;
+    }
+    .partial-box {
+        background-color: #E3F2FD;
+        color: #1565C0;
+        padding: 1rem;
+        border-radius: 10px;
+        border-left: 5px solid #2196F3;
+        margin: 1rem 0;
+    }
+    .success-box {
+        background-color: #d4edda;
+        color: #155724;
+        padding: 1rem;
+        border-radius: 10px;
+        border-left: 5px solid #28a745;
+    }
+    .error-box {
+        background-color: #f8d7da;
+        color: #721c24;
+        padding: 1rem;
+        border-radius: 10px;
+        border-left: 5px solid #dc3545;
+    }
+    .missing-box {
+        background-color: #ffebee;
+        color: #c62828;
+        padding: 1rem;
+        border-radius: 10px;
+        border-left: 5px solid #f44336;
+        margin: 0.5rem 0;
+    }
+</style>
+""", unsafe_allow_html=True)
+
+
+@st.cache_resource
+def cache_condivisa() -> CacheCalcoli:
+    """
+    Una sola cache per processo, condivisa da tutte le sessioni del server.
+    Con la variabile d'ambiente BESTCUT_CACHE_DB si attiva anche il livello su disco.
+    """
+    return CacheCalcoli(percorso=os.environ.get("BESTCUT_CACHE_DB"))
+
+
+@st.cache_resource
+def libreria_condivisa() -> LibreriaPattern:
+    """Libreria dei pattern (SQLite), percorso da BESTCUT_LIBRERIA_DB"""
+    return LibreriaPattern(os.environ.get("BESTCUT_LIBRERIA_DB", "bestcut_pattern.db"))
+
+
+@st.cache_resource
+def magazzino_condiviso() -> MagazzinoScampoli:
+    """Magazzino degli scampoli (SQLite), percorso da BESTCUT_MAGAZZINO_DB"""
+    return MagazzinoScampoli(os.environ.get("BESTCUT_MAGAZZINO_DB", "bestcut_magazzino.db"))
+
+
+@st.cache_resource
+def coda_condivisa() -> CodaCalcoli:
+    """
+    Tutti i calcoli del server passano da qui: al massimo BESTCUT_LAVORATORI alla
+    volta (di default uno per core, fino a 4), a turno tra le sessioni
+    """
+    lavoratori = os.environ.get("BESTCUT_LAVORATORI")
+    return CodaCalcoli(int(lavoratori) if lavoratori else None)
+
+
+@st.cache_resource
+def cache_report() -> CacheReport:
+    """Report già generati, condivisi tra le sessioni"""
+    return CacheReport()
+
+
+def raccogli_misure(tabella, testo: str, file) -> list:
+    """(lunghezza, quantità, materiale) dalla tabella modificata, dal testo incollato e dal file caricato"""
+    misure = misure_da_righe(tabella.itertuples(index=False)) if tabella is not None else []
+    if testo and testo.strip():
+        misure += misure_da_testo(testo)
+    if file is not None:
+        misure += misure_da_file(file, file.name)
+    return misure
+
+
+def errore_misure(spezzoni, richieste) -> str:
+    """Perché le misure non si possono calcolare ("" se vanno bene)"""
+    try:
+        controlla_misure(spezzoni, richieste)
+    except ValueError as e:
+        return str(e)
+    return ""
+
+
+def tabella_misure(misure) -> pd.DataFrame:
+    return pd.DataFrame(misure or [], columns=["Lunghezza (m)", "Quantità", "Materiale"]).astype(
+        {"Lunghezza (m)": float, "Quantità": int, "Materiale": str})
+
+
+def elenco_id(ids, massimo: int = 100) -> str:
+    """ID degli spezzoni con le sequenze consecutive compresse: #3–#9, #12"""
+    intervalli = []
+    for i in sorted(ids):
+        if intervalli and i == intervalli[-1][1] + 1:
+            intervalli[-1][1] = i
+        else:
+            intervalli.append([i, i])
+    testo = ", ".join(f"#{a}" if a == b else f"#{a}–#{b}" for a, b in intervalli[:massimo])
+    if len(intervalli) > massimo:
+        testo += f" … (+{len(intervalli) - massimo} gruppi)"
+    return testo
+
+
+@st.fragment(run_every=0.5)
+def segui_calcolo():
+    """Barra di avanzamento del calcolo in sfondo; ricarica la pagina a ogni piano migliore e alla fine"""
+    calcolo = st.session_state.get("calcolo")
+    if calcolo is None:
+        return
+    frazione, messaggio, _, versione = calcolo.avanzamento.stato()
+    if calcolo.finito or versione != st.session_state.get("versione_mostrata"):
+        st.rerun(scope="app")
+    posizione = calcolo.posizione
+    if posizione:
+        st.progress(0.0, text=f"🕒 In coda: {posizione}° ({calcolo.avanzamento.trascorso:.0f}s)")
+    else:
+        st.progress(frazione, text=f"⏳ {messaggio or 'Calcolo in corso...'} ({calcolo.avanzamento.trascorso:.0f}s)")
+    if st.button("⏹️ Ferma e tieni il piano migliore", use_container_width=True,
+                 disabled=calcolo.avanzamento.annullato, key="annulla_calcolo"):
+        calcolo.annulla()
+
+
+def concludi_calcolo(calcolo):
+    """Il calcolo in sfondo è finito (o è stato fermato): il suo piano diventa quello della pagina"""
+    del st.session_state.calcolo
+    spezzoni, richieste = st.session_state.pop("contesto_calcolo")
+    if calcolo.errore is not None:
+        st.session_state.risultato = None
+        st.error(f"❌ Errore nel calcolo: {calcolo.errore}")
+        return
+    if calcolo.risultato is None:
+        # Fermato mentre era in coda: non è mai partito
+        st.session_state.risultato = None
+        st.info("⏹️ Calcolo fermato prima di partire: nessun piano")
+        return
+    risultato, da_cache, prelievo = calcolo.risultato
+    st.session_state.risultato = risultato
+    st.session_state.da_cache = da_cache
+    st.session_state.prelievo = prelievo
+    st.session_state.scampoli_piano = prelievo.scampoli if prelievo is not None else []
+    if prelievo is not None:
+        st.session_state.sessione_magazzino = prelievo.sessione
+    # Con gli scampoli non si aggiorna solo la modifica: non sono nella lista degli spezzoni
+    aggiornabile = prelievo is None or not prelievo.scampoli
+    st.session_state.spezzoni_calcolo = spezzoni if aggiornabile else None
+    st.session_state.richieste_calcolo = richieste
+    
+    if calcolo.avanzamento.annullato:
+        st.info(f"⏹️ Calcolo fermato dopo {calcolo.avanzamento.trascorso:.1f}s: resta il piano migliore trovato")
+    if risultato.completato:
+        st.success("✅ TAGLIO COMPLETATO! Tutti i pezzi realizzabili")
+    else:
+        st.warning("⚠️ TAGLIO PARZIALE - Materiali insufficienti")
+    st.caption("⚡ Risultato dalla cache" if da_cache else "🧮 Calcolato ora")
+
+
+COLONNE_MISURE = {
+    "Lunghezza (m)": st.column_config.NumberColumn(min_value=0.0, step=0.01, format="%.3f"),
+    "Quantità": st.column_config.NumberColumn(min_value=0, step=1, format="%d"),
+    "Materiale": st.column_config.TextColumn(help="Materiale/profilo: si taglia solo da spezzoni dello stesso"),
+}
+
+
+def main():
+    # Header
+    st.markdown('<p class="main-header">🔧 BestCut v3.2</p>', unsafe_allow_html=True)
+    st.markdown('<p class="sub-header">Ottimizzatore con supporto TAGLIO PARZIALE</p>', unsafe_allow_html=True)
+    
+    # Info
+    st.markdown("""
+    <div class="partial-box">
+        <strong>🆕 NOVITÀ:</strong> Se i tubi non bastano, il programma ti dice cosa riesci a fare 
+        con quello che hai e quanto ne manca!
+    </div>
+    """, unsafe_allow_html=True)
+    
+    # Inizializza session state
+    if 'id_sessione' not in st.session_state:
+        st.session_state.id_sessione = uuid.uuid4().hex
+    if 'spezzoni' not in st.session_state:
+        st.session_state.spezzoni = []
+        st.session_state.prossimo_id = 1
+        st.session_state.risultato = None
+        st.session_state.richieste = None
+        st.session_state.soglia = 0.3
+    
+    # Layout a colonne
+    col1, col2 = st.columns([1, 1])
+    
+    with col1:
+        st.subheader("📦 Spezzoni Disponibili")
+        
+        st.info("💡 Inserisci prima i tubi PIÙ GRANDI")
+        
+        nuovo_spezzone = st.number_input(
+            "Lunghezza spezzone (metri)",
+            min_value=0.0,
+            value=6.0,
+            step=0.1,
+            format="%.2f",
+            key="input_spezzone"
+        )
+        materiale_spezzone = st.text_input(
+            "Materiale / profilo (facoltativo)",
+            key="input_materiale",
+            help="Con più materiali ogni taglio si fa solo dagli spezzoni dello stesso materiale"
+        ).strip()
+        
+        if st.button("➕ Aggiungi Spezzone", use_container_width=True):
+            if nuovo_spezzone > 0:
+                st.session_state.spezzoni.append(
+                    Spezzone(nuovo_spezzone, st.session_state.prossimo_id, materiale_spezzone)
+                )
+                st.session_state.spezzoni.sort(key=lambda x: x.lunghezza, reverse=True)
+                for i, s in enumerate(st.session_state.spezzoni, 1):
+                    s.id = i
+                st.session_state.prossimo_id = len(st.session_state.spezzoni) + 1
+                st.success(f"✅ Aggiunto: {nuovo_spezzone:.2f}m")
+                st.rerun()
+            else:
+                st.error("❌ Lunghezza non valida")
+        
+        # Inserimento in blocco: tutto viene applicato insieme con un solo ricalcolo della pagina
+        with st.expander("📋 Inserimento rapido (tabella, incolla, file)"):
+            with st.form("form_spezzoni", clear_on_submit=True):
+                tabella = st.data_editor(
+                    tabella_misure([]), num_rows="dynamic", column_config=COLONNE_MISURE,
+                    use_container_width=True, hide_index=True, key="editor_spezzoni"
+                )
+                testo = st.text_area("Incolla (una riga per misura: lunghezza [quantità [materiale]])",
+                                     placeholder="6.00\t4\n4,50\t2", key="incolla_spezzoni")
+                file = st.file_uploader("Oppure carica CSV/Excel", type=["csv", "txt", "xlsx"],
+                                        key="file_spezzoni")
+                sostituisci = st.checkbox("Sostituisci gli spezzoni attuali", key="sostituisci_spezzoni")
+                if st.form_submit_button("✅ Applica spezzoni", use_container_width=True):
+                    misure = raccogli_misure(tabella, testo, file)
+                    if misure:
+                        nuovi = [(lunghezza, materiale) for lunghezza, quantita, materiale in misure
+                                 for _ in range(quantita)]
+                        tutti = ([] if sostituisci else [(s.lunghezza, s.materiale) for s in st.session_state.spezzoni]
+                                 ) + nuovi
+                        tutti.sort(key=lambda voce: voce[0], reverse=True)
+                        st.session_state.spezzoni = [Spezzone(l, i, m) for i, (l, m) in enumerate(tutti, 1)]
+                        st.session_state.prossimo_id = len(tutti) + 1
+                        st.session_state.messaggio_spezzoni = f"✅ Aggiunti {len(nuovi)} spezzoni"
+                        st.rerun()
+                    else:
+                        st.error("❌ Nessuna misura valida")
+        messaggio = st.session_state.pop("messaggio_spezzoni", None)
+        if messaggio:
+            st.success(messaggio)
+        
+        if st.session_state.spezzoni:
+            data = [{"ID": s.id, "Lunghezza (m)": f"{s.lunghezza:.2f}", "Lunghezza (cm)": f"{s.lunghezza*100:.0f}",
+                     "Materiale": s.materiale}
+                   for s in st.session_state.spezzoni]
+            df = pd.DataFrame(data)
+            st.dataframe(df, use_container_width=True, hide_index=True)
+            
+            lunghezza_di = {s.id: s.lunghezza for s in st.session_state.spezzoni}
+            id_da_rimuovere = st.selectbox(
+                "Seleziona da rimuovere",
+                options=list(lunghezza_di),
+                format_func=lambda x: f"ID {x} - {lunghezza_di[x]:.2f}m"
+            )
+            
+            col_btn1, col_btn2 = st.columns(2)
+            with col_btn1:
+                if st.button("🗑️ Rimuovi", use_container_width=True):
+                    st.session_state.spezzoni = [s for s in st.session_state.spezzoni if s.id != id_da_rimuovere]
+                    for i, s in enumerate(st.session_state.spezzoni, 1):
+                        s.id = i
+                    st.session_state.prossimo_id = len(st.session_state.spezzoni) + 1
+                    st.success("✅ Rimosso!")
+                    st.rerun()
+            with col_btn2:
+                if st.button("🗑️🗑️ Tutti", use_container_width=True):
+                    st.session_state.spezzoni = []
+                    st.session_state.prossimo_id = 1
+                    st.success("✅ Tutti rimossi!")
+                    st.rerun()
+        else:
+            st.warning("⚠️ Nessuno spezzone inserito")
+    
+    with col2:
+        st.subheader("✂️ Tagli Richiesti")
+        
+        st.session_state.soglia = st.number_input(
+            "Soglia scarto (metri)",
+            min_value=0.0,
+            value=0.3,
+            step=0.05,
+            format="%.2f"
+        )
+        
+        etichette_metodi = {
+            "ffd": "Veloce (uno spezzone alla volta)",
+            "bfd": "Veloce (miglior incastro)",
+            "colgen": "Ottimizzato (generazione di colonne)",
+            "portfolio": "Portafoglio (più varianti in parallelo)",
+            "mbs": "Riempimento ottimo (uno spezzone alla volta)",
+        }
+        metodo = st.selectbox(
+            "Metodo di calcolo",
+            options=list(OttimizzatoreTagli.METODI),
+            format_func=lambda m: etichette_metodi[m],
+            key="metodo"
+        )
+        risoluzione = st.selectbox(
+            "Precisione di calcolo",
+            options=[0.001, 0.0001],
+            format_func=lambda r: "1 mm" if r == 0.001 else "0,1 mm",
+            key="risoluzione"
+        )
+        etichette_carenze = {
+            None: "Taglia finché c'è materiale",
+            "lunghezza": "Massimizza i metri tagliati",
+            "priorita": "Massimizza i metri pesati per priorità",
+        }
+        carenza = st.selectbox(
+            "Se il materiale non basta",
+            options=[None, *OttimizzatoreTagli.CARENZE],
+            format_func=lambda c: etichette_carenze[c],
+            key="carenza"
+        )
+        tempo_limite = 10.0
+        n_varianti, seme = 32, 0
+        if metodo in ("colgen", "portfolio"):
+            tempo_limite = st.number_input(
+                "Tempo massimo (secondi)",
+                min_value=1.0,
+                value=10.0,
+                step=1.0,
+                format="%.0f",
+                key="tempo_limite"
+            )
+        if metodo == "portfolio":
+            col_var, col_seme = st.columns(2)
+            with col_var:
+                n_varianti = st.number_input("Varianti", min_value=3, value=32, step=1, key="n_varianti")
+            with col_seme:
+                seme = st.number_input("Seme", min_value=0, value=0, step=1, key="seme",
+                                       help="Stesso seme = stesso risultato")
+        ricerca_locale = st.number_input(
+            "Miglioramento finale (secondi)",
+            min_value=0.0,
+            value=0.0,
+            step=0.5,
+            format="%.1f",
+            key="ricerca_locale",
+            help="Ricerca locale sul piano trovato: prova a liberare spezzoni e a raccogliere lo scarto in avanzi riutilizzabili"
+        )
+        profila = st.checkbox(
+            "🔬 Registra profilo (cProfile)",
+            key="profila",
+            help="Per capire dove va il tempo: il calcolo è più lento e non usa la cache"
+        )
+        usa_magazzino = st.checkbox(
+            "🗃️ Usa prima gli scampoli del magazzino",
+            key="usa_magazzino",
+            help="Gli scarti DA RIUTILIZZARE dei tagli confermati restano in magazzino per i lavori successivi"
+        )
+        if usa_magazzino:
+            st.caption(f"Scampoli disponibili in magazzino: {magazzino_condiviso().conta()}")
+        usa_libreria = st.checkbox(
+            "📚 Riparti dai pattern degli ordini precedenti",
+            key="usa_libreria",
+            help="I pattern con poco scarto di ogni calcolo restano in libreria; gli ordini con le stesse "
+                 "misure li riusano (generazione di colonne, FFD, BFD e ricerca locale)"
+        )
+        if usa_libreria:
+            st.caption(f"Pattern in libreria: {libreria_condivisa().conta()}")
+        
+        st.markdown("---")
+        # Tagli: tabella senza limite di righe, modificata in un form (un solo ricalcolo
+        # della pagina quando si applica), più testo incollato e file caricati
+        if "tagli" not in st.session_state:
+            st.session_state.tagli = [(3.2, 1, ""), (0.5, 5, "")]
+            st.session_state.versione_tagli = 0
+        with st.form("form_tagli", clear_on_submit=True):
+            tabella = st.data_editor(
+                tabella_misure(st.session_state.tagli), num_rows="dynamic", column_config=COLONNE_MISURE,
+                use_container_width=True, hide_index=True, key=f"editor_tagli_{st.session_state.versione_tagli}"
+            )
+            with st.expander("📋 Incolla o carica file"):
+                testo = st.text_area("Incolla (una riga per misura: lunghezza [quantità [materiale]])",
+                                     placeholder="3,20\t10\n0,50\t25", key="incolla_tagli")
+                file = st.file_uploader("Carica CSV/Excel", type=["csv", "txt", "xlsx"], key="file_tagli")
+                sostituisci = st.checkbox("Sostituisci la tabella", key="sostituisci_tagli")
+            if st.form_submit_button("✅ Applica tagli", use_container_width=True):
+                da_fuori = raccogli_misure(None, testo, file)
+                misure = (da_fuori if sostituisci and da_fuori else
+                          misure_da_righe(tabella.itertuples(index=False)) + da_fuori)
+                # Stessa misura e materiale su più righe: una riga sola con la somma
+                quantita = {}
+                for lunghezza, n, materiale in misure:
+                    quantita[lunghezza, materiale] = quantita.get((lunghezza, materiale), 0) + n
+                st.session_state.tagli = [(lunghezza, n, materiale)
+                                          for (lunghezza, materiale), n in sorted(quantita.items(), reverse=True)]
+                st.session_state.versione_tagli += 1
+                st.rerun()
+        
+        # Priorità per misura: contano solo con "Massimizza i metri pesati per priorità"
+        priorita = st.session_state.setdefault("priorita", {})
+        if carenza == "priorita" and st.session_state.tagli:
+            with st.form("form_priorita"):
+                tabella_priorita = st.data_editor(
+                    pd.DataFrame([{"Lunghezza (m)": lunghezza, "Priorità": priorita.get(lunghezza, 1.0)}
+                                  for lunghezza in dict.fromkeys(l for l, _, _ in st.session_state.tagli)]),
+                    column_config={"Priorità": st.column_config.NumberColumn(min_value=0.0, step=0.5)},
+                    disabled=["Lunghezza (m)"], use_container_width=True, hide_index=True,
+                    key=f"editor_priorita_{st.session_state.versione_tagli}"
+                )
+                if st.form_submit_button("✅ Applica priorità", use_container_width=True):
+                    st.session_state.priorita = {
+                        float(lunghezza): float(valore)
+                        for lunghezza, valore in tabella_priorita.itertuples(index=False)
+                        if pd.notna(valore)
+                    }
+                    st.rerun()
+        
+        richieste = [TaglioRichiesto(lunghezza, n, priorita.get(lunghezza, 1.0) if carenza == "priorita" else 1.0,
+                                     materiale)
+                     for lunghezza, n, materiale in st.session_state.tagli]
+        richieste.sort(key=lambda x: x.lunghezza, reverse=True)
+        st.session_state.richieste = richieste
+        
+        st.markdown("---")
+        st.write(f"**{len(richieste)} tipi di tagli configurati**")
+    
+    # Bottone calcola
+    st.markdown("---")
+    col_center = st.columns([1, 2, 1])
+    with col_center[1]:
+        if st.button("🚀 CALCOLA (anche parziale)", use_container_width=True, type="primary"):
+            errore = errore_misure(st.session_state.spezzoni, richieste)
+            if not st.session_state.spezzoni:
+                st.error("❌ Aggiungi almeno uno spezzone!")
+            elif not richieste:
+                st.error("❌ Inserisci almeno un taglio!")
+            elif errore:
+                st.error(f"❌ {errore}")
+            else:
+                in_corso = st.session_state.get("calcolo")
+                if in_corso is not None:
+                    in_corso.annulla()  # il nuovo calcolo sostituisce quello in corso
+                profilo = None
+                if profila:
+                    profilo = os.path.join(tempfile.gettempdir(), f"bestcut_{id(st.session_state)}.pstats")
+                ottim = OttimizzatoreTagli(st.session_state.soglia, metodo, tempo_limite, risoluzione,
+                                           n_varianti=int(n_varianti), seme=int(seme), profilo=profilo,
+                                           carenza=carenza, ricerca_locale=ricerca_locale,
+                                           libreria=libreria_condivisa() if usa_libreria else None)
+                # Controllo immediato, prima di mettersi in coda: si sa subito se il materiale non basta
+                # (per ogni materiale: il primo che non basta)
+                parti = dividi_per_materiale(st.session_state.spezzoni, richieste)
+                st.session_state.controllo = None
+                for materiale, (spezzoni_m, richieste_m) in parti.items():
+                    controllo = ottim.controlla_materiale(spezzoni_m, richieste_m)
+                    if len(parti) > 1 and controllo.carenza:
+                        controllo.motivo = f"{materiale or 'senza materiale'}: {controllo.motivo}"
+                    if st.session_state.controllo is None or controllo.carenza:
+                        st.session_state.controllo = controllo
+                    if controllo.carenza:
+                        break
+                per_materiale = len(parti) > 1
+                if per_materiale and usa_magazzino:
+                    st.info("🗃️ Con più materiali il magazzino scampoli non si usa: non ne distingue il materiale")
+                # Copie e risorse condivise prese qui: il thread del calcolo non tocca la sessione
+                spezzoni = [Spezzone(s.lunghezza, s.id, s.materiale) for s in st.session_state.spezzoni]
+                magazzino = magazzino_condiviso() if usa_magazzino and not per_materiale else None
+                cache = cache_condivisa()
+                sessione = st.session_state.get("sessione_magazzino")
+                
+                def calcolo(avanzamento):
+                    if per_materiale:
+                        # Un calcolo per materiale, in parallelo sui core del server
+                        return calcola_per_materiale(ottim, spezzoni, richieste, avanzamento=avanzamento), False, None
+                    if magazzino is not None:
+                        # Il magazzino cambia tra un calcolo e l'altro: niente cache
+                        prelievo = calcola_con_scampoli(ottim, magazzino, spezzoni, richieste, sessione, avanzamento)
+                        return prelievo.risultato, False, prelievo
+                    if profila:
+                        return ottim.calcola_ottimale(spezzoni, richieste, avanzamento), False, None
+                    risultato, da_cache = cache.calcola(ottim, spezzoni, richieste, avanzamento)
+                    return risultato, da_cache, None
+                
+                # Situazione del calcolo, per poter poi aggiornare solo le modifiche
+                st.session_state.contesto_calcolo = (list(spezzoni), list(richieste))
+                st.session_state.risultato = None
+                st.session_state.prelievo = None
+                st.session_state.scampoli_piano = []
+                # Stesso calcolo già in coda da un'altra sessione: si aspetta quello
+                chiave = (None if magazzino is not None or profila or per_materiale
+                          else chiave_istanza(spezzoni, richieste, ottim))
+                st.session_state.calcolo = coda_condivisa().invia(st.session_state.id_sessione, calcolo, chiave)
+                # I calcoli rapidi finiscono subito: nessuna barra per loro
+                st.session_state.calcolo.attendi(0.25)
+        
+        controllo = st.session_state.get("controllo")
+        if controllo is not None and controllo.carenza:
+            st.warning(f"⚠️ Materiale insufficiente: {controllo.motivo}")
+        
+        calcolo = st.session_state.get("calcolo")
+        if calcolo is not None:
+            if calcolo.finito:
+                concludi_calcolo(calcolo)
+                calcolo = None
+            else:
+                # Intanto si mostra il piano migliore trovato finora
+                _, _, migliore, versione = calcolo.avanzamento.stato()
+                st.session_state.risultato = migliore
+                st.session_state.versione_mostrata = versione
+                segui_calcolo()
+        
+        with st.expander("🖥️ Carico del server"):
+            metriche = coda_condivisa().metriche()
+            st.dataframe(pd.DataFrame([{"Voce": nome, "Valore": "-" if valore is None else str(valore)}
+                                       for nome, valore in metriche.items()]),
+                         use_container_width=True, hide_index=True)
+        
+        prelievo = st.session_state.get("prelievo")
+        if st.session_state.risultato and prelievo is not None and calcolo is None:
+            if prelievo.scampoli:
+                st.info(f"🗃️ Scampoli dal magazzino: {len(prelievo.scampoli)} (ID piano "
+                        f"{', '.join(f'#{s.id}' for s in prelievo.scampoli)})")
+            if st.button("📦 CONFERMA TAGLIO (aggiorna magazzino)", use_container_width=True):
+                magazzino = magazzino_condiviso()
+                magazzino.consuma(prelievo.sessione, prelievo.scampoli_usati())
+                nuovi = magazzino.assorbi(st.session_state.risultato, st.session_state.soglia,
+                                          origine=datetime.now().strftime('%Y-%m-%d %H:%M'))
+                st.session_state.prelievo = None
+                st.success(f"📦 Magazzino aggiornato: {len(prelievo.scampoli)} scampoli tagliati, "
+                           f"{nuovi} nuovi scampoli da riutilizzare")
+        
+        if (st.session_state.risultato and st.session_state.get("spezzoni_calcolo") is not None
+                and calcolo is None):
+            if st.button("♻️ AGGIORNA PIANO (solo le modifiche)", use_container_width=True):
+                variazione = Variazione.confronta(
+                    st.session_state.spezzoni_calcolo, st.session_state.spezzoni,
+                    st.session_state.richieste_calcolo, richieste
+                )
+                if variazione.vuota():
+                    st.info("Nessuna modifica dall'ultimo calcolo")
+                else:
+                    ottim = OttimizzatoreTagli(st.session_state.soglia, risoluzione=risoluzione)
+                    try:
+                        aggiornato = ottim.ripianifica(st.session_state.risultato, st.session_state.spezzoni,
+                                                       variazione)
+                    except ValueError as e:
+                        st.error(f"❌ {e}")
+                    else:
+                        st.session_state.risultato = aggiornato
+                        st.session_state.spezzoni_calcolo = [Spezzone(s.lunghezza, s.id, s.materiale)
+                                                             for s in st.session_state.spezzoni]
+                        st.session_state.richieste_calcolo = list(richieste)
+                        st.success(
+                            f"♻️ Piano aggiornato: spezzoni +{len(variazione.spezzoni_aggiunti)}"
+                            f"/-{len(variazione.spezzoni_rimossi)}, tagli "
+                            f"+{sum(r.quantita for r in variazione.tagli_aggiunti)}"
+                            f"/-{sum(r.quantita for r in variazione.tagli_rimossi)}"
+                        )
+    
+    # Risultati
+    if st.session_state.risultato:
+        st.markdown("---")
+        
+        risultato = st.session_state.risultato
+        richieste = st.session_state.richieste
+        
+        if calcolo is not None:
+            st.info("🔄 Piano provvisorio: è il migliore trovato finora, il calcolo continua a cercarne uno migliore")
+        
+        # Box stato
+        if risultato.completato:
+            st.markdown('<div class="success-box">✅ <strong>COMPLETATO!</strong> Tutti i tagli sono realizzabili con gli spezzoni disponibili.</div>', unsafe_allow_html=True)
+        else:
+            st.markdown('<div class="partial-box">⚠️ <strong>PARZIALE!</strong> Con gli spezzoni disponibili riesci a fare solo una parte dei tagli richiesti.</div>', unsafe_allow_html=True)
+        
+        # Metriche
+        scarto_tot = risultato.scarto_totale
+        # Dagli array degli schemi: a ogni rerun, senza creare un PianoTaglio per spezzone
+        usato = PianiCompatti.da_piani(risultato.piani).lunghezza_totale()
+        efficienza = (1 - scarto_tot/usato)*100 if usato else 0
+        
+        col_m1, col_m2, col_m3, col_m4 = st.columns(4)
+        with col_m1:
+            st.metric("Spezzoni usati", f"{risultato.spezzoni_usati}/{risultato.spezzoni_totali}")
+        with col_m2:
+            st.metric("Scarto totale", f"{scarto_tot:.3f}m")
+        with col_m3:
+            st.metric("Efficienza", f"{efficienza:.1f}%")
+        with col_m4:
+            risparmiati = risultato.spezzoni_totali - risultato.spezzoni_usati
+            st.metric("💰 Risparmiati", risparmiati if risparmiati > 0 else 0)
+        
+        if risultato.materiali is not None:
+            st.subheader("🧱 Riepilogo per Materiale")
+            st.dataframe(pd.DataFrame([{
+                "Materiale": voce["materiale"] or "-",
+                "Stato": "🟢 Completo" if voce["completato"] else "🟡 Parziale",
+                "Spezzoni usati": f"{voce['spezzoni_usati']}/{voce['spezzoni_totali']}",
+                "Scarto (m)": f"{voce['scarto_totale']:.3f}",
+                "Tubo mancante (m)": f"{voce['tubo_mancante']:.2f}",
+                "Tagli mancanti": ", ".join(f"{misura:g} x{n}" for misura, n in voce["tagli_mancanti"]) or "-",
+            } for voce in riepilogo_materiali(risultato)]), use_container_width=True, hide_index=True)
+        
+        if risultato.limite_inferiore is not None:
+            distanza = max(0.0, scarto_tot - risultato.limite_inferiore)
+            st.info(f"📐 Scarto minimo teorico: {risultato.limite_inferiore:.3f}m "
+                    f"(il piano è al massimo {distanza:.3f}m dall'ottimo)")
+        
+        statistiche = risultato.statistiche
+        if statistiche is not None:
+            with st.expander(f"⏱️ Statistiche del calcolo ({statistiche.totale * 1000:.1f} ms)"):
+                col_fasi, col_contatori = st.columns(2)
+                with col_fasi:
+                    st.dataframe(pd.DataFrame([{"Fase": nome, "Tempo (ms)": f"{durata * 1000:.2f}"}
+                                               for nome, durata in statistiche.fasi.items()]),
+                                 use_container_width=True, hide_index=True)
+                with col_contatori:
+                    if statistiche.contatori:
+                        st.dataframe(pd.DataFrame([{"Contatore": nome, "Valore": n}
+                                                   for nome, n in statistiche.contatori.items()]),
+                                     use_container_width=True, hide_index=True)
+                if statistiche.profilo and os.path.exists(statistiche.profilo):
+                    testo = io.StringIO()
+                    pstats.Stats(statistiche.profilo, stream=testo).sort_stats("cumulative").print_stats(25)
+                    st.code(testo.getvalue(), language=None)
+                    with open(statistiche.profilo, "rb") as file:
+                        st.download_button("📥 Profilo (pstats)", data=file.read(), file_name="bestcut.pstats",
+                                           mime="application/octet-stream")
+        
+        # Tabella riepilogo: Richiesti vs Fatti vs Mancanti
+        st.subheader("📊 Riepilogo Tagli")
+        
+        data_riep = []
+        for rich in richieste:
+            # Con più materiali la stessa misura può comparire in più materiali: si conta nel suo
+            parte = risultato.materiali.get(rich.materiale, risultato) if risultato.materiali else risultato
+            fatti = parte.tagli_fatti.get(rich.lunghezza, 0)
+            mancanti = parte.tagli_mancanti.get(rich.lunghezza, 0)
+            
+            data_riep.append({
+                **({"Materiale": rich.materiale or "-"} if risultato.materiali else {}),
+                "Misura": f"{rich.lunghezza:.2f}m",
+                "Richiesti": rich.quantita,
+                "✅ Fatti": fatti,
+                "❌ Mancanti": mancanti if mancanti > 0 else "-",
+                "Stato": "🟢 OK" if mancanti == 0 else f"🟡 Mancano {mancanti}"
+            })
+        
+        df_riep = pd.DataFrame(data_riep)
+        st.dataframe(df_riep, use_container_width=True, hide_index=True)
+        
+        # Avviso se manca qualcosa
+        if not risultato.completato:
+            st.markdown("---")
+            st.subheader("❌ Tagli Mancanti")
+            
+            for misura, qty in risultato.tagli_mancanti.items():
+                st.markdown(f"""
+                <div class="missing-box">
+                    <strong>{misura:.2f}m</strong>: mancano <strong>{qty} pezzi</strong><br>
+                    <small>Servono altri {misura * qty:.2f}m di tubo per completare</small>
+                </div>
+                """, unsafe_allow_html=True)
+            
+            totale_mancante = sum(misura * qty for misura, qty in risultato.tagli_mancanti.items())
+            st.info(f"💡 In totale mancano {totale_mancante:.2f}m di tubo per completare tutti i tagli")
+            
+            # Cosa comprare: prima gli spezzoni che ci sono, poi barre commerciali al costo minimo
+            with st.expander("🛒 Cosa comprare (barre commerciali)", expanded=True):
+                with st.form("form_catalogo"):
+                    tabella_catalogo = st.data_editor(
+                        pd.DataFrame(st.session_state.setdefault("catalogo", [(6.0, 10.0), (12.0, 18.0)]),
+                                     columns=["Lunghezza (m)", "Costo"]),
+                        num_rows="dynamic", use_container_width=True, hide_index=True, key="editor_catalogo",
+                        column_config={
+                            "Lunghezza (m)": st.column_config.NumberColumn(min_value=0.0, step=0.5, format="%.2f"),
+                            "Costo": st.column_config.NumberColumn(min_value=0.0, step=0.5, format="%.2f",
+                                                                   help="Costo di una barra"),
+                        }
+                    )
+                    if st.form_submit_button("🛒 Calcola acquisto", use_container_width=True):
+                        catalogo = [BarraCommerciale(float(lunghezza), float(costo))
+                                    for lunghezza, costo in tabella_catalogo.itertuples(index=False)
+                                    if pd.notna(lunghezza) and pd.notna(costo) and lunghezza > 0 and costo >= 0]
+                        st.session_state.catalogo = [(barra.lunghezza, barra.costo) for barra in catalogo]
+                        if not catalogo:
+                            st.error("❌ Inserisci almeno una barra con lunghezza e costo")
+                        else:
+                            # Un acquisto per ogni materiale che non basta (con un solo materiale, per tutto)
+                            parti = dividi_per_materiale(st.session_state.spezzoni, richieste)
+                            if risultato.materiali is not None:
+                                parti = {materiale: parte for materiale, parte in parti.items()
+                                         if materiale in risultato.materiali
+                                         and not risultato.materiali[materiale].completato}
+                            ottim = OttimizzatoreTagli(st.session_state.soglia, tempo_limite=tempo_limite,
+                                                       risoluzione=risoluzione)
+                            with st.spinner("🛒 Calcolo dell'acquisto..."):
+                                st.session_state.acquisto = {
+                                    materiale: ottim.pianifica_acquisti(spezzoni_m, richieste_m, catalogo)
+                                    for materiale, (spezzoni_m, richieste_m) in parti.items()}
+                            st.session_state.acquisto_di = risultato
+                
+                acquisto = st.session_state.get("acquisto") if st.session_state.get("acquisto_di") is risultato else None
+                if acquisto:
+                    costo_di = {}
+                    for lunghezza, costo in st.session_state.catalogo:
+                        costo_di[lunghezza] = min(costo, costo_di.get(lunghezza, costo))
+                    righe = [{
+                        **({"Materiale": materiale or "-"} if risultato.materiali is not None else {}),
+                        "Barra (m)": f"{lunghezza:g}",
+                        "Quantità": n,
+                        "Costo": f"{costo_di[lunghezza] * n:.2f}",
+                    } for materiale, piano in acquisto.items() for lunghezza, n in piano.acquisti.items()]
+                    if righe:
+                        st.dataframe(pd.DataFrame(righe), use_container_width=True, hide_index=True)
+                    costo_totale = sum(piano.costo_totale for piano in acquisto.values())
+                    minimi = [piano.costo_minimo for piano in acquisto.values()]
+                    st.metric("Costo dell'acquisto", f"{costo_totale:.2f}")
+                    if None not in minimi:
+                        st.caption(f"📐 Costo minimo teorico: {sum(minimi):.2f}")
+                    incompleti = [piano for piano in acquisto.values() if not piano.risultato.completato]
+                    if incompleti:
+                        st.warning("⚠️ Alcune misure sono più lunghe di ogni barra del catalogo: restano mancanti")
+                    if righe and st.button("➕ Aggiungi le barre comprate agli spezzoni", use_container_width=True):
+                        nuove = [(lunghezza, materiale) for materiale, piano in acquisto.items()
+                                 for lunghezza, n in piano.acquisti.items() for _ in range(n)]
+                        tutti = [(s.lunghezza, s.materiale) for s in st.session_state.spezzoni] + nuove
+                        tutti.sort(key=lambda voce: voce[0], reverse=True)
+                        st.session_state.spezzoni = [Spezzone(l, i, m) for i, (l, m) in enumerate(tutti, 1)]
+                        st.session_state.prossimo_id = len(tutti) + 1
+                        st.session_state.acquisto = None
+                        st.session_state.messaggio_spezzoni = (f"✅ Aggiunte {len(nuove)} barre comprate: "
+                                                               "ricalcola il piano")
+                        st.rerun()
+        
+        # Dettaglio piano di taglio
+        st.markdown("---")
+        st.subheader("🔧 Piano di Taglio Dettagliato")
+        
+        # Schemi uguali raggruppati: la pagina cresce con gli schemi distinti, non con gli spezzoni
+        if st.session_state.get("gruppi_di") is not risultato:
+            st.session_state.gruppi = raggruppa_piani(risultato.piani)
+            st.session_state.gruppi_di = risultato
+            st.session_state.pagina_gruppi = 1
+        gruppi = st.session_state.gruppi
+        st.caption(f"{len(gruppi)} schemi di taglio diversi per {len(risultato.piani)} spezzoni")
+        
+        col_pag1, col_pag2 = st.columns(2)
+        with col_pag1:
+            per_pagina = st.selectbox("Schemi per pagina", [25, 50, 100], key="per_pagina")
+        pagine = max(1, -(-len(gruppi) // per_pagina))
+        with col_pag2:
+            pagina = st.number_input(f"Pagina (di {pagine})", min_value=1, max_value=pagine,
+                                     step=1, key="pagina_gruppi")
+        inizio = (pagina - 1) * per_pagina
+        pagina_gruppi = gruppi[inizio:inizio + per_pagina]
+        
+        df_gruppi = pd.DataFrame([{
+            "Schema": inizio + k + 1,
+            "Spezzone (m)": f"{g.spezzone_lunghezza:.3f}",
+            "× Spezzoni": g.quantita,
+            "Tagli (m)": " + ".join(f"{t:g}" for t in g.tagli),
+            "Scarto (m)": f"{g.scarto:.3f}",
+            "Stato": "🟢 OTTIMALE" if g.scarto <= st.session_state.soglia else "🟡 DA RIUTILIZZARE",
+        } for k, g in enumerate(pagina_gruppi)])
+        scelta = st.dataframe(df_gruppi, use_container_width=True, hide_index=True,
+                              on_select="rerun", selection_mode="single-row", key="tabella_gruppi")
+        
+        # Dettaglio (inizio/fine di ogni taglio) solo per lo schema selezionato
+        righe_scelte = scelta.selection.rows if scelta is not None else []
+        if righe_scelte and righe_scelte[0] < len(pagina_gruppi):
+            gruppo = pagina_gruppi[righe_scelte[0]]
+            ids = elenco_id(gruppo.spezzone_ids)
+            st.markdown(f"**Schema {inizio + righe_scelte[0] + 1}** — {gruppo.quantita} × spezzone "
+                        f"{gruppo.spezzone_lunghezza:.3f}m: {ids}")
+            data_tagli = []
+            pos = 0.0
+            for i, taglio in enumerate(gruppo.tagli, 1):
+                data_tagli.append({
+                    "N°": i,
+                    "Misura (m)": f"{taglio:.3f}",
+                    "Misura (cm)": f"{taglio*100:.1f}",
+                    "Inizio": f"{pos:.3f}m",
+                    "Fine": f"{pos+taglio:.3f}m"
+                })
+                pos += taglio
+            st.dataframe(pd.DataFrame(data_tagli), use_container_width=True, hide_index=True)
+            
+            if gruppo.scarto <= st.session_state.soglia:
+                st.success(f"✅ Scarto: {gruppo.scarto:.3f}m - OTTIMALE")
+            else:
+                st.warning(f"⚠️ Scarto: {gruppo.scarto:.3f}m - DA RIUTILIZZARE")
+        else:
+            st.caption("Seleziona una riga per vedere posizioni di taglio e spezzoni")
+        
+        # Download: il file viene generato solo al clic, e una volta sola per lo stesso piano
+        st.markdown("---")
+        spezzoni_report = list(st.session_state.spezzoni)
+        spezzoni_report += st.session_state.get("scampoli_piano", [])
+        richieste_report = list(richieste)
+        soglia_report = st.session_state.soglia
+        cache = cache_report()
+
+        def scaricabile(formato):
+            return lambda: cache.genera(formato, spezzoni_report, richieste_report, risultato, soglia_report)
+
+        nome_file = f"BestCut_{datetime.now().strftime('%Y%m%d_%H%M')}"
+        col_dl1, col_dl2, col_dl3 = st.columns([1, 2, 1])
+        with col_dl2:
+            if EXCEL_DISPONIBILE:
+                st.download_button(
+                    label="📥 Scarica Report Excel",
+                    data=scaricabile("xlsx"),
+                    file_name=f"{nome_file}.xlsx",
+                    mime=TIPI_MIME["xlsx"],
+                    use_container_width=True
+                )
+            else:
+                st.error("⚠️ openpyxl non installato")
+
+            if len(risultato.piani) > 2000:
+                st.caption("Piano molto grande: CSV e JSON sono più rapidi da generare e aprire")
+            col_csv, col_json = st.columns(2)
+            with col_csv:
+                st.download_button("📄 CSV", data=scaricabile("csv"), file_name=f"{nome_file}.csv",
+                                   mime=TIPI_MIME["csv"], use_container_width=True)
+            with col_json:
+                st.download_button("🧾 JSON", data=scaricabile("json"), file_name=f"{nome_file}.json",
+                                   mime=TIPI_MIME["json"], use_container_width=True)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,2 @@
+# tests/__init__.py
+# Test del motore (pytest): python -m pytest
@@ -0,0 +1,64 @@
+# tests/test_cache.py
+# Cache dei calcoli: chiave canonica (lunghezze, materiali, opzioni), ID rimappati, SQLite su disco
+
+from bestcut import CacheCalcoli, Spezzone, TaglioRichiesto, chiave_calcolo
+from bestcut.coda import chiave_istanza
+
+from .verifiche import controlla_piano, ordine, ottimizzatore
+
+
+def test_chiave_non_dipende_da_ordine_e_id():
+    spezzoni, richieste = ordine(1)
+    rinumerati = [Spezzone(s.lunghezza, s.id + 50, s.materiale) for s in reversed(spezzoni)]
+    calcolatore = ottimizzatore()
+    assert chiave_calcolo(spezzoni, richieste, calcolatore) == chiave_calcolo(rinumerati, richieste[::-1], calcolatore)
+    assert chiave_calcolo(spezzoni, richieste, calcolatore) != chiave_calcolo(spezzoni, richieste, ottimizzatore("bfd"))
+
+
+def test_chiave_con_i_materiali():
+    calcolatore = ottimizzatore()
+    spezzoni = [Spezzone(6.0, 1, "inox"), Spezzone(6.0, 2, "ferro")]
+    chiavi = {
+        chiave_calcolo(spezzoni, [TaglioRichiesto(2.0, 2, materiale="inox")], calcolatore),
+        chiave_calcolo(spezzoni, [TaglioRichiesto(2.0, 2, materiale="ferro")], calcolatore),
+        chiave_calcolo([Spezzone(6.0, 1, "inox"), Spezzone(6.0, 2, "inox")],
+                       [TaglioRichiesto(2.0, 2, materiale="inox")], calcolatore),
+    }
+    assert len(chiavi) == 3
+    # Nella coda conta anche quale spezzone (per ID) è di quale materiale
+    scambiati = [Spezzone(6.0, 1, "ferro"), Spezzone(6.0, 2, "inox")]
+    richieste = [TaglioRichiesto(2.0, 2, materiale="inox")]
+    assert chiave_istanza(spezzoni, richieste, calcolatore) != chiave_istanza(scambiati, richieste, calcolatore)
+
+
+def test_risultato_dalla_cache(tmp_path):
+    spezzoni, richieste = ordine(2)
+    cache = CacheCalcoli(percorso=str(tmp_path / "cache.db"))
+    primo, da_cache = cache.calcola(ottimizzatore(), spezzoni, richieste)
+    assert not da_cache
+    rinumerati = [Spezzone(s.lunghezza, s.id + 50) for s in spezzoni]
+    secondo, da_cache = cache.calcola(ottimizzatore(), rinumerati, richieste)
+    assert da_cache
+    controlla_piano(secondo, rinumerati, richieste)
+    assert secondo.scarto_totale == primo.scarto_totale
+    # Da disco, con la memoria vuota
+    terzo, da_cache = CacheCalcoli(percorso=str(tmp_path / "cache.db")).calcola(ottimizzatore(), spezzoni, richieste)
+    assert da_cache and list(terzo.piani) == list(primo.piani)
+
+
+def test_risultato_per_materiale_dalla_cache():
+    spezzoni = [Spezzone(6.0, 1, "inox"), Spezzone(6.0, 2, "ferro"), Spezzone(4.0, 3, "ferro")]
+    richieste = [TaglioRichiesto(2.0, 2, materiale="inox"), TaglioRichiesto(3.5, 1, materiale="ferro")]
+    cache = CacheCalcoli()
+    primo, _ = cache.calcola(ottimizzatore(), spezzoni, richieste)
+    # Stesse lunghezze e materiali con ID e ordine diversi: ogni piano resta sul suo materiale
+    altri = [Spezzone(6.0, 11, "ferro"), Spezzone(4.0, 13, "ferro"), Spezzone(6.0, 12, "inox")]
+    secondo, da_cache = cache.calcola(ottimizzatore(), altri, richieste)
+    assert da_cache
+    controlla_piano(secondo, altri, richieste)
+    assert [p.spezzone_id for p in secondo.materiali["inox"].piani] == [12]
+    assert set(secondo.materiali) == set(primo.materiali)
+    # Un altro modo di dividere gli stessi spezzoni tra i materiali non è lo stesso calcolo
+    _, da_cache = cache.calcola(ottimizzatore(), altri, [TaglioRichiesto(2.0, 2, materiale="ferro"),
+                                                         TaglioRichiesto(3.5, 1, materiale="ferro")])
+    assert not da_cache
@@ -0,0 +1,66 @@
+# tests/test_carenza.py
+# Materiale che non basta: piano che massimizza i metri tagliati, o il valore con le priorità
+
+import pytest
+
+from bestcut import OttimizzatoreTagli, Spezzone, TaglioRichiesto
+
+from .verifiche import controlla_piano, ordine, ottimizzatore
+
+
+@pytest.mark.parametrize("metodo", OttimizzatoreTagli.METODI)
+@pytest.mark.parametrize("carenza", OttimizzatoreTagli.CARENZE)
+def test_piano_valido(metodo, carenza):
+    # Piano parziale ma valido, con i mancanti giusti
+    spezzoni, richieste = ordine(3, n_spezzoni=6, n_misure=10)
+    risultato = ottimizzatore(metodo, carenza=carenza).calcola_ottimale(spezzoni, richieste)
+    controlla_piano(risultato, spezzoni, richieste)
+    assert not risultato.completato
+    assert risultato.tagli_mancanti
+
+
+@pytest.mark.parametrize("metodo", OttimizzatoreTagli.METODI)
+def test_lunghezza_e_priorita(metodo):
+    # Uno spezzone da 6 m: due pezzi da 3 m (6 m tagliati) o uno da 4 m con priorità alta
+    spezzoni = [Spezzone(6.0, 1)]
+    richieste = [TaglioRichiesto(4.0, 1, priorita=10.0), TaglioRichiesto(3.0, 2, priorita=1.0)]
+    per_lunghezza = ottimizzatore(metodo, carenza="lunghezza").calcola_ottimale(spezzoni, richieste)
+    per_priorita = ottimizzatore(metodo, carenza="priorita").calcola_ottimale(spezzoni, richieste)
+    controlla_piano(per_lunghezza, spezzoni, richieste)
+    controlla_piano(per_priorita, spezzoni, richieste)
+    assert per_lunghezza.tagli_fatti == {3.0: 2}
+    assert per_priorita.tagli_fatti == {4.0: 1}
+
+
+def test_meglio_del_taglio_semplice():
+    # L'FFD mette il 4 nel primo spezzone e spreca il resto; l'obiettivo "lunghezza" no
+    spezzoni = [Spezzone(6.0, 1), Spezzone(6.0, 2)]
+    richieste = [TaglioRichiesto(4.0, 2), TaglioRichiesto(3.0, 4)]
+    semplice = ottimizzatore("ffd").calcola_ottimale(spezzoni, richieste)
+    carenza = ottimizzatore("ffd", carenza="lunghezza").calcola_ottimale(spezzoni, richieste)
+    controlla_piano(carenza, spezzoni, richieste)
+    metri = lambda r: sum(m * n for m, n in r.tagli_fatti.items())
+    assert metri(carenza) == pytest.approx(12.0)
+    assert metri(carenza) > metri(semplice)
+
+
+def test_materiale_che_basta():
+    # Senza carenza il piano è quello del metodo, completo
+    spezzoni, richieste = ordine(1)
+    risultato = ottimizzatore("ffd", carenza="lunghezza").calcola_ottimale(spezzoni, richieste)
+    controlla_piano(risultato, spezzoni, richieste)
+    assert risultato.completato
+    assert "carenze_rilevate" not in risultato.statistiche.contatori
+
+
+def test_controlla_materiale():
+    controllo = ottimizzatore().controlla_materiale([Spezzone(6.0, 1)],
+                                                     [TaglioRichiesto(4.0, 2), TaglioRichiesto(7.0, 1)])
+    assert controllo.carenza
+    assert controllo.misure_troppo_lunghe == [7.0]
+    assert controllo.metri_richiesti == pytest.approx(15.0)
+
+
+def test_carenza_sconosciuta():
+    with pytest.raises(ValueError):
+        OttimizzatoreTagli(carenza="metri")
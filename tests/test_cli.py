@@ -0,0 +1,140 @@
+# tests/test_cli.py
+# Riga di comando e motore importabile: lotti JSONL/CSV/Excel, ordini non validi, codici d'uscita
+
+import json
+import multiprocessing
+import os
+import subprocess
+import sys
+
+import pytest
+
+from bestcut.cli import main
+
+ORDINE_A = {"id": "A", "spezzoni": [[6.0, 2]], "richieste": [[2.4, 3]]}
+
+
+def _scrivi(percorso, righe):
+    percorso.write_text("".join(json.dumps(r) + "\n" for r in righe), encoding="utf-8")
+
+
+def _leggi(percorso):
+    return [json.loads(riga) for riga in percorso.read_text(encoding="utf-8").splitlines()]
+
+
+def test_motore_senza_streamlit():
+    # Il pacchetto si importa (e calcola) senza caricare l'interfaccia né openpyxl
+    codice = ("import sys, bestcut; "
+              "bestcut.OttimizzatoreTagli().calcola_ottimale([bestcut.Spezzone(6.0, 1)], [bestcut.TaglioRichiesto(2.0, 2)]); "
+              "print(sorted(m for m in ('streamlit', 'pandas', 'openpyxl') if m in sys.modules))")
+    uscita = subprocess.run([sys.executable, "-c", codice], capture_output=True, text=True, check=True)
+    assert uscita.stdout.strip() == "[]"
+
+
+def test_tutto_valido(tmp_path):
+    ingresso, uscita = tmp_path / "ordini.jsonl", tmp_path / "risultati.jsonl"
+    _scrivi(ingresso, [ORDINE_A, {"id": "B", "spezzoni": [6.0, 4.5], "richieste": [[1.5, 5]]}])
+    assert main([str(ingresso), "-o", str(uscita), "-j", "1"]) == 0
+    righe = _leggi(uscita)
+    assert [r["id"] for r in righe] == ["A", "B"]
+    assert all(r["completato"] for r in righe)
+
+
+def test_incompleto(tmp_path):
+    ingresso, uscita = tmp_path / "ordini.jsonl", tmp_path / "risultati.jsonl"
+    _scrivi(ingresso, [{"id": "A", "spezzoni": [6.0], "richieste": [[2.4, 3]]}])
+    assert main([str(ingresso), "-o", str(uscita), "-j", "1"]) == 1
+    assert _leggi(uscita)[0]["tagli_mancanti"] == [[2.4, 1]]
+
+
+def test_ingresso_csv(tmp_path):
+    ingresso, uscita = tmp_path / "ordini.csv", tmp_path / "risultati.jsonl"
+    ingresso.write_text("ordine,tipo,lunghezza,quantita\n"
+                        "A,spezzone,6.0,2\nA,taglio,2.4,3\n"
+                        "B,spezzone,4.5,1\nB,taglio,1.5,3\n", encoding="utf-8")
+    assert main([str(ingresso), "-o", str(uscita), "-j", "1"]) == 0
+    assert [(r["id"], r["spezzoni_usati"]) for r in _leggi(uscita)] == [("A", 2), ("B", 1)]
+
+
+@pytest.mark.parametrize("processi", ["1", "2"])
+def test_ordine_non_valido_non_ferma_il_lotto(tmp_path, capsys, processi):
+    ingresso, uscita = tmp_path / "ordini.jsonl", tmp_path / "risultati.jsonl"
+    ingresso.write_text("\n".join([
+        json.dumps(ORDINE_A),
+        json.dumps({"id": "B", "spezzoni": [6.0], "richieste": [-1.0]}),
+        "{non json",
+        json.dumps({"id": "C", "spezzoni": [{"quantita": 2}], "richieste": [1.0]}),
+        json.dumps({"id": "D", "spezzoni": [6.0], "richieste": [[1.5, 2]]}),
+    ]) + "\n", encoding="utf-8")
+    assert main([str(ingresso), "-o", str(uscita), "-j", processi]) == 2
+    righe = {r["id"]: r for r in _leggi(uscita)}
+    assert set(righe) == {"A", "B", "3", "C", "D"}
+    assert righe["A"]["completato"] and righe["D"]["completato"]
+    assert "errore" in righe["B"] and "errore" in righe["3"]
+    assert righe["C"]["errore"].startswith("campo mancante")
+    assert "ordine B" in capsys.readouterr().err
+
+
+def test_uscita_excel(tmp_path):
+    from openpyxl import load_workbook
+
+    ingresso, uscita = tmp_path / "ordini.jsonl", tmp_path / "risultati.xlsx"
+    _scrivi(ingresso, [ORDINE_A, {"id": "B", "spezzoni": [6.0], "richieste": [0.0]}])
+    assert main([str(ingresso), "-o", str(uscita), "-j", "1"]) == 2
+    wb = load_workbook(uscita, read_only=True)
+    riepilogo = list(wb["Riepilogo"].iter_rows(values_only=True))
+    assert [riga[0] for riga in riepilogo[1:]] == ["A", "B"]
+    assert riepilogo[2][-1]  # motivo dell'errore nell'ultima colonna
+    assert len(list(wb["Piani"].iter_rows(values_only=True))) == 1 + 2
+    wb.close()
+
+
+def test_file_mancante(tmp_path, capsys):
+    assert main([str(tmp_path / "nessuno.jsonl"), "-o", str(tmp_path / "r.jsonl")]) == 2
+    assert "nessuno.jsonl" in capsys.readouterr().err
+
+
+def test_mancanti_per_materiale(tmp_path):
+    from openpyxl import load_workbook
+
+    ingresso = tmp_path / "ordini.jsonl"
+    _scrivi(ingresso, [{"id": "M", "spezzoni": [[6.0, 1, "inox"], [6.0, 1, "ferro"]],
+                        "richieste": [[2.0, 4, 1.0, "inox"], [2.0, 2, 1.0, "ferro"]]}])
+    assert main([str(ingresso), "-o", str(tmp_path / "r.jsonl"), "-j", "1"]) == 1
+    materiali = {m["materiale"]: m for m in _leggi(tmp_path / "r.jsonl")[0]["materiali"]}
+    assert materiali["inox"]["tagli_mancanti"] == [[2.0, 1]]
+    assert materiali["ferro"]["tagli_mancanti"] == []
+
+    assert main([str(ingresso), "-o", str(tmp_path / "r.xlsx"), "-j", "1"]) == 1
+    wb = load_workbook(tmp_path / "r.xlsx", read_only=True)
+    intestazione, *righe = wb["Riepilogo"].iter_rows(values_only=True)
+    colonna = intestazione.index("Tagli mancanti")
+    # Le celle vuote in fondo alla riga non vengono scritte
+    assert {riga[6]: riga[colonna] if len(riga) > colonna else None for riga in righe} == {
+        "ferro": None, "inox": "2 x1"}
+    wb.close()
+
+
+@pytest.mark.skipif(multiprocessing.get_start_method() != "fork",
+                    reason="il conteggio passa ai processi di lavoro solo con fork")
+def test_libreria_aperta_una_volta_per_processo(tmp_path, monkeypatch):
+    from bestcut.libreria import LibreriaPattern
+
+    aperture = tmp_path / "aperture"
+    originale = LibreriaPattern.__init__
+
+    def conta(self, *args, **kwargs):
+        with open(aperture, "a") as f:
+            f.write(f"{os.getpid()}\n")
+        originale(self, *args, **kwargs)
+
+    monkeypatch.setattr(LibreriaPattern, "__init__", conta)
+    ingresso = tmp_path / "ordini.jsonl"
+    _scrivi(ingresso, [{"id": str(i), "spezzoni": [[6.0, 3, "inox"], [6.0, 3, "ferro"]],
+                        "richieste": [[2.0, 4, 1.0, "inox"], [1.5, 3, 1.0, "ferro"]]} for i in range(12)])
+    assert main([str(ingresso), "-o", str(tmp_path / "r.jsonl"), "-j", "2",
+                 "--libreria", str(tmp_path / "pattern.db")]) == 0
+    pid = aperture.read_text().split()
+    # Il processo principale e al più una per processo di lavoro, non una per ordine o materiale
+    assert len(pid) == len(set(pid)) <= 3
+    assert len(_leggi(tmp_path / "r.jsonl")) == 12
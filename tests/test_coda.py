@@ -0,0 +1,71 @@
+# tests/test_coda.py
+# Coda dei calcoli: i calcoli annullati mentre aspettano non partono
+
+import threading
+
+from bestcut import CodaCalcoli
+
+
+def _fermo(partito: threading.Event, via: threading.Event):
+    def calcolo(avanzamento):
+        partito.set()
+        via.wait(5)
+        return "primo"
+    return calcolo
+
+
+def test_annullato_in_coda_non_parte():
+    coda = CodaCalcoli(lavoratori=1)
+    partito, via, partiti = threading.Event(), threading.Event(), []
+    try:
+        primo = coda.invia("a", _fermo(partito, via))
+        assert partito.wait(5)
+        secondo = coda.invia("b", lambda avanzamento: partiti.append(1) or "secondo", chiave="k")
+        assert secondo.posizione == 1
+        secondo.annulla()
+        via.set()
+        assert primo.attendi(5) and secondo.attendi(5)
+        assert primo.risultato == "primo"
+        assert partiti == [] and secondo.risultato is None and secondo.errore is None
+        metriche = coda.metriche()
+        assert (metriche["completati"], metriche["annullati"], metriche["in_corso"]) == (1, 1, 0)
+        # La chiave è libera: lo stesso calcolo si può rimandare, e stavolta parte
+        terzo = coda.invia("b", lambda avanzamento: "terzo", chiave="k")
+        assert terzo.attendi(5) and terzo.risultato == "terzo"
+    finally:
+        via.set()
+        coda.chiudi()
+
+
+def test_annullato_in_corso_finisce_col_suo_piano():
+    coda = CodaCalcoli(lavoratori=1)
+    partito = threading.Event()
+
+    def calcolo(avanzamento):
+        partito.set()
+        while not avanzamento.annullato:
+            avanzamento.aggiorna(0.5)
+        return "piano"
+
+    try:
+        iscrizione = coda.invia("a", calcolo)
+        assert partito.wait(5)
+        iscrizione.annulla()
+        assert iscrizione.attendi(5) and iscrizione.risultato == "piano"
+        metriche = coda.metriche()
+        assert (metriche["completati"], metriche["annullati"]) == (1, 1)
+    finally:
+        coda.chiudi()
+
+
+def test_chiudi_salta_quelli_in_coda():
+    coda = CodaCalcoli(lavoratori=1)
+    partito, via, partiti = threading.Event(), threading.Event(), []
+    primo = coda.invia("a", _fermo(partito, via))
+    assert partito.wait(5)
+    in_coda = [coda.invia(s, lambda avanzamento: partiti.append(1)) for s in ("a", "b", "c")]
+    threading.Timer(0.2, via.set).start()
+    coda.chiudi()
+    assert primo.risultato == "primo"
+    assert all(i.finito and i.risultato is None for i in in_coda) and partiti == []
+    assert coda.metriche()["annullati"] == 3
@@ -0,0 +1,49 @@
+# tests/test_colgen.py
+# Generazione di colonne: piano valido, limite inferiore dello scarto, molte lunghezze
+
+import random
+
+import pytest
+
+from bestcut import Spezzone, TaglioRichiesto
+
+from .verifiche import controlla_piano, ordine, ottimizzatore
+
+
+@pytest.mark.parametrize("seme", [1, 2, 3])
+def test_piano_valido_con_limite(seme):
+    spezzoni, richieste = ordine(seme)
+    risultato = ottimizzatore("colgen").calcola_ottimale(spezzoni, richieste)
+    controlla_piano(risultato, spezzoni, richieste)
+    assert risultato.completato
+    assert risultato.limite_inferiore is not None
+    assert risultato.limite_inferiore <= risultato.scarto_totale + 1e-6
+
+
+def test_non_peggio_dell_ffd():
+    spezzoni, richieste = ordine(4, n_spezzoni=60, n_misure=12)
+    colgen = ottimizzatore("colgen", tempo_limite=2.0).calcola_ottimale(spezzoni, richieste)
+    ffd = ottimizzatore("ffd").calcola_ottimale(spezzoni, richieste)
+    assert colgen.spezzoni_usati <= ffd.spezzoni_usati
+
+
+def test_ottimo_noto():
+    # 3 + 2 + 1 riempie esattamente uno spezzone da 6: tre spezzoni, scarto zero
+    spezzoni = [Spezzone(6.0, i + 1) for i in range(5)]
+    richieste = [TaglioRichiesto(3.0, 3), TaglioRichiesto(2.0, 3), TaglioRichiesto(1.0, 3)]
+    risultato = ottimizzatore("colgen").calcola_ottimale(spezzoni, richieste)
+    controlla_piano(risultato, spezzoni, richieste)
+    assert risultato.spezzoni_usati == 3
+    assert risultato.scarto_totale == pytest.approx(0.0)
+    assert risultato.limite_inferiore == pytest.approx(0.0)
+
+
+def test_centinaia_di_lunghezze():
+    # Spezzoni tutti diversi: le lunghezze si raggruppano in classi, il piano resta valido
+    caso = random.Random(5)
+    spezzoni = [Spezzone(round(caso.uniform(2.0, 6.5), 3), i + 1) for i in range(300)]
+    richieste = [TaglioRichiesto(round(caso.uniform(0.4, 1.9), 3), caso.randint(2, 9)) for _ in range(40)]
+    risultato = ottimizzatore("colgen", tempo_limite=3.0).calcola_ottimale(spezzoni, richieste)
+    controlla_piano(risultato, spezzoni, richieste)
+    assert risultato.completato
+    assert risultato.limite_inferiore is not None
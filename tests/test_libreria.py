@@ -0,0 +1,124 @@
+# tests/test_libreria.py
+# Libreria dei pattern passata ai processi di lavoro: una connessione per processo, non una per calcolo
+
+import multiprocessing
+import os
+import pickle
+from concurrent.futures import ProcessPoolExecutor
+
+import pytest
+
+from bestcut import LibreriaPattern, Spezzone, TaglioRichiesto
+
+from .verifiche import controlla_piano, ottimizzatore
+
+
+def _nel_processo(opzioni: dict):
+    libreria = opzioni["libreria"]
+    return os.getpid(), id(libreria), id(libreria._db)
+
+
+def test_pickle_riusa_la_libreria_aperta(tmp_path):
+    libreria = LibreriaPattern(str(tmp_path / "pattern.db"))
+    try:
+        primo = pickle.loads(pickle.dumps({"libreria": libreria}))["libreria"]
+        secondo = pickle.loads(pickle.dumps(libreria))
+        assert primo is secondo
+        assert (primo.percorso, primo.max_pattern, primo.resa_minima) == (
+            libreria.percorso, libreria.max_pattern, libreria.resa_minima)
+        # Chiusa, la prossima volta si riapre
+        primo.chiudi()
+        terzo = pickle.loads(pickle.dumps(libreria))
+        assert terzo is not primo
+        assert terzo.conta() == 0
+        terzo.chiudi()
+    finally:
+        libreria.chiudi()
+
+
+def test_opzioni_diverse_librerie_diverse(tmp_path):
+    percorso = str(tmp_path / "pattern.db")
+    a, b = LibreriaPattern(percorso, resa_minima=0.9), LibreriaPattern(percorso, resa_minima=0.99)
+    try:
+        copia_a, copia_b = pickle.loads(pickle.dumps(a)), pickle.loads(pickle.dumps(b))
+        assert copia_a is not copia_b
+        assert copia_b.resa_minima == 0.99
+        copia_a.chiudi()
+        copia_b.chiudi()
+    finally:
+        a.chiudi()
+        b.chiudi()
+
+
+def test_una_connessione_per_processo(tmp_path):
+    libreria = LibreriaPattern(str(tmp_path / "pattern.db"))
+    try:
+        with ProcessPoolExecutor(max_workers=1) as pool:
+            visti = {pool.submit(_nel_processo, {"libreria": libreria}).result() for _ in range(5)}
+        assert len(visti) == 1
+    finally:
+        libreria.chiudi()
+
+
+def test_calcoli_con_la_libreria_nei_processi(tmp_path):
+    libreria = LibreriaPattern(str(tmp_path / "pattern.db"))
+    try:
+        spezzoni = [Spezzone(6.0, i + 1) for i in range(10)]
+        richieste = [TaglioRichiesto(2.0, 9), TaglioRichiesto(1.5, 4)]
+        calcolatore = ottimizzatore("ffd", libreria=libreria)
+        with ProcessPoolExecutor(max_workers=1) as pool:
+            risultati = [pool.submit(calcolatore.calcola_ottimale, spezzoni, richieste).result() for _ in range(3)]
+        for risultato in risultati:
+            controlla_piano(risultato, spezzoni, richieste)
+        assert libreria.conta() > 0
+    finally:
+        libreria.chiudi()
+
+
+def _cerca_e_registra(percorso: str, seme: int):
+    libreria = LibreriaPattern(percorso)
+    try:
+        for i in range(40):
+            libreria.cerca(0.001, [6000, 4500, 6000 + seme], [2000, 1500, 1000])
+            libreria.registra(0.001, [(6000, {2000: 2, 1000: 2}), (4500, {1500: 3}), (6000 + seme, {1000: 6})])
+    finally:
+        libreria.chiudi()
+    return True
+
+
+def test_processi_sulla_stessa_libreria(tmp_path):
+    percorso = str(tmp_path / "pattern.db")
+    LibreriaPattern(percorso).chiudi()
+    with ProcessPoolExecutor(max_workers=4) as pool:
+        assert all(pool.map(_cerca_e_registra, [percorso] * 4, range(4)))
+    libreria = LibreriaPattern(percorso)
+    try:
+        assert libreria.conta() > 0
+    finally:
+        libreria.chiudi()
+
+
+_ereditata = []
+
+
+def _eredita(libreria: LibreriaPattern):
+    # Con fork gli initargs non passano dal pickle: è l'oggetto del processo principale
+    _ereditata.append(libreria)
+
+
+def _controlla_ereditata():
+    libreria = _ereditata[0]
+    propria = libreria.nel_processo()
+    return propria is not libreria and propria is libreria.nel_processo() and propria._db is not libreria._db
+
+
+@pytest.mark.skipif("fork" not in multiprocessing.get_all_start_methods(), reason="serve il fork")
+def test_nel_processo_dopo_il_fork(tmp_path):
+    libreria = LibreriaPattern(str(tmp_path / "pattern.db"))
+    try:
+        assert libreria.nel_processo() is libreria
+        with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("fork"),
+                                 initializer=_eredita, initargs=(libreria,)) as pool:
+            assert pool.submit(_controlla_ereditata).result()
+    finally:
+        libreria.chiudi()
@@ -0,0 +1,139 @@
+# tests/test_magazzino.py
+# Scampoli: inventario persistente, prenotazione (il più corto che basta), sessioni, rilascio, consumo, scadenza
+
+import time
+
+import pytest
+
+from bestcut import MagazzinoScampoli, OttimizzatoreTagli, Spezzone, TaglioRichiesto, calcola_con_scampoli
+
+from .verifiche import controlla_piano
+
+
+@pytest.fixture
+def magazzino(tmp_path):
+    magazzino = MagazzinoScampoli(str(tmp_path / "scampoli.db"))
+    yield magazzino
+    magazzino.chiudi()
+
+
+def test_assorbi_solo_sopra_la_soglia(magazzino):
+    spezzoni = [Spezzone(6.0, 1), Spezzone(6.0, 2)]
+    risultato = OttimizzatoreTagli(processi=1).calcola_ottimale(spezzoni, [TaglioRichiesto(2.5, 3)])
+    # Scarti 1.0 e 3.5: sopra 1.0 si tiene solo il 3.5
+    assert magazzino.assorbi(risultato, 1.0, "ordine 1") == 1
+    assert [l for _, l in magazzino.disponibili()] == [3.5]
+
+
+def test_resta_su_disco(tmp_path):
+    percorso = str(tmp_path / "scampoli.db")
+    primo = MagazzinoScampoli(percorso)
+    primo.aggiungi([1.5, 2.5, 0.0])
+    primo.chiudi()
+    secondo = MagazzinoScampoli(percorso)
+    try:
+        assert [l for _, l in secondo.disponibili()] == [1.5, 2.5]
+    finally:
+        secondo.chiudi()
+
+
+def test_due_connessioni_non_prendono_lo_stesso(tmp_path):
+    # Due processi sullo stesso file: la prenotazione è esclusiva
+    percorso = str(tmp_path / "scampoli.db")
+    primo, secondo = MagazzinoScampoli(percorso), MagazzinoScampoli(percorso)
+    try:
+        primo.aggiungi([1.2, 3.0])
+        a = primo.prenota([TaglioRichiesto(1.0, 1)], "a")
+        b = secondo.prenota([TaglioRichiesto(1.0, 1)], "b")
+        assert {i for i, _ in a}.isdisjoint(i for i, _ in b)
+        assert secondo.conta() == 0
+    finally:
+        primo.chiudi()
+        secondo.chiudi()
+
+
+def test_prenota_il_piu_corto_che_basta(magazzino):
+    assert magazzino.aggiungi([0.5, 1.2, 2.0, 3.5]) == 4
+    presi = magazzino.prenota([TaglioRichiesto(1.1, 1)], "a")
+    assert [lunghezza for _, lunghezza in presi] == [1.2]
+    assert magazzino.conta() == 3
+
+
+def test_prenota_riusa_lo_scampolo_gia_preso(magazzino):
+    magazzino.aggiungi([1.0, 2.0, 2.5])
+    # 1.5 prende il 2.0; 0.4 sta in quello che avanza, 0.9 no e prende l'1.0
+    presi = magazzino.prenota([TaglioRichiesto(1.5, 1), TaglioRichiesto(0.4, 1)], "a")
+    assert [lunghezza for _, lunghezza in presi] == [2.0]
+    presi = magazzino.prenota([TaglioRichiesto(1.5, 1), TaglioRichiesto(0.9, 1)], "a")
+    assert [lunghezza for _, lunghezza in presi] == [2.0, 1.0]
+
+
+def test_prenotati_invisibili_alle_altre_sessioni(magazzino):
+    magazzino.aggiungi([1.2, 3.0])
+    primo = magazzino.prenota([TaglioRichiesto(1.0, 1)], "a")
+    secondo = magazzino.prenota([TaglioRichiesto(1.0, 1)], "b")
+    assert [l for _, l in primo] == [1.2]
+    assert [l for _, l in secondo] == [3.0]
+    assert magazzino.prenota([TaglioRichiesto(1.0, 1)], "c") == []
+    assert magazzino.disponibili() == []
+
+
+def test_prenota_di_nuovo_rilascia_le_precedenti(magazzino):
+    magazzino.aggiungi([1.2, 3.0])
+    magazzino.prenota([TaglioRichiesto(2.5, 1)], "a")
+    magazzino.prenota([TaglioRichiesto(1.0, 1)], "a")
+    assert [l for _, l in magazzino.disponibili()] == [3.0]
+
+
+def test_rilascia(magazzino):
+    magazzino.aggiungi([1.2, 1.5, 3.0])
+    presi = magazzino.prenota([TaglioRichiesto(1.0, 2)], "a")
+    assert magazzino.conta() == 1
+    magazzino.rilascia("a", [presi[0][0]])
+    assert magazzino.conta() == 2
+    magazzino.rilascia("a")
+    assert magazzino.conta() == 3
+
+
+def test_consuma(magazzino):
+    magazzino.aggiungi([1.2, 1.5, 3.0])
+    presi = magazzino.prenota([TaglioRichiesto(1.0, 2)], "a")
+    usato = presi[0][0]
+    # Lo scampolo usato esce dal magazzino, l'altro prenotato torna libero
+    magazzino.consuma("a", [usato])
+    rimasti = magazzino.disponibili()
+    assert len(rimasti) == 2
+    assert usato not in {i for i, _ in rimasti}
+    # Un'altra sessione non può consumare quello che non ha prenotato
+    magazzino.consuma("b", [i for i, _ in rimasti])
+    assert magazzino.conta() == 2
+
+
+def test_prenotazione_scaduta(tmp_path):
+    magazzino = MagazzinoScampoli(str(tmp_path / "scampoli.db"), durata_prenotazione=0.0)
+    try:
+        magazzino.aggiungi([1.2])
+        assert magazzino.prenota([TaglioRichiesto(1.0, 1)], "a")
+        time.sleep(0.01)
+        assert [l for _, l in magazzino.prenota([TaglioRichiesto(1.0, 1)], "b")] == [1.2]
+    finally:
+        magazzino.chiudi()
+
+
+def test_disponibili_per_intervallo(magazzino):
+    magazzino.aggiungi([0.5, 1.2, 2.0, 3.5])
+    assert [l for _, l in magazzino.disponibili(minimo=1.0, massimo=2.0)] == [1.2, 2.0]
+    assert len(magazzino.disponibili(limite=1)) == 1
+
+
+def test_calcola_con_scampoli(magazzino):
+    magazzino.aggiungi([2.5, 0.3])
+    spezzoni = [Spezzone(6.0, i) for i in range(1, 4)]
+    richieste = [TaglioRichiesto(2.4, 3), TaglioRichiesto(1.1, 2)]
+    prelievo = calcola_con_scampoli(OttimizzatoreTagli(metodo="ffd", processi=1), magazzino, spezzoni, richieste)
+    controlla_piano(prelievo.risultato, spezzoni + prelievo.scampoli, richieste)
+    assert prelievo.risultato.completato
+    usati = prelievo.scampoli_usati()
+    assert len(usati) == 1
+    magazzino.consuma(prelievo.sessione, usati)
+    assert [l for _, l in magazzino.disponibili()] == [0.3]
@@ -0,0 +1,135 @@
+# tests/test_materiali.py
+# Ordini con più materiali: ogni materiale sui suoi spezzoni, in parallelo, piano unico
+
+import pytest
+
+from bestcut import (BarraCommerciale, OttimizzatoreTagli, Spezzone, TaglioRichiesto, Variazione,
+                     calcola_per_materiale, dividi_per_materiale, materiali_di, riepilogo_materiali,
+                     unisci_per_materiale)
+
+from .verifiche import controlla_piano, ordine, ottimizzatore
+
+MATERIALI = ("40x40", "60x30", "inox")
+
+
+def _schemi(risultato):
+    # Gli spezzoni della stessa lunghezza si possono scambiare: conta lo schema, non l'ID
+    return sorted((p.spezzone_lunghezza, sorted(p.tagli)) for p in risultato.piani)
+
+
+def test_dividi_per_materiale():
+    spezzoni = [Spezzone(6.0, 1, "inox"), Spezzone(6.0, 2, "ferro")]
+    richieste = [TaglioRichiesto(2.0, 1, materiale="inox"), TaglioRichiesto(1.0, 0, materiale="rame"),
+                 TaglioRichiesto(1.5, 2, materiale="ottone")]
+    assert materiali_di(spezzoni, richieste) == ["ferro", "inox", "ottone"]
+    parti = dividi_per_materiale(spezzoni, richieste)
+    assert [s.id for s in parti["inox"][0]] == [1]
+    assert parti["ferro"][1] == [] and parti["ottone"][0] == []
+
+
+@pytest.mark.parametrize("metodo", OttimizzatoreTagli.METODI)
+@pytest.mark.parametrize("processi", [1, 2])
+def test_piano_valido(metodo, processi):
+    spezzoni, richieste = ordine(9, n_spezzoni=40, materiali=MATERIALI)
+    risultato = calcola_per_materiale(ottimizzatore(metodo), spezzoni, richieste, processi=processi)
+    controlla_piano(risultato, spezzoni, richieste)
+    assert list(risultato.materiali) == list(MATERIALI)
+    for materiale, parte in risultato.materiali.items():
+        controlla_piano(parte, [s for s in spezzoni if s.materiale == materiale],
+                        [r for r in richieste if r.materiale == materiale])
+
+
+def test_uguale_in_parallelo():
+    spezzoni, richieste = ordine(10, n_spezzoni=40, materiali=MATERIALI)
+    uno = calcola_per_materiale(ottimizzatore("bfd"), spezzoni, richieste, processi=1)
+    due = calcola_per_materiale(ottimizzatore("bfd"), spezzoni, richieste, processi=2)
+    assert list(uno.piani) == list(due.piani)
+
+
+def test_unisci_e_riepilogo():
+    spezzoni = [Spezzone(6.0, 1, "inox"), Spezzone(6.0, 2, "ferro")]
+    richieste = [TaglioRichiesto(2.0, 4, materiale="inox"), TaglioRichiesto(2.0, 2, materiale="ferro")]
+    risultato = calcola_per_materiale(ottimizzatore(), spezzoni, richieste, processi=1)
+    assert risultato.tagli_fatti == {2.0: 5}
+    assert risultato.tagli_mancanti == {2.0: 1}
+    assert not risultato.completato
+    righe = {voce["materiale"]: voce for voce in riepilogo_materiali(risultato)}
+    assert not righe["inox"]["completato"] and righe["inox"]["tubo_mancante"] == pytest.approx(2.0)
+    assert righe["ferro"]["completato"]
+    # Sommati per misura non si vede di quale materiale manca il 2.0: nel riepilogo sì
+    assert righe["inox"]["tagli_mancanti"] == [[2.0, 1]]
+    assert righe["ferro"]["tagli_mancanti"] == []
+    assert unisci_per_materiale(dict(risultato.materiali)).piani == risultato.piani
+
+
+def _ripianifica(calcolatore, spezzoni, richieste, spezzoni_dopo, richieste_dopo):
+    precedente = calcola_per_materiale(calcolatore, spezzoni, richieste, processi=1)
+    variazione = Variazione.confronta(spezzoni, spezzoni_dopo, richieste, richieste_dopo)
+    return precedente, calcolatore.ripianifica(precedente, spezzoni_dopo, variazione)
+
+
+def test_ripianifica_un_materiale_alla_volta():
+    spezzoni, richieste = ordine(7, materiali=("40x40", "60x30"))
+    # Un taglio in più solo per il secondo materiale: l'altro non si tocca
+    richieste_dopo = richieste + [TaglioRichiesto(0.75, 2, materiale="60x30")]
+    precedente, nuovo = _ripianifica(ottimizzatore(), spezzoni, richieste, spezzoni, richieste_dopo)
+    controlla_piano(nuovo, spezzoni, richieste_dopo)
+    assert set(nuovo.materiali) == {"40x40", "60x30"}
+    assert _schemi(nuovo.materiali["40x40"]) == _schemi(precedente.materiali["40x40"])
+
+
+def test_ripianifica_materiale_nuovo():
+    spezzoni, richieste = ordine(8)
+    spezzoni_dopo = spezzoni + [Spezzone(6.0, 100, "inox")]
+    richieste_dopo = richieste + [TaglioRichiesto(2.0, 2, materiale="inox")]
+    _, nuovo = _ripianifica(ottimizzatore(), spezzoni, richieste, spezzoni_dopo, richieste_dopo)
+    controlla_piano(nuovo, spezzoni_dopo, richieste_dopo)
+    assert nuovo.materiali["inox"].tagli_fatti == {2.0: 2}
+
+
+def test_migliora_un_materiale_alla_volta():
+    spezzoni, richieste = ordine(11, n_spezzoni=40, materiali=("40x40", "60x30"))
+    risultato = calcola_per_materiale(ottimizzatore(), spezzoni, richieste, processi=1)
+    migliorato = ottimizzatore().migliora(risultato, 0.3)
+    controlla_piano(migliorato, spezzoni, richieste)
+    assert set(migliorato.materiali) == {"40x40", "60x30"}
+    assert migliorato.spezzoni_usati <= risultato.spezzoni_usati
+
+
+def test_calcola_ottimale_non_mescola_i_materiali():
+    risultato = ottimizzatore().calcola_ottimale([Spezzone(6.0, 1, "inox")],
+                                                 [TaglioRichiesto(2.0, 2, materiale="ferro")])
+    assert not risultato.completato
+    assert risultato.piani == []
+    assert risultato.materiali["ferro"].tagli_mancanti == {2.0: 2}
+
+
+@pytest.mark.parametrize("metodo", ["ffd", "mbs"])
+def test_calcola_ottimale_come_per_materiale(metodo):
+    spezzoni, richieste = ordine(12, n_spezzoni=40, materiali=MATERIALI)
+    diretto = ottimizzatore(metodo).calcola_ottimale(spezzoni, richieste)
+    controlla_piano(diretto, spezzoni, richieste)
+    assert list(diretto.piani) == list(calcola_per_materiale(ottimizzatore(metodo), spezzoni, richieste,
+                                                             processi=1).piani)
+    assert list(diretto.materiali) == list(MATERIALI)
+
+
+def test_acquisti_un_materiale_alla_volta():
+    with pytest.raises(ValueError):
+        ottimizzatore().pianifica_acquisti([Spezzone(6.0, 1, "inox")], [TaglioRichiesto(2.0, 2, materiale="ferro")],
+                                           [BarraCommerciale(6.0, 10.0)])
+
+
+def test_mancanti_per_materiale_nell_excel():
+    from openpyxl import load_workbook
+
+    from bestcut import crea_excel_download
+
+    spezzoni = [Spezzone(6.0, 1, "inox"), Spezzone(6.0, 2, "ferro")]
+    richieste = [TaglioRichiesto(2.0, 4, materiale="inox"), TaglioRichiesto(2.0, 2, materiale="ferro")]
+    risultato = ottimizzatore().calcola_ottimale(spezzoni, richieste)
+    wb = load_workbook(crea_excel_download(spezzoni, richieste, risultato, 0.3), read_only=True)
+    righe = {riga[0]: riga for riga in wb["Riepilogo materiali"].iter_rows(min_row=4, values_only=True)}
+    assert righe["inox"][-1] == "2 x1"
+    assert righe["ferro"][-1] == "-"
+    wb.close()
@@ -0,0 +1,62 @@
+# tests/test_mbs.py
+# Minimum bin slack: ogni spezzone riempito con la combinazione di tagli che lascia meno scarto
+
+import random
+from itertools import product
+
+import pytest
+
+from bestcut import Spezzone, TaglioRichiesto
+
+from .verifiche import controlla_piano, ordine, ottimizzatore
+
+
+def _riempimento_massimo(lunghezza, richieste):
+    """Riempimento migliore di uno spezzone col taglio più lungo dentro, provando tutte le combinazioni"""
+    piu_lungo = max(r.lunghezza for r in richieste)
+    migliore = 0.0
+    for scelta in product(*(range(r.quantita + 1) for r in richieste)):
+        totale = sum(n * r.lunghezza for n, r in zip(scelta, richieste))
+        if totale <= lunghezza + 1e-9 and any(n and r.lunghezza == piu_lungo for n, r in zip(scelta, richieste)):
+            migliore = max(migliore, totale)
+    return migliore
+
+
+@pytest.mark.parametrize("seme", [1, 2, 3])
+def test_piano_valido(seme):
+    spezzoni, richieste = ordine(seme)
+    risultato = ottimizzatore("mbs").calcola_ottimale(spezzoni, richieste)
+    controlla_piano(risultato, spezzoni, richieste)
+    assert risultato.completato
+
+
+@pytest.mark.parametrize("seme", range(6))
+def test_spezzone_riempito_al_meglio(seme):
+    # Il taglio più lungo va comunque nello spezzone, il resto lo riempie al meglio
+    caso = random.Random(seme)
+    spezzoni = [Spezzone(6.0, 1)]
+    richieste = [TaglioRichiesto(round(caso.uniform(0.7, 2.9), 3), caso.randint(1, 3)) for _ in range(5)]
+    risultato = ottimizzatore("mbs").calcola_ottimale(spezzoni, richieste)
+    controlla_piano(risultato, spezzoni, richieste)
+    assert sum(risultato.piani[0].tagli) == pytest.approx(_riempimento_massimo(6.0, richieste))
+
+
+def test_meglio_dell_ffd():
+    # L'FFD mette 2.6 + 2.3 e gli servono quattro spezzoni; l'MBS riempie 2.6 + 1.6 + 1.6 e ne usa tre
+    spezzoni = [Spezzone(6.0, i + 1) for i in range(4)]
+    richieste = [TaglioRichiesto(2.9, 2), TaglioRichiesto(2.6, 1), TaglioRichiesto(2.3, 1),
+                 TaglioRichiesto(2.1, 1), TaglioRichiesto(1.6, 3)]
+    ffd = ottimizzatore("ffd").calcola_ottimale(spezzoni, richieste)
+    mbs = ottimizzatore("mbs").calcola_ottimale(spezzoni, richieste)
+    controlla_piano(mbs, spezzoni, richieste)
+    assert ffd.spezzoni_usati == 4
+    assert mbs.spezzoni_usati == 3
+
+
+def test_molti_pezzi_uguali():
+    # Quantità grandi: il subset-sum lavora sulle quantità limitate, non pezzo per pezzo
+    spezzoni = [Spezzone(6.0, i + 1) for i in range(2_000)]
+    richieste = [TaglioRichiesto(m, 1_500) for m in (1.45, 1.1, 0.85, 0.6)]
+    risultato = ottimizzatore("mbs").calcola_ottimale(spezzoni, richieste)
+    controlla_piano(risultato, spezzoni, richieste)
+    assert risultato.completato
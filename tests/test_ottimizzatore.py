@@ -0,0 +1,70 @@
+# tests/test_ottimizzatore.py
+# Motore FFD/BFD per misura e quantità: piani validi e gli stessi dell'FFD pezzo per pezzo
+
+import random
+
+import pytest
+
+from bestcut import PianoTaglio, Spezzone, TaglioRichiesto
+
+from .verifiche import controlla_piano, ordine, ottimizzatore
+
+
+def _ffd_pezzo_per_pezzo(spezzoni, richieste):
+    """L'FFD di prima: ogni pezzo in una lista, uno spezzone alla volta dal più lungo"""
+    rimanenti = sorted((r.lunghezza for r in richieste for _ in range(r.quantita)), reverse=True)
+    piani = []
+    for spezzone in sorted(spezzoni, key=lambda s: s.lunghezza, reverse=True):
+        tagli = []
+        for taglio in list(rimanenti):
+            if sum(tagli) + taglio <= spezzone.lunghezza:
+                tagli.append(taglio)
+                rimanenti.remove(taglio)
+        if tagli:
+            piani.append(PianoTaglio(spezzone.id, spezzone.lunghezza, tagli, spezzone.lunghezza - sum(tagli)))
+    return piani
+
+
+@pytest.mark.parametrize("metodo", ["ffd", "bfd"])
+@pytest.mark.parametrize("seme", [1, 2, 3])
+def test_piano_valido(metodo, seme):
+    spezzoni, richieste = ordine(seme)
+    risultato = ottimizzatore(metodo).calcola_ottimale(spezzoni, richieste)
+    controlla_piano(risultato, spezzoni, richieste)
+    assert risultato.completato
+    assert risultato.statistiche.metodo == metodo
+
+
+@pytest.mark.parametrize("seme", range(5))
+def test_ffd_come_prima(seme):
+    # Misure in quarti di metro: somme esatte anche in virgola mobile
+    caso = random.Random(seme)
+    spezzoni = [Spezzone(caso.choice([6.0, 4.5, 3.0]), i + 1) for i in range(25)]
+    richieste = [TaglioRichiesto(caso.randint(2, 11) / 4, caso.randint(1, 8)) for _ in range(6)]
+    risultato = ottimizzatore("ffd").calcola_ottimale(spezzoni, richieste)
+    atteso = {p.spezzone_id: sorted(p.tagli) for p in _ffd_pezzo_per_pezzo(spezzoni, richieste)}
+    assert {p.spezzone_id: sorted(p.tagli) for p in risultato.piani} == atteso
+
+
+@pytest.mark.parametrize("metodo", ["ffd", "bfd"])
+def test_molti_pezzi(metodo):
+    # Decine di migliaia di pezzi su poche misure: il motore lavora per quantità
+    spezzoni = [Spezzone(6.0, i + 1) for i in range(12_000)]
+    richieste = [TaglioRichiesto(m, 4_000) for m in (2.35, 1.8, 1.15, 0.9, 0.45)]
+    risultato = ottimizzatore(metodo).calcola_ottimale(spezzoni, richieste)
+    controlla_piano(risultato, spezzoni, richieste)
+    assert risultato.completato
+
+
+def test_materiale_insufficiente():
+    spezzoni = [Spezzone(6.0, 1), Spezzone(3.0, 2)]
+    richieste = [TaglioRichiesto(2.5, 4), TaglioRichiesto(7.0, 1)]
+    risultato = ottimizzatore("ffd").calcola_ottimale(spezzoni, richieste)
+    controlla_piano(risultato, spezzoni, richieste)
+    assert risultato.tagli_fatti == {2.5: 3}
+    assert risultato.tagli_mancanti == {2.5: 1, 7.0: 1}
+
+
+def test_metodo_sconosciuto():
+    with pytest.raises(ValueError):
+        ottimizzatore("lpt")
@@ -0,0 +1,85 @@
+# tests/test_piani_compatti.py
+# PianiCompatti: si legge come una lista, schemi tenuti una volta, pickle con i soli array
+
+import pickle
+
+from bestcut import GruppoPiani, PianiCompatti, PianoTaglio, Spezzone, TaglioRichiesto, raggruppa_piani
+
+from .verifiche import ottimizzatore
+
+PIANI = [
+    PianoTaglio(1, 6.0, [2.4, 2.4, 1.15], 0.05),
+    PianoTaglio(2, 4.5, [1.15, 1.15], 2.2),
+    PianoTaglio(3, 6.0, [2.4, 2.4, 1.15], 0.05),
+]
+
+
+def _risultato():
+    spezzoni = [Spezzone(6.0, i) for i in range(1, 6)] + [Spezzone(4.5, 10)]
+    richieste = [TaglioRichiesto(2.4, 4), TaglioRichiesto(1.15, 5), TaglioRichiesto(0.8, 3)]
+    return ottimizzatore("ffd").calcola_ottimale(spezzoni, richieste)
+
+
+def test_come_lista():
+    compatti = PianiCompatti.da_piani(PIANI)
+    assert len(compatti) == 3
+    assert compatti == PIANI
+    assert list(compatti) == PIANI
+    assert compatti[1].tagli == [1.15, 1.15]
+    assert compatti[-1] == PIANI[-1]
+    assert compatti[1:] == PIANI[1:]
+
+
+def test_schemi_uguali_una_volta():
+    compatti = PianiCompatti.da_piani(PIANI)
+    assert len(compatti.schemi) == 2
+    assert compatti.pezzi_per_misura() == {2.4: 4, 1.15: 4}
+    assert compatti.lunghezza_totale() == sum(p.spezzone_lunghezza for p in PIANI)
+
+
+def test_gruppi_come_raggruppa_piani():
+    compatti = PianiCompatti.da_piani(PIANI)
+    assert compatti.gruppi() == raggruppa_piani(PIANI)
+    assert compatti.gruppi()[0] == GruppoPiani(6.0, [2.4, 2.4, 1.15], 0.05, [1, 3])
+
+
+def test_concatena_e_rinumera():
+    primi = PianiCompatti.da_piani(PIANI[:2])
+    altri = [PianoTaglio(9, 3.0, [0.8, 0.8, 0.8], 0.6)]
+    uniti = primi.concatena(altri)
+    assert uniti == PIANI[:2] + altri
+    assert [p.spezzone_id for p in uniti.rinumera([7, 8, 9])] == [7, 8, 9]
+
+
+def test_lunghezza_totale_del_risultato():
+    risultato = _risultato()
+    assert risultato.piani.lunghezza_totale() == sum(p.spezzone_lunghezza for p in risultato.piani)
+    efficienza = 1 - risultato.scarto_totale / risultato.piani.lunghezza_totale()
+    assert 0 < efficienza <= 1
+
+
+def test_pickle():
+    risultato = _risultato()
+    copia = pickle.loads(pickle.dumps(risultato.piani))
+    assert isinstance(copia, PianiCompatti)
+    assert copia == risultato.piani
+    assert list(copia) == list(risultato.piani)
+
+
+def test_risultato_pickle():
+    risultato = _risultato()
+    copia = pickle.loads(pickle.dumps(risultato))
+    assert copia.piani == risultato.piani
+    assert copia.tagli_fatti == risultato.tagli_fatti
+    assert copia.scarto_totale == risultato.scarto_totale
+    assert copia.statistiche.metodo == "ffd"
+
+
+def test_vuoti():
+    vuoti = PianiCompatti.da_piani([])
+    assert len(vuoti) == 0
+    assert vuoti == []
+    assert vuoti.gruppi() == []
+    assert vuoti.pezzi_per_misura() == {}
+    assert vuoti.lunghezza_totale() == 0.0
+    assert pickle.loads(pickle.dumps(vuoti)) == []
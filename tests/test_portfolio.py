@@ -0,0 +1,32 @@
+# tests/test_portfolio.py
+# Portafoglio di euristiche: piano valido, ripetibile col seme, mai peggio di FFD e BFD
+
+import pytest
+
+from .verifiche import controlla_piano, ordine, ottimizzatore
+
+
+def _chiave(risultato):
+    return risultato.spezzoni_usati, round(risultato.scarto_totale, 6)
+
+
+@pytest.mark.parametrize("processi", [1, 2])
+def test_piano_valido(processi):
+    spezzoni, richieste = ordine(1, n_spezzoni=50, n_misure=10)
+    risultato = ottimizzatore("portfolio", processi=processi).calcola_ottimale(spezzoni, richieste)
+    controlla_piano(risultato, spezzoni, richieste)
+    assert risultato.completato
+
+
+def test_mai_peggio_di_ffd_e_bfd():
+    spezzoni, richieste = ordine(2, n_spezzoni=50, n_misure=10)
+    portfolio = ottimizzatore("portfolio").calcola_ottimale(spezzoni, richieste)
+    for metodo in ("ffd", "bfd"):
+        assert portfolio.spezzoni_usati <= ottimizzatore(metodo).calcola_ottimale(spezzoni, richieste).spezzoni_usati
+
+
+def test_stesso_seme_stesso_piano():
+    spezzoni, richieste = ordine(3, n_spezzoni=50, n_misure=10)
+    primo = ottimizzatore("portfolio", seme=7).calcola_ottimale(spezzoni, richieste)
+    secondo = ottimizzatore("portfolio", seme=7).calcola_ottimale(spezzoni, richieste)
+    assert list(primo.piani) == list(secondo.piani)
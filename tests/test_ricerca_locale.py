@@ -0,0 +1,49 @@
+# tests/test_ricerca_locale.py
+# Ricerca locale: piani validi, mai peggiori di quello di partenza, veloce anche su piani grandi
+
+import random
+import time
+
+import pytest
+
+from bestcut import Spezzone, TaglioRichiesto
+
+from .verifiche import controlla_piano, ordine, ottimizzatore
+
+
+@pytest.mark.parametrize("seme", range(6))
+def test_piano_valido(seme):
+    spezzoni, richieste = ordine(seme, n_spezzoni=40)
+    partenza = ottimizzatore("ffd").calcola_ottimale(spezzoni, richieste)
+    risultato = ottimizzatore("ffd", ricerca_locale=0.2).calcola_ottimale(spezzoni, richieste)
+    controlla_piano(risultato, spezzoni, richieste)
+    assert risultato.tagli_fatti == partenza.tagli_fatti
+    assert risultato.spezzoni_usati <= partenza.spezzoni_usati
+
+
+def test_libera_uno_spezzone():
+    # L'FFD mette 2.6 + 2.3 e gli servono quattro spezzoni: ne bastano tre
+    spezzoni = [Spezzone(6.0, i + 1) for i in range(4)]
+    richieste = [TaglioRichiesto(2.9, 2), TaglioRichiesto(2.6, 1), TaglioRichiesto(2.3, 1),
+                 TaglioRichiesto(2.1, 1), TaglioRichiesto(1.6, 3)]
+    partenza = ottimizzatore("ffd").calcola_ottimale(spezzoni, richieste)
+    migliorato = ottimizzatore("ffd").migliora(partenza, 0.5)
+    controlla_piano(migliorato, spezzoni, richieste)
+    assert (partenza.spezzoni_usati, migliorato.spezzoni_usati) == (4, 3)
+
+
+def test_piano_grande_nel_tempo():
+    # 8000 spezzoni e 24000 tagli: le mosse costano O(1), il tempo va nel cercare
+    caso = random.Random(3)
+    spezzoni = [Spezzone(caso.choice([6.0, 6.5, 7.5, 12.0]), i + 1) for i in range(8000)]
+    quantita = [0] * 30
+    for _ in range(24000):
+        quantita[caso.randrange(30)] += 1
+    richieste = [TaglioRichiesto(round(caso.uniform(0.3, 3.0), 3), n) for n in quantita if n]
+    partenza = ottimizzatore("ffd", soglia_scarto=0.3).calcola_ottimale(spezzoni, richieste)
+    inizio = time.perf_counter()
+    migliorato = ottimizzatore("ffd", soglia_scarto=0.3).migliora(partenza, 1.0)
+    assert time.perf_counter() - inizio < 2.0
+    controlla_piano(migliorato, spezzoni, richieste)
+    assert migliorato.spezzoni_usati < partenza.spezzoni_usati
+    assert migliorato.statistiche.contatori["mosse_fatte"] > 0
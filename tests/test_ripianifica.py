@@ -0,0 +1,77 @@
+# tests/test_ripianifica.py
+# Ripianificazione dopo piccole modifiche: tagli aggiunti e tolti, spezzoni tolti o rinumerati
+
+import pytest
+
+from bestcut import Spezzone, TaglioRichiesto, Variazione
+
+from .verifiche import controlla_piano, ordine, ottimizzatore
+
+
+def _ripianifica(calcolatore, spezzoni, richieste, spezzoni_dopo, richieste_dopo):
+    precedente = calcolatore.calcola_ottimale(spezzoni, richieste)
+    variazione = Variazione.confronta(spezzoni, spezzoni_dopo, richieste, richieste_dopo)
+    return precedente, calcolatore.ripianifica(precedente, spezzoni_dopo, variazione)
+
+
+def _schemi(risultato):
+    return sorted((p.spezzone_lunghezza, sorted(p.tagli)) for p in risultato.piani)
+
+
+def test_variazione_confronta():
+    prima = [Spezzone(6.0, 1), Spezzone(6.0, 2), Spezzone(4.5, 3)]
+    dopo = [Spezzone(6.0, 7), Spezzone(3.0, 8)]
+    variazione = Variazione.confronta(prima, dopo, [TaglioRichiesto(1.0, 3), TaglioRichiesto(2.0, 1)],
+                                      [TaglioRichiesto(1.0, 5)])
+    assert [s.lunghezza for s in variazione.spezzoni_aggiunti] == [3.0]
+    assert sorted(s.lunghezza for s in variazione.spezzoni_rimossi) == [4.5, 6.0]
+    assert [(r.lunghezza, r.quantita) for r in variazione.tagli_aggiunti] == [(1.0, 2)]
+    assert [(r.lunghezza, r.quantita) for r in variazione.tagli_rimossi] == [(2.0, 1)]
+
+
+@pytest.mark.parametrize("metodo", ["ffd", "bfd"])
+def test_tagli_aggiunti_e_tolti(metodo):
+    spezzoni, richieste = ordine(4)
+    richieste_dopo = richieste[1:] + [TaglioRichiesto(1.25, 3)]
+    _, nuovo = _ripianifica(ottimizzatore(metodo), spezzoni, richieste, spezzoni, richieste_dopo)
+    controlla_piano(nuovo, spezzoni, richieste_dopo)
+    assert nuovo.completato
+    assert nuovo.tagli_fatti.get(1.25) == 3
+
+
+def test_spezzone_tolto():
+    spezzoni, richieste = ordine(5)
+    calcolatore = ottimizzatore("bfd")
+    precedente = calcolatore.calcola_ottimale(spezzoni, richieste)
+    usato = precedente.piani[0].spezzone_id
+    spezzoni_dopo = [s for s in spezzoni if s.id != usato]
+    variazione = Variazione.confronta(spezzoni, spezzoni_dopo, richieste, richieste)
+    nuovo = calcolatore.ripianifica(precedente, spezzoni_dopo, variazione)
+    controlla_piano(nuovo, spezzoni_dopo, richieste)
+    assert usato not in {p.spezzone_id for p in nuovo.piani}
+
+
+def test_senza_modifiche():
+    spezzoni, richieste = ordine(6)
+    precedente, nuovo = _ripianifica(ottimizzatore("ffd"), spezzoni, richieste, spezzoni, richieste)
+    controlla_piano(nuovo, spezzoni, richieste)
+    assert _schemi(nuovo) == _schemi(precedente)
+    assert nuovo.scarto_totale == pytest.approx(precedente.scarto_totale)
+
+
+def test_spezzoni_rinumerati():
+    # Stessi spezzoni con ID nuovi: i piani passano agli spezzoni della stessa lunghezza
+    spezzoni, richieste = ordine(7)
+    rinumerati = [Spezzone(s.lunghezza, s.id + 100) for s in spezzoni]
+    precedente, nuovo = _ripianifica(ottimizzatore("ffd"), spezzoni, richieste, rinumerati, richieste)
+    controlla_piano(nuovo, rinumerati, richieste)
+    assert _schemi(nuovo) == _schemi(precedente)
+
+
+def test_tagli_tolti_liberano_spezzoni():
+    spezzoni = [Spezzone(6.0, i + 1) for i in range(4)]
+    richieste = [TaglioRichiesto(2.9, 6)]
+    precedente, nuovo = _ripianifica(ottimizzatore("ffd"), spezzoni, richieste, spezzoni, [TaglioRichiesto(2.9, 2)])
+    assert precedente.spezzoni_usati == 3
+    controlla_piano(nuovo, spezzoni, [TaglioRichiesto(2.9, 2)])
+    assert nuovo.spezzoni_usati == 1
@@ -0,0 +1,55 @@
+# tests/test_risoluzione.py
+# Calcolo in unità intere della risoluzione: misure non valide, arrotondamenti, somme esatte
+
+import pytest
+
+from bestcut import OttimizzatoreTagli, Spezzone, TaglioRichiesto
+
+from .verifiche import controlla_piano, ottimizzatore
+
+
+@pytest.mark.parametrize("spezzoni, richieste", [
+    ([Spezzone(0.0, 1)], [TaglioRichiesto(1.0, 1)]),
+    ([Spezzone(float("nan"), 1)], [TaglioRichiesto(1.0, 1)]),
+    ([Spezzone(6.0, 1)], [TaglioRichiesto(-1.0, 1)]),
+    ([Spezzone(6.0, 1)], [TaglioRichiesto(float("inf"), 1)]),
+    ([Spezzone(6.0, 1)], [TaglioRichiesto(1.0, -2)]),
+    ([Spezzone(6.0, 1)], [TaglioRichiesto(0.0001, 1)]),  # sotto la risoluzione
+])
+def test_misure_non_valide(spezzoni, richieste):
+    with pytest.raises(ValueError):
+        OttimizzatoreTagli().calcola_ottimale(spezzoni, richieste)
+
+
+def test_risoluzione_non_positiva():
+    with pytest.raises(ValueError):
+        OttimizzatoreTagli(risoluzione=0.0)
+
+
+@pytest.mark.parametrize("metodo", ["ffd", "bfd"])
+def test_somme_esatte(metodo):
+    # 0.1 + 0.2 + 0.3 = 0.6 in millimetri interi (in virgola mobile sarebbe oltre)
+    spezzoni = [Spezzone(0.6, 1)]
+    richieste = [TaglioRichiesto(0.1, 1), TaglioRichiesto(0.2, 1), TaglioRichiesto(0.3, 1)]
+    risultato = ottimizzatore(metodo).calcola_ottimale(spezzoni, richieste)
+    controlla_piano(risultato, spezzoni, richieste)
+    assert risultato.completato
+    assert risultato.scarto_totale == 0.0
+
+
+def test_misure_restano_come_scritte():
+    # I risultati usano le misure come le ha scritte l'utente, non quelle riconvertite
+    spezzoni = [Spezzone(6.0, 1)]
+    richieste = [TaglioRichiesto(1.2345, 2)]
+    risultato = ottimizzatore("ffd", risoluzione=0.001).calcola_ottimale(spezzoni, richieste)
+    assert risultato.tagli_fatti == {1.2345: 2}
+    assert list(risultato.tagli_fatti) == [1.2345]
+
+
+def test_risoluzione_piu_fine():
+    # 2.9995 + 3.0005 fa 6 m esatti: con i decimi di millimetro nessuno scarto
+    spezzoni = [Spezzone(6.0, 1)]
+    richieste = [TaglioRichiesto(2.9995, 1), TaglioRichiesto(3.0005, 1)]
+    risultato = ottimizzatore("ffd", risoluzione=0.0001).calcola_ottimale(spezzoni, richieste)
+    controlla_piano(risultato, spezzoni, richieste)
+    assert risultato.completato and risultato.scarto_totale == 0.0
@@ -0,0 +1,144 @@
+# tests/test_servizio.py
+# Servizio HTTP: richieste rifiutate (400, 404, 411, 413), ordine non calcolabile (422), calcolo riuscito
+
+import http.client
+import json
+import threading
+
+import pytest
+
+from bestcut.servizio import MAX_CORPO, ServizioCalcoli, crea_server
+
+ORDINE = {"id": "A", "spezzoni": [[6.0, 3]], "richieste": [[2.4, 4], [1.1, 2]]}
+
+
+@pytest.fixture(scope="module")
+def server():
+    servizio = ServizioCalcoli({"metodo": "ffd"}, processi=1)
+    server = crea_server(servizio, porta=0)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+    servizio.chiudi()
+
+
+def _richiesta(server, metodo="POST", percorso="/calcola", corpo=b"", intestazioni=None):
+    host, porta = server.server_address[:2]
+    connessione = http.client.HTTPConnection(host, porta, timeout=30)
+    try:
+        if intestazioni is None:
+            connessione.request(metodo, percorso, body=corpo)
+        else:
+            # Intestazioni scritte a mano: http.client non manda un Content-Length sbagliato
+            connessione.putrequest(metodo, percorso)
+            for nome, valore in intestazioni.items():
+                connessione.putheader(nome, valore)
+            connessione.endheaders()
+        risposta = connessione.getresponse()
+        return risposta.status, json.loads(risposta.read() or b"null")
+    finally:
+        connessione.close()
+
+
+def _post(server, dati):
+    return _richiesta(server, corpo=json.dumps(dati).encode("utf-8"))
+
+
+def test_calcolo_riuscito(server):
+    codice, dati = _post(server, ORDINE)
+    assert codice == 200
+    assert dati["id"] == "A"
+    assert dati["completato"]
+
+
+def test_piu_ordini(server):
+    codice, dati = _post(server, {"ordini": [ORDINE, dict(ORDINE, id="B")], "opzioni": {"tempo_limite": 1.0}})
+    assert codice == 200
+    assert [r["id"] for r in dati["risultati"]] == ["A", "B"]
+
+
+def test_ordine_non_calcolabile(server):
+    # Si legge ma non si calcola (taglio sotto la risoluzione): 422 per un ordine solo
+    codice, dati = _post(server, {"id": "Z", "spezzoni": [6.0], "richieste": [0.00001]})
+    assert codice == 422
+    assert dati["id"] == "Z" and "risoluzione" in dati["errore"]
+    # In una lista l'errore resta sul suo ordine e gli altri si calcolano
+    codice, dati = _post(server, [ORDINE, {"id": "Z", "spezzoni": [6.0], "richieste": [0.00001]}])
+    assert codice == 200
+    assert "errore" not in dati["risultati"][0] and "errore" in dati["risultati"][1]
+
+
+@pytest.mark.parametrize("corpo, messaggio", [
+    (b"{non json", None),
+    (json.dumps({"spezzoni": [{"quantita": 2}], "richieste": [1.0]}).encode(), "campo mancante"),
+    (json.dumps({"spezzoni": [6.0], "richieste": [-1.0]}).encode(), "lunghezza non valida"),
+    (json.dumps({"spezzoni": ["sei"], "richieste": [1.0]}).encode(), None),
+    (json.dumps(dict(ORDINE, opzioni={"processi": 8})).encode(), "Opzioni non ammesse"),
+    (json.dumps(dict(ORDINE, opzioni={"n_varianti": "tante"})).encode(), "n_varianti"),
+    (json.dumps(dict(ORDINE, opzioni={"risoluzione": 0.00001})).encode(), "risoluzione"),
+    (json.dumps({"ordini": "A"}).encode(), "'ordini'"),
+    (b"42", None),
+])
+def test_richiesta_non_valida(server, corpo, messaggio):
+    codice, dati = _richiesta(server, corpo=corpo)
+    assert codice == 400
+    if messaggio:
+        assert messaggio in dati["errore"]
+
+
+@pytest.mark.parametrize("lunghezza", ["-5", "tanti"])
+def test_content_length_non_valido(server, lunghezza):
+    codice, dati = _richiesta(server, intestazioni={"Content-Length": lunghezza})
+    assert codice == 400
+    assert "Content-Length" in dati["errore"]
+
+
+def test_corpo_troppo_grande(server):
+    codice, _ = _richiesta(server, intestazioni={"Content-Length": str(MAX_CORPO + 1)})
+    assert codice == 413
+
+
+def test_corpo_a_pezzi(server):
+    codice, _ = _richiesta(server, intestazioni={"Transfer-Encoding": "chunked"})
+    assert codice == 411
+
+
+def test_percorso_sconosciuto(server):
+    assert _richiesta(server, percorso="/altro", corpo=b"{}")[0] == 404
+    assert _richiesta(server, metodo="GET", percorso="/altro")[0] == 404
+
+
+def test_salute_e_metriche(server):
+    codice, salute = _richiesta(server, metodo="GET", percorso="/salute")
+    assert codice == 200 and salute["processi"] == 1
+    codice, metriche = _richiesta(server, metodo="GET", percorso="/metriche")
+    assert codice == 200 and metriche["errori_richiesta"] >= 1
+
+
+def test_stessa_richiesta_stessa_risposta(server):
+    # Senza statistiche (tempi) la risposta dipende solo dall'ordine e dalle opzioni
+    corpo = {"ordini": [ORDINE, dict(ORDINE, id="B", richieste=[[1.3, 5], [0.7, 3]])],
+             "opzioni": {"metodo": "portfolio", "seme": 3, "tempo_limite": 1.0}}
+    assert _post(server, corpo) == _post(server, corpo)
+
+
+def test_ndjson(server):
+    host, porta = server.server_address[:2]
+    connessione = http.client.HTTPConnection(host, porta, timeout=30)
+    try:
+        corpo = "\n".join(json.dumps(dict(ORDINE, id=str(i))) for i in range(3)).encode("utf-8")
+        connessione.request("POST", "/calcola?formato=ndjson", body=corpo,
+                            headers={"Content-Type": "application/x-ndjson"})
+        risposta = connessione.getresponse()
+        assert risposta.status == 200
+        assert risposta.getheader("Transfer-Encoding") == "chunked"
+        righe = [json.loads(riga) for riga in risposta.read().decode("utf-8").splitlines()]
+    finally:
+        connessione.close()
+    riepiloghi = [r for r in righe if r["tipo"] == "riepilogo"]
+    assert [r["id"] for r in riepiloghi] == ["0", "1", "2"]
+    assert all("piani" not in r for r in riepiloghi)
+    schemi = [r for r in righe if r["tipo"] == "schema" and r["id"] == "0"]
+    assert sum(r["quantita"] for r in schemi) == riepiloghi[0]["spezzoni_usati"]
@@ -0,0 +1,67 @@
+# tests/verifiche.py
+# Controlli comuni ai test: un piano è valido per il magazzino e i tagli richiesti
+
+import random
+from collections import Counter
+from typing import List, Sequence, Tuple
+
+from bestcut import OttimizzatoreTagli, Spezzone, TaglioRichiesto, RisultatoCalcolo
+
+TOLLERANZA = 1e-6
+
+
+def ordine(seme: int, n_spezzoni: int = 30, n_misure: int = 8,
+           materiali: Sequence[str] = ("",)) -> Tuple[List[Spezzone], List[TaglioRichiesto]]:
+    """Ordine casuale ripetibile: spezzoni da 3-6 m, misure da 0.3-2.8 m per ogni materiale"""
+    caso = random.Random(seme)
+    spezzoni = [Spezzone(caso.choice([6.0, 6.0, 4.5, 3.0]), i + 1, caso.choice(materiali))
+                for i in range(n_spezzoni)]
+    richieste = [TaglioRichiesto(round(caso.uniform(0.3, 2.8), 3), caso.randint(1, 6),
+                                 caso.choice([1.0, 2.0, 5.0]), materiale)
+                 for materiale in materiali for _ in range(n_misure)]
+    return spezzoni, richieste
+
+
+def ottimizzatore(metodo: str = "ffd", **opzioni) -> OttimizzatoreTagli:
+    """Tempi brevi e un solo processo: i test restano veloci e ripetibili"""
+    return OttimizzatoreTagli(**{"metodo": metodo, "tempo_limite": 1.0, "n_varianti": 6, "processi": 1, **opzioni})
+
+
+def controlla_piano(risultato: RisultatoCalcolo, spezzoni: List[Spezzone], richieste: List[TaglioRichiesto]):
+    """
+    AssertionError se il piano non sta in piedi: spezzoni inesistenti o usati due
+    volte, tagli oltre la lunghezza, scarti sbagliati, pezzi non richiesti o in più,
+    conti di fatti/mancanti che non tornano.
+    """
+    per_id = {s.id: s for s in spezzoni}
+    ids = [p.spezzone_id for p in risultato.piani]
+    assert len(ids) == len(set(ids)), "spezzone usato due volte"
+    tagliati = Counter()
+    for piano in risultato.piani:
+        spezzone = per_id.get(piano.spezzone_id)
+        assert spezzone is not None, f"spezzone #{piano.spezzone_id} non in magazzino"
+        assert abs(piano.spezzone_lunghezza - spezzone.lunghezza) < TOLLERANZA
+        assert piano.tagli, "piano senza tagli"
+        assert sum(piano.tagli) <= spezzone.lunghezza + TOLLERANZA, f"spezzone #{spezzone.id} oltre la lunghezza"
+        assert abs(piano.scarto - (spezzone.lunghezza - sum(piano.tagli))) < TOLLERANZA
+        tagliati.update((round(t, 6), spezzone.materiale) for t in piano.tagli)
+
+    richiesti = Counter()
+    for r in richieste:
+        richiesti[(round(r.lunghezza, 6), r.materiale)] += r.quantita
+    for chiave, n in tagliati.items():
+        assert n <= richiesti[chiave], f"tagli non richiesti o in più: {chiave} x{n}"
+
+    # tagli_fatti e tagli_mancanti sono per misura, con tutti i materiali insieme
+    per_misura, tagliati_per_misura = Counter(), Counter()
+    for (misura, _), n in richiesti.items():
+        per_misura[misura] += n
+    for (misura, _), n in tagliati.items():
+        tagliati_per_misura[misura] += n
+    fatti = Counter({round(m, 6): n for m, n in risultato.tagli_fatti.items()})
+    mancanti = Counter({round(m, 6): n for m, n in risultato.tagli_mancanti.items()})
+    assert +fatti == tagliati_per_misura
+    assert fatti + mancanti == +per_misura
+    assert risultato.completato == (not +mancanti)
+    assert risultato.spezzoni_usati == len(ids)
+    assert abs(risultato.scarto_totale - sum(p.scarto for p in risultato.piani)) < 1e-3